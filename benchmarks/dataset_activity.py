@@ -0,0 +1,136 @@
+"""Compare build_dataset_activity with the implementation it replaced, for accounts with more and more downloads
+
+The outputs of the two are checked to be the same before they're timed. Run from the repository root with the
+app's environment variables set, e.g.:
+
+    python -m benchmarks.dataset_activity --downloads 10 1000 100000
+"""
+import argparse
+import copy
+import time
+from datetime import datetime
+from verification_ui.utils.formatting_utils import build_dataset_activity, format_date_and_time, \
+    format_file_name, format_text_date
+
+DATASETS = [('ccod', True), ('ocod', True), ('nps', True), ('nps_sample', False), ('res_cov', False),
+            ('rfi', True), ('rfi_sample', False), ('inspire', False)]
+
+
+def make_dataset_activity(downloads):
+    activity = [{
+        'id': str(index),
+        'name': name,
+        'title': name.upper(),
+        'private': private,
+        'licence_agreed': True,
+        'licence_agreed_date': '2018-08-27T12:12:12.000000',
+        'download_history': []
+    } for index, (name, private) in enumerate(DATASETS)]
+
+    for download in range(downloads):
+        activity[download % len(activity)]['download_history'].append({
+            'date': '2019-{:02d}-{:02d}T{:02d}:12:12.000000'.format(download % 12 + 1, download % 28 + 1,
+                                                                    download % 24),
+            'file': 'LR_{}_COU_2019_08.zip'.format(download)
+        })
+    return activity
+
+
+def legacy_build_dataset_activity(dataset_activity):
+    """build_dataset_activity as it was, which is quadratic in the number of datasets and of downloads"""
+    download_activity = list(dataset_activity)
+
+    for dataset in download_activity:
+        if dataset['private'] is True:
+            sample_dataset_index = next((index for (index, item) in enumerate(download_activity)
+                                         if item['name'] == '{}_sample'.format(dataset['name'])), None)
+            if sample_dataset_index is not None:
+                dataset['download_history'] += download_activity[sample_dataset_index]['download_history']
+                dataset['sample_licence_agreed'] = download_activity[sample_dataset_index]['licence_agreed']
+                del download_activity[sample_dataset_index]
+
+    activity = dict(download_count=0, datasets=list())
+    oldest_download_date = datetime.now()
+
+    for dataset in download_activity:
+        if dataset['licence_agreed'] or dataset['download_history']:
+            if dataset['licence_agreed'] and 'licence_agreed_date' in dataset:
+                licence_agreed = 'Licence agreed on {}'.format(format_text_date(dataset['licence_agreed_date']))
+            elif dataset['licence_agreed']:
+                licence_agreed = 'Licence has been agreed'
+            elif 'sample_licence_agreed' in dataset and dataset['sample_licence_agreed'] is True:
+                licence_agreed = 'Sample licence has been agreed'
+            else:
+                licence_agreed = 'Licence has not been agreed'
+
+            if dataset['download_history']:
+                content = '<table class="govuk-table govuk-!-margin-top-3 govuk-!-margin-bottom-6">' \
+                          '<thead class="govuk-table__head"><tr class="govuk-table__row">' \
+                          '<th scope="col" class="govuk-table__header">Type of dataset</th>' \
+                          '<th scope="col" class="govuk-table__header">Date/time downloaded</th>' \
+                          '</tr></thead><tbody class="govuk-table__body">'
+
+                for download in dataset['download_history']:
+                    activity['download_count'] += 1
+
+                    curr_download_date = datetime.strptime(download['date'], '%Y-%m-%dT%H:%M:%S.%f')
+                    if curr_download_date < oldest_download_date:
+                        oldest_download_date = curr_download_date
+
+                    download_file = format_file_name(download['file'])
+                    download_date = format_date_and_time(download['date'])
+
+                    content += '<tr class="govuk-table__row">' \
+                               '<td scope="row" class="govuk-table__cell">{}</td>' \
+                               '<td class="govuk-table__cell">{}</td>' \
+                               '</tr>'.format(download_file, download_date)
+
+                content += '</tbody></table>'
+            else:
+                content = '<p class="govuk-body govuk-!-margin-top-3 govuk-!-margin-bottom-6">This account has ' \
+                          'not downloaded any files for this dataset.</p>'
+
+            activity['datasets'].append({
+                'heading': {'text': dataset['title']},
+                'summary': {'text': licence_agreed},
+                'content': {'html': content}
+            })
+
+        activity['oldest_download_date'] = format_text_date(datetime.strftime(oldest_download_date,
+                                                                              '%Y-%m-%dT%H:%M:%S.%f'))
+
+    return activity
+
+
+def time_build(build, dataset_activity, repeat):
+    timings = []
+    for _ in range(repeat):
+        # The old implementation changes the activity it's given, so each run gets its own copy
+        activity = copy.deepcopy(dataset_activity)
+        start = time.perf_counter()
+        build(activity)
+        timings.append(time.perf_counter() - start)
+    return sorted(timings)[len(timings) // 2]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--downloads', type=int, nargs='+', default=[10, 1000, 100000],
+                        help='Numbers of downloads the accounts have made')
+    parser.add_argument('--repeat', type=int, default=5, help='Number of timed runs (the median is shown)')
+    args = parser.parse_args()
+
+    print('{:>10} {:>12} {:>12} {:>8}'.format('downloads', 'legacy ms', 'current ms', 'speedup'))
+    for downloads in args.downloads:
+        dataset_activity = make_dataset_activity(downloads)
+        assert legacy_build_dataset_activity(copy.deepcopy(dataset_activity)) == \
+            build_dataset_activity(dataset_activity), 'Outputs differ for {} downloads'.format(downloads)
+
+        legacy = time_build(legacy_build_dataset_activity, dataset_activity, args.repeat)
+        current = time_build(build_dataset_activity, dataset_activity, args.repeat)
+        print('{:>10} {:>12.2f} {:>12.2f} {:>7.1f}x'.format(downloads, legacy * 1000, current * 1000,
+                                                            legacy / current))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,41 @@
+"""A stand-in for the Verification API, for benchmarking the clients that talk to it"""
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+
+
+def make_handler(latency, body):
+    payload = json.dumps(body).encode()
+
+    class StubAPIHandler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def do_GET(self):
+            # Simulates the time the real API spends on a request
+            time.sleep(latency)
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, *args):
+            pass
+
+    return StubAPIHandler
+
+
+class StubAPI(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024
+
+
+def start_stub_api(latency=0.05, body=None):
+    """Start a stub API in a background thread, returning the server and its base URL"""
+    server = StubAPI(('127.0.0.1', 0), make_handler(latency, body if body is not None else {'case_id': 1}))
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    return server, 'http://127.0.0.1:{}/v1'.format(server.server_port)
@@ -0,0 +1,85 @@
+"""Compare the timestamp formatting functions with the strptime based ones they replaced
+
+100,000 different timestamps are formatted, then the most recent of them again (as when a page is rendered
+again), scaled up to the same number of calls. Only as many as the memo cache holds are formatted again, as
+older ones will have been evicted. The outputs of the two are checked to be the same before they're timed.
+Run from the repository root with the app's environment variables set, e.g.:
+
+    python -m benchmarks.timestamp_formatting --timestamps 100000
+"""
+import argparse
+import time
+from datetime import datetime, timedelta
+from verification_ui.utils.date_utils import format_timestamp
+from verification_ui.utils.formatting_utils import format_date, format_date_and_time, format_note_metadata, \
+    format_text_date
+
+
+def legacy_format_date(date):
+    datetime_added = datetime.strptime(date[:25], '%Y-%m-%d %H:%M:%S.%f')
+    return datetime_added.strftime('%d/%m/%Y')
+
+
+def legacy_format_text_date(date):
+    datetime_added = datetime.strptime(date, '%Y-%m-%dT%H:%M:%S.%f')
+    return datetime_added.strftime('%d %B %Y')
+
+
+def legacy_format_date_and_time(date):
+    datetime_added = datetime.strptime(date, '%Y-%m-%dT%H:%M:%S.%f')
+    return datetime_added.strftime('%d %B %Y %H:%M')
+
+
+def legacy_format_note_metadata(note_metadata):
+    note_datetime = datetime.strptime(note_metadata['date_added'][:25], '%Y-%m-%d %H:%M:%S.%f')
+    note_formatted_datetime = note_datetime.strftime('%d/%m/%Y %H:%M:%S')
+    return 'Added by {} on {}'.format(note_metadata['staff_id'], note_formatted_datetime)
+
+
+def make_timestamps(count, separator):
+    start = datetime(2019, 1, 1)
+    return [(start + timedelta(seconds=index * 97, microseconds=index)).strftime(
+        '%Y-%m-%d{}%H:%M:%S.%f'.format(separator)) for index in range(count)]
+
+
+def time_calls(function, arguments):
+    start = time.perf_counter()
+    for argument in arguments:
+        function(argument)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--timestamps', type=int, default=100000, help='Number of different timestamps')
+    args = parser.parse_args()
+
+    spaced = make_timestamps(args.timestamps, ' ')
+    iso = make_timestamps(args.timestamps, 'T')
+    notes = [{'staff_id': 'LRTM101', 'date_added': timestamp} for timestamp in spaced]
+    functions = [
+        ('format_date', legacy_format_date, format_date, spaced),
+        ('format_text_date', legacy_format_text_date, format_text_date, iso),
+        ('format_date_and_time', legacy_format_date_and_time, format_date_and_time, iso),
+        ('format_note_metadata', legacy_format_note_metadata, format_note_metadata, notes)
+    ]
+
+    print('{:<22} {:>10} {:>12} {:>8} {:>12} {:>8}'.format('function', 'legacy ms', 'first ms', 'speedup',
+                                                           'again ms', 'speedup'))
+    for name, legacy, current, arguments in functions:
+        assert [legacy(argument) for argument in arguments[:1000]] == \
+            [current(argument) for argument in arguments[:1000]], 'Outputs differ for {}'.format(name)
+
+        format_timestamp.cache_clear()
+        legacy_time = time_calls(legacy, arguments)
+        # The first time every timestamp is new, the second time the most recent are remembered
+        first_time = time_calls(current, arguments)
+        again_time = time_calls(current, arguments[-format_timestamp.cache_info().maxsize:])
+        again_time *= len(arguments) / min(len(arguments), format_timestamp.cache_info().maxsize)
+        print('{:<22} {:>10.1f} {:>12.1f} {:>7.1f}x {:>12.1f} {:>7.1f}x'.format(
+            name, legacy_time * 1000, first_time * 1000, legacy_time / first_time, again_time * 1000,
+            legacy_time / again_time))
+
+
+if __name__ == '__main__':
+    main()
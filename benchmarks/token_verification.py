@@ -0,0 +1,59 @@
+"""Measure the CPU spent loading the logged in user on each request, with and without the verified token cache
+
+The token is signed with a freshly generated RSA key standing in for the ADFS certificate. Run from the
+repository root with the app's environment variables set, e.g.:
+
+    python -m benchmarks.token_verification --requests 2000
+"""
+import argparse
+import time
+from Crypto.PublicKey import RSA
+from jose import jwt
+from unittest import mock
+from verification_ui.extensions import adfs_certificates
+from verification_ui.main import app
+from verification_ui.views.login import User, verified_tokens
+
+
+def make_token(private_key):
+    return jwt.encode({
+        'UserName': 'lrtm123',
+        'group': [app.config['ADFS_ROLE']],
+        'aud': app.config['ROOT_URL'] + '/verification/login',
+        'exp': int(time.time()) + 60 * 60
+    }, private_key, algorithm='RS256')
+
+
+def run(token, requests, cached):
+    verified_tokens.invalidate()
+    start = time.process_time()
+    for _ in range(requests):
+        if not cached:
+            verified_tokens.invalidate(token)
+        User(access_token=token)
+    return time.process_time() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--requests', type=int, default=2000, help='Number of times to load the user')
+    args = parser.parse_args()
+
+    key = RSA.generate(2048)
+    token = make_token(key.exportKey().decode())
+
+    with app.app_context(), mock.patch.object(adfs_certificates, '_fetch',
+                                              return_value=[key.publickey().exportKey().decode()]), \
+            mock.patch.dict(app.config, {'ADFS_CERTIFICATE_REFRESH_INTERVAL': 0,
+                                         'ADFS_CERTIFICATE_CACHE_FILE': None}):
+        adfs_certificates.refresh()
+        uncached = run(token, args.requests, cached=False)
+        cached = run(token, args.requests, cached=True)
+
+    print('{:<12} {:>12} {:>16}'.format('variant', 'CPU s', 'CPU us/request'))
+    for name, seconds in (('verified', uncached), ('cached', cached)):
+        print('{:<12} {:>12.3f} {:>16.1f}'.format(name, seconds, seconds / args.requests * 1000000))
+
+
+if __name__ == '__main__':
+    main()
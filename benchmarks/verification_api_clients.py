@@ -0,0 +1,87 @@
+"""Compare the synchronous and asyncio Verification API clients making many calls at once
+
+Run from the repository root with the app's environment variables set, e.g.:
+
+    python -m benchmarks.verification_api_clients --calls 200 --latency 0.05
+"""
+import argparse
+import asyncio
+import time
+from functools import partial
+from flask import g
+from verification_ui.main import app
+from verification_ui.custom_extensions.http_connection_pool.main import TracedSession, build_session
+from verification_ui.dependencies.async_verification_api import AsyncVerificationAPI
+from verification_ui.dependencies.verification_api import VerificationAPI
+from benchmarks.stub_api import start_stub_api
+
+
+def run_sync_sequential(base_url, calls):
+    verification_api = VerificationAPI()
+    verification_api.base_url = base_url
+    for item_id in range(calls):
+        verification_api.get_dataset_activity(item_id)
+
+
+def run_sync_fan_out(base_url, calls, workers):
+    verification_api = VerificationAPI()
+    verification_api.base_url = base_url
+    results = verification_api.fan_out({item_id: partial(verification_api.get_dataset_activity, item_id)
+                                        for item_id in range(calls)}, max_workers=workers)
+    _check(results)
+
+
+def run_async_fan_out(base_url, calls, pool_size):
+    async def run():
+        async with AsyncVerificationAPI(base_url=base_url, pool_size=pool_size) as verification_api:
+            return await verification_api.fan_out({item_id: verification_api.get_dataset_activity(item_id)
+                                                   for item_id in range(calls)})
+
+    loop = asyncio.new_event_loop()
+    try:
+        _check(loop.run_until_complete(run()))
+    finally:
+        loop.close()
+
+
+def _check(results):
+    failures = [name for name, result in results.items() if result.error is not None]
+    if failures:
+        raise RuntimeError('{} calls failed'.format(len(failures)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--calls', type=int, default=200, help='Number of calls to make')
+    parser.add_argument('--latency', type=float, default=0.05, help='Seconds the stub API takes per call')
+    parser.add_argument('--concurrency', type=int, default=50,
+                        help='Threads (sync client) or pooled connections (async client) to use')
+    args = parser.parse_args()
+
+    server, base_url = start_stub_api(latency=args.latency)
+    # get_dataset_activity isn't a conditional GET, so every call really goes to the stub
+    benchmarks = [
+        ('sync, one at a time', partial(run_sync_sequential, base_url, args.calls)),
+        ('sync, fan_out ({} threads)'.format(args.concurrency),
+         partial(run_sync_fan_out, base_url, args.calls, args.concurrency)),
+        ('async, fan_out ({} connections)'.format(args.concurrency),
+         partial(run_async_fan_out, base_url, args.calls, args.concurrency))
+    ]
+
+    print('{} calls, {}s latency per call'.format(args.calls, args.latency))
+    try:
+        with app.test_request_context():
+            g.trace_id = 'benchmark'
+            g.requests = TracedSession(build_session(args.concurrency, args.concurrency, False, True), g.trace_id)
+            for name, benchmark in benchmarks:
+                start = time.perf_counter()
+                benchmark()
+                elapsed = time.perf_counter() - start
+                print('{:<36} {:>8.3f}s {:>10.1f} calls/s'.format(name, elapsed, args.calls / elapsed))
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,96 @@
+"""Compare how long a worker takes to start and serve its first pages with and without compiled templates
+
+Each run is a new process, as a new worker would be: the app is imported (which compiles every template first if
+TEMPLATE_WARM_UP is on), then the worklist and search pages are requested once each, with the Verification API
+replaced by a worklist of --items cases. The median of --runs runs is shown for each of:
+
+    no cache                  templates compiled as pages first need them, as before
+    warm-up, empty cache      every template compiled as the worker starts, as the first worker after a deploy
+    warm-up, filled cache     every template loaded from the bytecode cache as the worker starts
+    filled cache              templates loaded from the bytecode cache as pages first need them
+
+Run from the repository root with the app's environment variables set, e.g.:
+
+    python -m benchmarks.worker_startup --runs 5
+"""
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+SCENARIOS = ['no cache', 'warm-up, empty cache', 'warm-up, filled cache', 'filled cache']
+
+
+def run_worker(items):
+    os.environ['LOGIN_DISABLED'] = 'True'
+    started = time.perf_counter()
+    from verification_ui.main import app
+    booted = time.perf_counter()
+
+    # Imported after the app, so nothing the app imports is loaded before it's timed
+    from unittest import mock
+    from benchmarks.worklist_decoding import make_worklist
+    from verification_ui.dependencies.records import to_case_summaries
+    from verification_ui.dependencies.verification_api import VerificationAPI
+
+    cases = to_case_summaries(json.loads(make_worklist(items).decode()))
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['username'] = 'LRTM101'
+    with mock.patch.object(VerificationAPI, '_request', return_value=cases):
+        request_started = time.perf_counter()
+        for url in ('/verification/worklist', '/verification/worklist/search?first_name=Test'):
+            response = client.get(url)
+            # Pages are streamed, so they're only rendered as they're read
+            response.get_data()
+            response.close()
+            assert response.status_code == 200, (url, response.status_code)
+        served = time.perf_counter()
+
+    print(json.dumps({'boot_ms': (booted - started) * 1000, 'first_pages_ms': (served - request_started) * 1000}))
+
+
+def run_scenario(scenario, items, cache_directory):
+    env = dict(os.environ)
+    env['TEMPLATE_WARM_UP'] = 'true' if scenario.startswith('warm-up') else 'false'
+    env['TEMPLATE_BYTECODE_CACHE_DIR'] = '' if scenario == 'no cache' else cache_directory
+    output = subprocess.check_output([sys.executable, '-m', 'benchmarks.worker_startup', '--items', str(items),
+                                      '--worker'], env=env)
+    return json.loads(output.decode().strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=5, help='Number of workers started for each (the median is shown)')
+    parser.add_argument('--items', type=int, default=50, help='Number of cases on the worklist and search pages')
+    parser.add_argument('--worker', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        run_worker(args.items)
+        return
+
+    print('{:<24} {:>10} {:>16} {:>10}'.format('', 'boot ms', 'first pages ms', 'total ms'))
+    for scenario in SCENARIOS:
+        results = []
+        for _ in range(args.runs):
+            cache_directory = tempfile.mkdtemp()
+            try:
+                if 'filled' in scenario:
+                    run_scenario('warm-up, empty cache', args.items, cache_directory)
+                results.append(run_scenario(scenario, args.items, cache_directory))
+            finally:
+                shutil.rmtree(cache_directory)
+
+        boot = sorted(result['boot_ms'] for result in results)[len(results) // 2]
+        first_pages = sorted(result['first_pages_ms'] for result in results)[len(results) // 2]
+        total = sorted(result['boot_ms'] + result['first_pages_ms'] for result in results)[len(results) // 2]
+        print('{:<24} {:>10.1f} {:>16.1f} {:>10.1f}'.format(scenario, boot, first_pages, total))
+
+
+if __name__ == '__main__':
+    main()
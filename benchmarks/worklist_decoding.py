@@ -0,0 +1,107 @@
+"""Measure decode time and memory for a large worklist, as dicts and as CaseSummary records
+
+Each variant runs in its own process so the growth in its resident memory (RSS) can be measured on its own.
+The memory still held by the decoded worklist afterwards is measured too, as Python doesn't always hand freed
+memory back to the OS. Run from the repository root, e.g.:
+
+    python -m benchmarks.worklist_decoding --items 5000
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+import tracemalloc
+from verification_ui.dependencies.records import to_case_summaries
+from verification_ui.utils import json_utils
+
+VARIANTS = ['json, dicts', 'json, records']
+if json_utils.fast_loads is not None:
+    VARIANTS += ['{}, dicts'.format(json_utils.DECODER), '{}, records'.format(json_utils.DECODER)]
+
+
+def make_worklist(items):
+    """A worklist shaped like the Verification API's, notes and all"""
+    return json.dumps([{
+        'case_id': case_id,
+        'status': 'Pending' if case_id % 3 else 'In Progress',
+        'staff_id': None if case_id % 4 else 'LRTM{}'.format(case_id % 50),
+        'date_added': '2019-01-{:02d} 12:12:12.000000'.format(case_id % 28 + 1),
+        'date_agreed': None,
+        'user_id': 'ff523530-e326-4b6b-b3f3-{:012d}'.format(case_id),
+        'ldap_id': 'd5eaf617-07c8-4aec-a030-{:012d}'.format(case_id),
+        'registration_data': {
+            'title': 'Mr', 'first_name': 'Test{}'.format(case_id), 'last_name': 'User',
+            'user_type': 'personal-uk', 'address_line_1': '{} Test Street'.format(case_id), 'address_line_2': '',
+            'city': 'Testyton', 'postcode': 'T35 T3R5', 'country': 'UK', 'telephone_number': '07850111222',
+            'email': 'test{}@example.com'.format(case_id), 'contactable': True,
+            'contact_preferences': ['Telephone', 'Email'], 'date_added': '2019-01-01 12:12:12.000000'
+        },
+        'notes': [{
+            'notes_id': note_id, 'case_id': case_id, 'staff_id': 'testuser',
+            'note_text': 'This is test note number {}'.format(note_id),
+            'date_added': '2019-01-01 12:12:12.000000'
+        } for note_id in range(3)]
+    } for case_id in range(items)]).encode()
+
+
+def current_rss_kb():
+    with open('/proc/self/statm') as statm:
+        return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') // 1024
+
+
+def decode(variant, payload):
+    body = (json.loads if variant.startswith('json') else json_utils.fast_loads)(payload)
+    if variant.endswith('records'):
+        body = to_case_summaries(body)
+    return body
+
+
+def run_variant(variant, items, repeat):
+    payload = make_worklist(items)
+
+    rss_before = current_rss_kb()
+    worklist = decode(variant, payload)
+    rss_after = current_rss_kb()
+
+    tracemalloc.start()
+    retained = decode(variant, payload)
+    retained_kb = tracemalloc.get_traced_memory()[0] // 1024
+    tracemalloc.stop()
+    del retained
+
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        decode(variant, payload)
+        timings.append(time.perf_counter() - start)
+
+    print(json.dumps({'variant': variant, 'items': len(worklist), 'bytes': len(payload),
+                      'decode_ms': sorted(timings)[len(timings) // 2] * 1000, 'rss_kb': rss_after - rss_before,
+                      'retained_kb': retained_kb}))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--items', type=int, default=5000, help='Number of cases in the worklist')
+    parser.add_argument('--repeat', type=int, default=10, help='Number of timed decodes (the median is shown)')
+    parser.add_argument('--variant', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.variant:
+        run_variant(args.variant, args.items, args.repeat)
+        return
+
+    print('{:<20} {:>10} {:>12} {:>12}'.format('variant', 'decode ms', 'RSS KB', 'retained KB'))
+    for variant in VARIANTS:
+        output = subprocess.check_output([sys.executable, '-m', 'benchmarks.worklist_decoding',
+                                          '--items', str(args.items), '--repeat', str(args.repeat),
+                                          '--variant', variant])
+        result = json.loads(output.decode().strip().splitlines()[-1])
+        print('{:<20} {:>10.1f} {:>12} {:>12}'.format(result['variant'], result['decode_ms'], result['rss_kb'],
+                                                      result['retained_kb']))
+
+
+if __name__ == '__main__':
+    main()
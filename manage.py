@@ -1,4 +1,7 @@
 from flask_script import Manager
+from verification_ui.custom_extensions.cachebust_static_assets.main import build_manifest as build_assets_manifest
+from verification_ui.custom_extensions.gzip_static_assets.main import precompress as precompress_assets
+from verification_ui.custom_extensions.template_cache.main import compile_templates as compile_app_templates
 from verification_ui.main import app
 import os
 
@@ -17,5 +20,45 @@ def runserver(port=8004):
     app.run(port=int(port), ssl_context=('/supporting-files/ssl.cert', '/supporting-files/ssl.key'))
 
 
+@manager.command
+def build_manifest():
+    """Copy the built static assets to names including a hash of their contents, and write a manifest of them"""
+
+    manifest = build_assets_manifest(app.static_folder, app.config.get('STATIC_ASSETS_MANIFEST', 'manifest.json'))
+    for filename, hashed_filename in sorted(manifest.items()):
+        print('{} -> {}'.format(filename, hashed_filename))
+
+
+@manager.command
+def precompress():
+    """Write gzip and Brotli compressed copies of the built static assets, to be served as they are"""
+
+    totals = {}
+    for path, size, sizes in precompress_assets(app.static_folder):
+        report = ['{:<40} {:>9,}'.format(path, size)]
+        for encoding in ('gzip', 'br'):
+            if encoding in sizes:
+                report.append('{} {:>9,} ({:.1%})'.format(encoding, sizes[encoding], sizes[encoding] / size))
+                totals[encoding] = totals.get(encoding, 0) + sizes[encoding]
+        print('  '.join(report))
+
+    for encoding, total in sorted(totals.items()):
+        print('{} total {:,} bytes'.format(encoding, total))
+
+
+@manager.command
+def compile_templates():
+    """Compile every template into the bytecode cache, so workers load them rather than compiling them"""
+
+    if not app.config.get('TEMPLATE_BYTECODE_CACHE_DIR'):
+        print('TEMPLATE_BYTECODE_CACHE_DIR is not set, so there is nowhere to keep the compiled templates')
+        return
+
+    compiled, failed = compile_app_templates(app)
+    for name, error in failed:
+        print('Could not compile {}: {}'.format(name, error))
+    print('{} templates compiled into {}'.format(len(compiled), app.config['TEMPLATE_BYTECODE_CACHE_DIR']))
+
+
 if __name__ == "__main__":
     manager.run()
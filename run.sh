@@ -1,5 +1,7 @@
 #!/bin/bash
 
 cp /supporting-files/package-lock.json .
-npm run build &
+# Built before gunicorn starts, as each worker reads the manifest once when it starts
+npm run build && python3 manage.py build_manifest && python3 manage.py precompress
+python3 manage.py compile_templates
 /usr/bin/gunicorn -k eventlet --pythonpath /src --access-logfile - manage:manager.app --reload --keyfile /supporting-files/ssl.key --certfile /supporting-files/ssl.cert
@@ -0,0 +1,135 @@
+import asyncio
+import json
+import threading
+import time
+import unittest
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+from verification_ui.dependencies.async_verification_api import AsyncVerificationAPI
+from verification_ui.dependencies.records import CaseSummary
+from verification_ui.exceptions import ApplicationError
+
+
+class StubAPIHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    posted = []
+
+    def do_GET(self):
+        if self.path == '/v1/case/1':
+            self._send(200, {'case_id': 1, 'staff_id': None})
+        elif self.path == '/v1/worklist':
+            self._send(200, [{'case_id': 2, 'date_added': '2019-01-02'}, {'case_id': 1, 'date_added': '2019-01-01'}])
+        elif self.path == '/v1/slow':
+            time.sleep(0.5)
+            self._send(200, {})
+        elif self.path == '/v1/broken':
+            self._send(500, {'error': 'Test error'})
+        else:
+            self._send(404, {})
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length', 0))
+        StubAPIHandler.posted.append((self.path, self.rfile.read(length).decode(), self.headers.get('X-Trace-ID')))
+        self.send_response(204)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def _send(self, status, body):
+        body = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class StubAPI(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class TestAsyncVerificationAPI(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = StubAPI(('127.0.0.1', 0), StubAPIHandler)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.base_url = 'http://127.0.0.1:{}/v1'.format(cls.server.server_port)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        StubAPIHandler.posted = []
+        self.loop = asyncio.new_event_loop()
+
+    def tearDown(self):
+        self.loop.close()
+
+    def run_with_api(self, call, **kwargs):
+        async def run():
+            async with AsyncVerificationAPI(base_url=self.base_url, **kwargs) as verification_api:
+                return await call(verification_api)
+
+        return self.loop.run_until_complete(run())
+
+    def test_get_item(self):
+        response = self.run_with_api(lambda api: api.get_item(1))
+
+        self.assertEqual(response, {'case_id': 1, 'staff_id': None})
+
+    def test_get_worklist(self):
+        response = self.run_with_api(lambda api: api.get_worklist(limit=1))
+
+        self.assertEqual(response, [CaseSummary.from_dict({'case_id': 1, 'date_added': '2019-01-01'})])
+        self.assertEqual(response.total, 2)
+
+    def test_post_sends_json_and_trace_id(self):
+        response = self.run_with_api(lambda api: api.lock(1, 'cs999jb'), trace_id='abc123')
+
+        self.assertEqual(response, {})
+        self.assertEqual(StubAPIHandler.posted, [('/v1/case/1/lock', '{"staff_id": "cs999jb"}', 'abc123')])
+
+    def test_not_found(self):
+        with self.assertRaises(ApplicationError) as context:
+            self.run_with_api(lambda api: api.get_item(404))
+
+        self.assertEqual(context.exception.http_code, 404)
+        self.assertEqual(context.exception.code, 'E401')
+
+    def test_http_error(self):
+        with self.assertRaises(ApplicationError) as context:
+            self.run_with_api(lambda api: api._request('broken'))
+
+        self.assertEqual(context.exception.code, 'E401')
+
+    def test_timeout(self):
+        with self.assertRaises(ApplicationError) as context:
+            self.run_with_api(lambda api: api._request('slow'), timeout=0.1)
+
+        self.assertEqual(context.exception.code, 'E403')
+
+    def test_connection_error(self):
+        async def run():
+            async with AsyncVerificationAPI(base_url='http://127.0.0.1:9/v1') as verification_api:
+                return await verification_api.get_item(1)
+
+        with self.assertRaises(ApplicationError) as context:
+            self.loop.run_until_complete(run())
+
+        self.assertEqual(context.exception.code, 'E402')
+
+    def test_fan_out(self):
+        results = self.run_with_api(lambda api: api.fan_out({
+            'case': api.get_item(1),
+            'missing': api.get_item(404),
+            'slow': api._request('slow')
+        }, deadline=0.3))
+
+        self.assertEqual(results['case'].get(), {'case_id': 1, 'staff_id': None})
+        self.assertEqual(results['missing'].error.http_code, 404)
+        self.assertIn('Deadline of 0.3s exceeded', results['slow'].error.message)
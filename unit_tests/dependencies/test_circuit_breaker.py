@@ -0,0 +1,121 @@
+import unittest
+from flask import g
+from unittest import mock
+from verification_ui.dependencies.circuit_breaker import CircuitBreaker, CircuitBreakers
+from verification_ui.exceptions import ApplicationError, CircuitOpenError, application_error
+from verification_ui.main import app
+
+
+class TestCircuitBreaker(unittest.TestCase):
+
+    def setUp(self):
+        self.breaker = CircuitBreaker('worklist', failure_rate=0.5, minimum_calls=4, window_size=10,
+                                      probe_interval=30)
+
+    def fail(self, times):
+        for _ in range(times):
+            self.breaker.before_call()
+            self.breaker.record_failure()
+
+    def test_stays_closed_below_minimum_calls(self):
+        self.fail(3)
+
+        self.assertEqual(self.breaker.status()['state'], 'closed')
+        self.breaker.before_call()
+
+    def test_stays_closed_below_failure_rate(self):
+        for _ in range(5):
+            self.breaker.before_call()
+            self.breaker.record_success()
+        self.fail(4)
+
+        self.assertEqual(self.breaker.status(), {'state': 'closed', 'recent_calls': 9, 'recent_failure_rate': 0.44})
+
+    def test_opens_at_failure_rate(self):
+        self.fail(4)
+
+        self.assertEqual(self.breaker.status()['state'], 'open')
+        with self.assertRaises(CircuitOpenError) as context:
+            self.breaker.before_call()
+        self.assertEqual(context.exception.code, 'E503')
+
+    @mock.patch('verification_ui.dependencies.circuit_breaker.time.time')
+    def test_half_open_probe_closes_on_success(self, mock_time):
+        mock_time.return_value = 1000
+        self.fail(4)
+
+        mock_time.return_value = 1031
+        self.breaker.before_call()
+        self.assertEqual(self.breaker.status()['state'], 'half-open')
+        # Only one probe at a time
+        with self.assertRaises(CircuitOpenError):
+            self.breaker.before_call()
+
+        self.breaker.record_success()
+        self.assertEqual(self.breaker.status(), {'state': 'closed', 'recent_calls': 1, 'recent_failure_rate': 0})
+
+    @mock.patch('verification_ui.dependencies.circuit_breaker.time.time')
+    def test_half_open_probe_reopens_on_failure(self, mock_time):
+        mock_time.return_value = 1000
+        self.fail(4)
+
+        mock_time.return_value = 1031
+        self.breaker.before_call()
+        self.breaker.record_failure()
+
+        self.assertEqual(self.breaker.status()['state'], 'open')
+        with self.assertRaises(CircuitOpenError):
+            self.breaker.before_call()
+
+    @mock.patch('verification_ui.dependencies.circuit_breaker.time.time')
+    def test_inconclusive_probe_lets_another_through(self, mock_time):
+        mock_time.return_value = 1000
+        self.fail(4)
+
+        mock_time.return_value = 1031
+        self.breaker.before_call()
+        self.breaker.record_inconclusive()
+
+        self.breaker.before_call()
+        self.assertEqual(self.breaker.status()['state'], 'half-open')
+
+    def test_one_breaker_per_family(self):
+        breakers = CircuitBreakers(failure_rate=0.5, minimum_calls=4, window_size=10, probe_interval=30)
+
+        self.assertIs(breakers.get('worklist'), breakers.get('worklist'))
+        self.assertIsNot(breakers.get('worklist'), breakers.get('search'))
+        self.assertEqual(sorted(breakers.status()), ['search', 'worklist'])
+
+
+class TestServiceDegraded(unittest.TestCase):
+
+    def test_json_response(self):
+        with app.test_request_context('/', headers=[('Accept', 'application/json')]):
+            g.trace_id = 'test-trace-id'
+            response, http_code = application_error(CircuitOpenError('worklist'))
+
+        self.assertEqual(http_code, 503)
+        self.assertEqual(response.get_json()['code'], 'E503')
+
+    def test_error_raised_while_handling_open_circuit(self):
+        with app.test_request_context('/', headers=[('Accept', 'application/json')]):
+            g.trace_id = 'test-trace-id'
+            # Views usually catch errors from the API and raise their own
+            try:
+                try:
+                    raise CircuitOpenError('worklist')
+                except ApplicationError:
+                    raise ApplicationError('Failed to get worklist', 'E999')
+            except ApplicationError as e:
+                response, http_code = application_error(e)
+
+        self.assertEqual(http_code, 503)
+        self.assertEqual(response.get_json()['code'], 'E503')
+
+    def test_page(self):
+        with app.test_request_context('/'):
+            g.trace_id = 'test-trace-id'
+            page, http_code = application_error(CircuitOpenError('worklist'))
+
+        self.assertEqual(http_code, 503)
+        self.assertIn('Service degraded', page)
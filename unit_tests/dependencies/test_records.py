@@ -0,0 +1,80 @@
+import json
+import os
+import unittest
+from unittest import mock
+from verification_ui.main import app
+from verification_ui.dependencies.records import CaseSummary, to_case_summaries
+from verification_ui.utils import json_utils
+from verification_ui.utils.formatting_utils import build_row, build_details_table
+
+
+dir_ = os.path.dirname(os.path.abspath(__file__))
+personal_item_data = open(os.path.join(dir_, '../data/personal_item.json'), 'r').read()
+uk_org_item_data = open(os.path.join(dir_, '../data/uk_org_item.json'), 'r').read()
+
+
+class TestRecords(unittest.TestCase):
+
+    def setUp(self):
+        self.test_personal_item = json.loads(personal_item_data)
+        self.test_uk_org_item = json.loads(uk_org_item_data)
+
+    def test_fields_read_like_a_dict(self):
+        record = CaseSummary.from_dict(self.test_uk_org_item)
+
+        self.assertEqual(record['case_id'], 2)
+        self.assertEqual(record['registration_data']['organisation_name'], 'Test Organisation')
+        self.assertEqual(record.get('status'), 'Pending')
+        self.assertEqual(record.get('notes', []), [])
+        self.assertNotIn('notes', record)
+        with self.assertRaises(KeyError):
+            record['notes']
+
+    def test_missing_fields_are_none(self):
+        record = CaseSummary.from_dict({'case_id': 1})
+
+        self.assertIsNone(record['registration_data'])
+        self.assertIsNone(record.get('status'))
+
+    def test_records_are_read_only(self):
+        record = CaseSummary.from_dict(self.test_personal_item)
+
+        with self.assertRaises(AttributeError):
+            record.status = 'Approved'
+        with self.assertRaises(AttributeError):
+            record.notes = []
+
+    def test_formatting_gives_same_output_as_dict(self):
+        items = [self.test_personal_item, self.test_uk_org_item]
+        records = to_case_summaries(items)
+
+        with app.test_request_context():
+            with mock.patch('verification_ui.utils.formatting_utils.session', {'username': 'LRTM101'}):
+                for item, record in zip(items, records):
+                    self.assertEqual(build_row(record, selectable=True), build_row(item, selectable=True))
+                    self.assertEqual(build_row(record, for_search=True), build_row(item, for_search=True))
+                    self.assertEqual(build_details_table(record), build_details_table(item))
+
+
+class TestJsonUtils(unittest.TestCase):
+
+    def test_loads_falls_back_to_json(self):
+        with mock.patch.object(json_utils, 'fast_loads', None):
+            self.assertEqual(json_utils.loads(b'[{"case_id": 1}]'), [{'case_id': 1}])
+
+    def test_decode_response_uses_fast_decoder(self):
+        response = mock.Mock(content=b'[{"case_id": 1}]')
+        fast_loads = mock.Mock(return_value=[{'case_id': 1}])
+
+        with mock.patch.object(json_utils, 'fast_loads', fast_loads):
+            self.assertEqual(json_utils.decode_response(response), [{'case_id': 1}])
+
+        fast_loads.assert_called_once_with(b'[{"case_id": 1}]')
+        response.json.assert_not_called()
+
+    def test_decode_response_falls_back_to_requests(self):
+        response = mock.Mock()
+        response.json.return_value = [{'case_id': 1}]
+
+        with mock.patch.object(json_utils, 'fast_loads', None):
+            self.assertEqual(json_utils.decode_response(response), [{'case_id': 1}])
@@ -0,0 +1,63 @@
+import threading
+import time
+import unittest
+from verification_ui.dependencies.single_flight import SingleFlight
+
+
+class TestSingleFlight(unittest.TestCase):
+
+    def run_concurrently(self, single_flight, key, call, count):
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(self.capture(single_flight, key, call)))
+                   for _ in range(count)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(5)
+        return results
+
+    @staticmethod
+    def capture(single_flight, key, call):
+        try:
+            return single_flight.do(key, call)
+        except Exception as e:
+            return e
+
+    def test_concurrent_calls_are_collapsed(self):
+        single_flight = SingleFlight()
+        calls = []
+        result = {'case_id': 1}
+
+        def call():
+            calls.append(1)
+            time.sleep(0.2)
+            return result
+
+        results = self.run_concurrently(single_flight, 'worklist', call, 5)
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(len(results), 5)
+        for value in results:
+            self.assertIs(value, result)
+        self.assertEqual(single_flight.stats(), {'calls': 1, 'collapsed': 4, 'in_flight': 0})
+
+    def test_error_is_shared_with_waiters(self):
+        single_flight = SingleFlight()
+        error = ValueError('Test error')
+
+        def call():
+            time.sleep(0.2)
+            raise error
+
+        results = self.run_concurrently(single_flight, 'worklist', call, 3)
+
+        self.assertEqual(results, [error, error, error])
+
+    def test_sequential_calls_are_not_collapsed(self):
+        single_flight = SingleFlight()
+
+        single_flight.do('worklist', lambda: 1)
+        single_flight.do('worklist', lambda: 2)
+        self.assertEqual(single_flight.do('case/1', lambda: 3), 3)
+
+        self.assertEqual(single_flight.stats(), {'calls': 3, 'collapsed': 0, 'in_flight': 0})
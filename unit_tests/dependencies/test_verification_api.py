@@ -1,13 +1,25 @@
 import unittest
 import requests
 import json
+import threading
+import time
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
 from unittest import mock
 from unittest.mock import MagicMock
+from flask import g
 from werkzeug.datastructures import ImmutableMultiDict
 from requests.exceptions import HTTPError, ConnectionError, Timeout
 from verification_ui.main import app
-from verification_ui.dependencies.verification_api import VerificationAPI
-from verification_ui.exceptions import ApplicationError
+from verification_ui.extensions import reference_data_cache
+from verification_ui.dependencies.circuit_breaker import CircuitBreakers
+from verification_ui.dependencies.records import CaseSummary, to_case_summaries
+from verification_ui.dependencies.retry_budget import RetryBudget
+from verification_ui.custom_extensions.http_connection_pool.main import TracedSession
+from verification_ui.dependencies.verification_api import VerificationAPI, conditional_get_store, single_flight, \
+    endpoint_family
+from verification_ui.exceptions import ApplicationError, CircuitOpenError
 
 
 def use_test_request_context(func):
@@ -21,6 +33,37 @@ def use_test_request_context(func):
     return run_with_context
 
 
+class StubAPIHandler(BaseHTTPRequestHandler):
+    """Serves the same worklist every time, with an ETag so it can be requested conditionally"""
+    protocol_version = 'HTTP/1.1'
+    body = json.dumps([{'case_id': case_id, 'notes': ['note'] * 100} for case_id in range(50)]).encode()
+    etag = '"worklist-v1"'
+    bytes_sent = 0
+
+    def do_GET(self):
+        if self.headers.get('If-None-Match') == self.etag:
+            self.send_response(304)
+            self.send_header('ETag', self.etag)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('ETag', self.etag)
+        self.send_header('Content-Length', str(len(self.body)))
+        self.end_headers()
+        self.wfile.write(self.body)
+        StubAPIHandler.bytes_sent += len(self.body)
+
+    def log_message(self, *args):
+        pass
+
+
+class StubAPI(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
 class TestVerificationAPI(unittest.TestCase):
     def setUp(self):
         self.app = app.test_client()
@@ -33,6 +76,26 @@ class TestVerificationAPI(unittest.TestCase):
         self.close_reason = 'This is a test reason'
         self.note_text = 'This is a test note'
 
+        with app.app_context():
+            reference_data_cache.purge()
+        conditional_get_store.entries.clear()
+
+        # Each test gets a full retry budget, and doesn't wait around before retrying
+        budget_patch = mock.patch('verification_ui.dependencies.verification_api.retry_budget',
+                                  RetryBudget(ratio=0.1, reserve=10))
+        self.retry_budget = budget_patch.start()
+        self.addCleanup(budget_patch.stop)
+        backoff_patch = mock.patch('verification_ui.dependencies.verification_api.backoff', return_value=0)
+        self.backoff = backoff_patch.start()
+        self.addCleanup(backoff_patch.stop)
+
+        # and starts with every circuit breaker closed
+        breakers_patch = mock.patch('verification_ui.dependencies.verification_api.circuit_breakers',
+                                    CircuitBreakers(failure_rate=0.5, minimum_calls=10, window_size=20,
+                                                    probe_interval=30))
+        self.circuit_breakers = breakers_patch.start()
+        self.addCleanup(breakers_patch.stop)
+
     @mock.patch("requests.Session.get")
     @use_test_request_context
     def test_get_worklist(self, mock_get):
@@ -42,7 +105,223 @@ class TestVerificationAPI(unittest.TestCase):
         verification_api = VerificationAPI()
         response = verification_api.get_worklist()
 
+        self.assertEqual(response, [CaseSummary.from_dict({'case_id': 1})])
+
+    @mock.patch("requests.Session.get")
+    @use_test_request_context
+    def test_get_worklist_page(self, mock_get):
+        mock_get.return_value.json.return_value = [
+            {'case_id': 2, 'date_added': '2019-01-02', 'status': 'Pending'},
+            {'case_id': 1, 'date_added': '2019-01-01', 'status': 'Pending'}
+        ]
+        mock_get.return_value.status_code = 200
+
+        verification_api = VerificationAPI()
+        response = verification_api.get_worklist(sort_by='date_added', limit=1)
+
+        self.assertEqual(response, [CaseSummary.from_dict({'case_id': 1, 'date_added': '2019-01-01',
+                                                           'status': 'Pending'})])
+        self.assertEqual(response.total, 2)
+        self.assertIsNotNone(response.next_cursor)
+
+    @mock.patch("requests.Session.get")
+    @use_test_request_context
+    def test_concurrent_worklist_gets_are_collapsed(self, mock_get):
+        def slow_get(*args, **kwargs):
+            time.sleep(0.2)
+            return mock.Mock(status_code=200, headers={}, json=mock.Mock(return_value=[{'case_id': 1}]))
+
+        mock_get.side_effect = slow_get
+        collapsed_before = single_flight.stats()['collapsed']
+
+        verification_api = VerificationAPI()
+        results = verification_api.fan_out({name: verification_api.get_worklist for name in 'abcde'})
+
+        self.assertEqual(mock_get.call_count, 1)
+        self.assertEqual(single_flight.stats()['collapsed'] - collapsed_before, 4)
+        for result in results.values():
+            self.assertEqual(result.get(), [CaseSummary.from_dict({'case_id': 1})])
+
+    @mock.patch("requests.Session.post")
+    @use_test_request_context
+    def test_bulk_lock(self, mock_post):
+        mock_post.return_value.status_code = 200
+        mock_post.return_value.json.return_value = {}
+
+        verification_api = VerificationAPI()
+        results = verification_api.bulk_lock(['1', '2', '3'], self.staff_id)
+
+        self.assertEqual(list(results), ['1', '2', '3'])
+        self.assertEqual(mock_post.call_count, 3)
+        posted_urls = sorted(call[0][0] for call in mock_post.call_args_list)
+        self.assertEqual(posted_urls, ['{}/case/{}/lock'.format(verification_api.base_url, item_id)
+                                       for item_id in ('1', '2', '3')])
+        for result in results.values():
+            self.assertIsNone(result.error)
+
+    @mock.patch("requests.Session.post")
+    @use_test_request_context
+    def test_bulk_unlock_reports_each_failure(self, mock_post):
+        def post(url, **kwargs):
+            if '/2/' in url:
+                raise ConnectionError(self.error_msg)
+            return mock.Mock(status_code=204)
+
+        mock_post.side_effect = post
+
+        verification_api = VerificationAPI()
+        results = verification_api.bulk_unlock(['1', '2'])
+
+        self.assertEqual(results['1'].get(), {})
+        self.assertIsInstance(results['2'].error, ApplicationError)
+
+    @mock.patch("requests.Session.post")
+    @use_test_request_context
+    def test_bulk_actions_have_their_own_deadline(self, mock_post):
+        mock_post.return_value.status_code = 200
+        mock_post.return_value.json.return_value = {}
+        # The request's own deadline has already passed
+        request_session = TracedSession(requests.Session(), 'trace-123', deadline=time.time() - 1)
+        g.requests = request_session
+
+        verification_api = VerificationAPI()
+        results = verification_api.bulk_lock(['1', '2'], self.staff_id)
+
+        self.assertIsNone(results['1'].error)
+        self.assertIsNone(results['2'].error)
+        remaining = int(mock_post.call_args[1]['headers']['X-Deadline-Remaining-Ms'])
+        self.assertGreater(remaining, (app.config['VERIFICATION_API_BULK_DEADLINE'] - 5) * 1000)
+        self.assertIs(g.requests, request_session)
+
+    @mock.patch("requests.Session.post")
+    @mock.patch("requests.Session.get")
+    @use_test_request_context
+    def test_bulk_approve_skips_cases_locked_to_someone_else(self, mock_get, mock_post):
+        def get(url, **kwargs):
+            staff_id = 'someone_else' if url.endswith('/2') else self.staff_id
+            return mock.Mock(status_code=200, headers={}, json=mock.Mock(return_value={'staff_id': staff_id}))
+
+        mock_get.side_effect = get
+        mock_post.return_value.status_code = 200
+        mock_post.return_value.json.return_value = {}
+
+        verification_api = VerificationAPI()
+        results = verification_api.bulk_approve(['1', '2'], self.staff_id)
+
+        self.assertIsNone(results['1'].error)
+        self.assertEqual(results['2'].error.http_code, 409)
+        self.assertEqual(mock_post.call_count, 1)
+
+    @mock.patch("requests.Session.get")
+    @use_test_request_context
+    def test_get_uses_endpoint_timeouts(self, mock_get):
+        mock_get.return_value.status_code = 204
+
+        verification_api = VerificationAPI()
+        verification_api.get_decline_reasons()
+        verification_api.get_dataset_activity(self.item_id)
+
+        timeouts = [call[1]['timeout'] for call in mock_get.call_args_list]
+        connect = app.config['VERIFICATION_API_CONNECT_TIMEOUT']
+        self.assertEqual(timeouts, [(connect, app.config['VERIFICATION_API_READ_TIMEOUTS']['decline-reasons']),
+                                    (connect, app.config['VERIFICATION_API_READ_TIMEOUTS']['dataset-activity'])])
+
+    def test_endpoint_family(self):
+        self.assertEqual(endpoint_family('worklist'), 'worklist')
+        self.assertEqual(endpoint_family('case/1'), 'case')
+        self.assertEqual(endpoint_family('case/1/lock'), 'case-update')
+        self.assertEqual(endpoint_family('dataset-activity/1'), 'dataset-activity')
+
+    @mock.patch("requests.Session.get")
+    @use_test_request_context
+    def test_get_retried_after_unavailable(self, mock_get):
+        unavailable = mock.Mock(status_code=503)
+        ok = mock.Mock(status_code=200, headers={})
+        ok.json.return_value = [{'case_id': 1}]
+        mock_get.side_effect = [unavailable, ok]
+
+        verification_api = VerificationAPI()
+        response = verification_api.get_dataset_activity(self.item_id)
+
         self.assertEqual(response, [{'case_id': 1}])
+        self.assertEqual(mock_get.call_count, 2)
+        self.assertEqual(self.retry_budget.stats()['retries'], 1)
+
+    @mock.patch("requests.Session.post")
+    @use_test_request_context
+    def test_post_not_retried(self, mock_post):
+        mock_post.side_effect = ConnectionError(self.error_msg)
+
+        with self.assertRaises(ApplicationError):
+            verification_api = VerificationAPI()
+            verification_api.lock(self.item_id, self.staff_id)
+
+        mock_post.assert_called_once()
+
+    @mock.patch("requests.Session.get")
+    @use_test_request_context
+    def test_retries_limited_by_budget(self, mock_get):
+        mock_get.side_effect = Timeout(self.error_msg)
+        budget = RetryBudget(ratio=0.1, reserve=1)
+
+        with mock.patch('verification_ui.dependencies.verification_api.retry_budget', budget):
+            verification_api = VerificationAPI()
+            for _ in range(3):
+                with self.assertRaises(ApplicationError):
+                    verification_api.get_dataset_activity(self.item_id)
+
+        # One retry from the reserve, after which the budget only builds back up by 0.1 per request
+        self.assertEqual(mock_get.call_count, 4)
+        self.assertEqual(budget.stats()['retries'], 1)
+        self.assertEqual(budget.stats()['retries_refused'], 3)
+
+    @mock.patch("requests.Session.get")
+    @use_test_request_context
+    def test_no_call_once_deadline_has_passed(self, mock_get):
+        g.requests = TracedSession(requests.Session(), 'trace-123', deadline=time.time() - 1)
+
+        with self.assertRaises(ApplicationError) as context:
+            verification_api = VerificationAPI()
+            verification_api.get_dataset_activity(self.item_id)
+
+        mock_get.assert_not_called()
+        self.assertEqual(context.exception.code, 'E403')
+
+    @mock.patch("requests.Session.get")
+    @use_test_request_context
+    def test_circuit_opens_after_failures(self, mock_get):
+        mock_get.side_effect = ConnectionError(self.error_msg)
+        verification_api = VerificationAPI()
+
+        for _ in range(10):
+            with self.assertRaises(ApplicationError) as context:
+                verification_api.get_dataset_activity(self.item_id)
+            self.assertEqual(context.exception.code, 'E402')
+        calls_before_open = mock_get.call_count
+
+        with self.assertRaises(CircuitOpenError) as context:
+            verification_api.get_dataset_activity(self.item_id)
+
+        self.assertEqual(mock_get.call_count, calls_before_open)
+        self.assertEqual(context.exception.http_code, 503)
+        self.assertEqual(self.circuit_breakers.status()['dataset-activity']['state'], 'open')
+        # Other parts of the API have their own breakers
+        mock_get.side_effect = None
+        mock_get.return_value.status_code = 204
+        self.assertEqual(verification_api.get_user_dataset_access(self.item_id), {})
+
+    @mock.patch("requests.Session.get")
+    @use_test_request_context
+    def test_not_found_does_not_count_as_failure(self, mock_get):
+        mock_get.return_value.status_code = 404
+        verification_api = VerificationAPI()
+
+        for _ in range(20):
+            with self.assertRaises(ApplicationError) as context:
+                verification_api.get_dataset_activity(self.item_id)
+            self.assertEqual(context.exception.http_code, 404)
+
+        self.assertEqual(self.circuit_breakers.status()['dataset-activity']['state'], 'closed')
 
     @mock.patch("requests.Session.get")
     @use_test_request_context
@@ -335,6 +614,19 @@ class TestVerificationAPI(unittest.TestCase):
         self.assertEqual(response, [{'decline_reason': 'test',
                                      'decline_text': 'This is a test decline reason'}])
 
+    @mock.patch("requests.Session.get")
+    @use_test_request_context
+    def test_get_decline_reasons_is_cached(self, mock_get):
+        mock_get.return_value.json.return_value = [{'decline_reason': 'test'}]
+        mock_get.return_value.status_code = 200
+
+        verification_api = VerificationAPI()
+        verification_api.get_decline_reasons()
+        response = verification_api.get_decline_reasons()
+
+        self.assertEqual(response, [{'decline_reason': 'test'}])
+        mock_get.assert_called_once()
+
     @mock.patch("requests.Session.get")
     @use_test_request_context
     def test_get_decline_reasons_http_error(self, mock_get):
@@ -447,7 +739,7 @@ class TestVerificationAPI(unittest.TestCase):
         verification_api = VerificationAPI()
         response = verification_api.perform_search(search_entries)
 
-        self.assertEqual(response, [{'case_id': 1}])
+        self.assertEqual(response, [CaseSummary.from_dict({'case_id': 1})])
         self.assertEqual(mock_post.call_count, 1)
 
     @mock.patch("requests.Session.post")
@@ -608,7 +900,8 @@ class TestVerificationAPI(unittest.TestCase):
             verification_api = VerificationAPI()
             verification_api.get_dataset_activity(case_id)
 
-        mock_get.assert_called_once()
+        # GETs are retried (twice by default) on connection errors and timeouts
+        self.assertEqual(mock_get.call_count, 1 + app.config['VERIFICATION_API_GET_RETRIES'])
         self.assertEqual(context.exception.message,
                          'Encountered an error connecting to verification_api: {}'.format(self.error_msg))
         self.assertEqual(context.exception.code, 'E402')
@@ -624,7 +917,8 @@ class TestVerificationAPI(unittest.TestCase):
             verification_api = VerificationAPI()
             verification_api.get_dataset_activity(case_id)
 
-        mock_get.assert_called_once()
+        # GETs are retried (twice by default) on connection errors and timeouts
+        self.assertEqual(mock_get.call_count, 1 + app.config['VERIFICATION_API_GET_RETRIES'])
         self.assertEqual(context.exception.message,
                          'Connection to verification_api timed out: {}'.format(self.error_msg))
         self.assertEqual(context.exception.code, 'E403')
@@ -777,3 +1071,137 @@ class TestVerificationAPI(unittest.TestCase):
                          'Connection to verification_api timed out: {}'.format(self.error_msg))
         self.assertEqual(context.exception.code, 'E403')
         self.assertEqual(context.exception.http_code, 500)
+
+    @use_test_request_context
+    def test_fan_out_returns_results_by_name(self):
+        verification_api = VerificationAPI()
+        results = verification_api.fan_out({'first': lambda: 1, 'second': lambda: 2})
+
+        self.assertEqual(results['first'].get(), 1)
+        self.assertEqual(results['second'].get(), 2)
+
+    @mock.patch("requests.Session.get")
+    @use_test_request_context
+    def test_fan_out_isolates_failed_calls(self, mock_get):
+        mock_get.side_effect = ConnectionError(self.error_msg)
+
+        verification_api = VerificationAPI()
+        results = verification_api.fan_out({'reasons': verification_api.get_decline_reasons,
+                                            'other': lambda: 'fine'})
+
+        self.assertEqual(results['other'].get(), 'fine')
+        with self.assertRaises(ApplicationError) as context:
+            results['reasons'].get()
+        self.assertEqual(context.exception.code, 'E402')
+
+    @use_test_request_context
+    def test_fan_out_deadline(self):
+        verification_api = VerificationAPI()
+        results = verification_api.fan_out({'slow': lambda: time.sleep(1), 'fast': lambda: 'fine'}, deadline=0.1)
+
+        self.assertEqual(results['fast'].get(), 'fine')
+        with self.assertRaises(ApplicationError) as context:
+            results['slow'].get()
+        self.assertEqual(context.exception.code, 'E403')
+
+    @use_test_request_context
+    def test_fan_out_does_not_start_calls_still_queued_at_the_deadline(self):
+        started = []
+        calls = OrderedDict([('slow', lambda: time.sleep(0.3)), ('queued', lambda: started.append('queued'))])
+
+        verification_api = VerificationAPI()
+        results = verification_api.fan_out(calls, deadline=0.1, max_workers=1)
+        time.sleep(0.4)
+
+        self.assertEqual(started, [])
+        for result in results.values():
+            with self.assertRaises(ApplicationError) as context:
+                result.get()
+            self.assertEqual(context.exception.code, 'E403')
+
+    @use_test_request_context
+    def test_fan_out_calls_stop_at_the_deadline(self):
+        request_session = TracedSession(requests.Session(), 'trace-123')
+        g.requests = request_session
+
+        verification_api = VerificationAPI()
+        remaining = verification_api.fan_out({'call': lambda: g.requests.remaining()}, deadline=5)['call'].get()
+
+        self.assertGreater(remaining, 4)
+        self.assertLessEqual(remaining, 5)
+        self.assertIs(g.requests, request_session)
+
+    @use_test_request_context
+    def test_fan_out_calls_keep_a_sooner_request_deadline(self):
+        g.requests = TracedSession(requests.Session(), 'trace-123', deadline=time.time() + 1)
+
+        verification_api = VerificationAPI()
+        remaining = verification_api.fan_out({'call': lambda: g.requests.remaining()}, deadline=5)['call'].get()
+
+        self.assertLessEqual(remaining, 1)
+
+    @use_test_request_context
+    def test_conditional_get_reuses_unchanged_worklist(self):
+        server = StubAPI(('127.0.0.1', 0), StubAPIHandler)
+        thread = threading.Thread(target=server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        StubAPIHandler.bytes_sent = 0
+        bytes_saved_before = conditional_get_store.stats()['bytes_saved']
+
+        try:
+            verification_api = VerificationAPI()
+            verification_api.base_url = 'http://127.0.0.1:{}/v1'.format(server.server_port)
+            first = verification_api.get_worklist()
+            second = verification_api.get_worklist()
+            third = verification_api.get_worklist()
+        finally:
+            server.shutdown()
+            server.server_close()
+
+        self.assertEqual(first, to_case_summaries(json.loads(StubAPIHandler.body.decode())))
+        self.assertEqual(verification_api.versions, {'worklist': StubAPIHandler.etag})
+        # The cases themselves are the ones parsed from the first response
+        self.assertIs(second[0], first[0])
+        self.assertIs(third[0], first[0])
+        # Only the first request downloaded the worklist, the other two were 304s
+        self.assertEqual(StubAPIHandler.bytes_sent, len(StubAPIHandler.body))
+        self.assertEqual(conditional_get_store.stats()['bytes_saved'] - bytes_saved_before,
+                         2 * len(StubAPIHandler.body))
+
+    @use_test_request_context
+    def test_dataset_activity_is_not_kept_for_conditional_gets(self):
+        server = StubAPI(('127.0.0.1', 0), StubAPIHandler)
+        thread = threading.Thread(target=server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        StubAPIHandler.bytes_sent = 0
+
+        try:
+            verification_api = VerificationAPI()
+            verification_api.base_url = 'http://127.0.0.1:{}/v1'.format(server.server_port)
+            verification_api.get_dataset_activity(self.item_id)
+            verification_api.get_dataset_activity(self.item_id)
+            url = '{}/dataset-activity/{}'.format(verification_api.base_url, self.item_id)
+            validators = conditional_get_store.validators(url)
+        finally:
+            server.shutdown()
+            server.server_close()
+
+        # Downloaded both times, as nothing was remembered to make the second one conditional on
+        self.assertEqual(validators, {})
+        self.assertEqual(StubAPIHandler.bytes_sent, 2 * len(StubAPIHandler.body))
+
+    @mock.patch("requests.Session.get")
+    @use_test_request_context
+    def test_not_modified_after_eviction_refetches(self, mock_get):
+        not_modified = MagicMock(status_code=304)
+        ok = MagicMock(status_code=200)
+        ok.json.return_value = [{'case_id': 1}]
+        mock_get.side_effect = [not_modified, ok]
+
+        verification_api = VerificationAPI()
+        response = verification_api.get_worklist()
+
+        self.assertEqual(response, [CaseSummary.from_dict({'case_id': 1})])
+        self.assertEqual(mock_get.call_count, 2)
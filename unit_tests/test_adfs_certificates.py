@@ -0,0 +1,204 @@
+import base64
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import textwrap
+import threading
+import time
+import unittest
+from unittest import mock
+from requests.exceptions import ConnectionError
+
+from verification_ui.main import app
+from verification_ui.exceptions import ApplicationError
+from verification_ui.custom_extensions.adfs_certificates.main import AdfsCertificates
+
+dir_ = os.path.dirname(os.path.abspath(__file__))
+METADATA = ('<EntityDescriptor><RoleDescriptor/><RoleDescriptor>{}</RoleDescriptor></EntityDescriptor>')
+KEY_DESCRIPTOR = ('<KeyDescriptor><KeyInfo><X509Data><X509Certificate>{}</X509Certificate></X509Data></KeyInfo>'
+                  '</KeyDescriptor>')
+
+
+def certificate(name):
+    """The base64 body of a test certificate, as it appears in the ADFS metadata"""
+    with open(os.path.join(dir_, 'data/adfs_signing_{}.crt'.format(name))) as certificate_file:
+        return ''.join(line for line in certificate_file.read().splitlines() if not line.startswith('-----'))
+
+
+def thumbprint(name):
+    der = base64.b64decode(certificate(name))
+    return base64.urlsafe_b64encode(hashlib.sha1(der).digest()).decode().rstrip('=')
+
+
+def metadata(*names):
+    return METADATA.format(''.join(KEY_DESCRIPTOR.format(certificate(name)) for name in names))
+
+
+def fetched(certificates):
+    """Thumbprints of the certificates there are keys for, fetching them if need be"""
+    certificates.keys_for({})
+    return certificates.stats()['certificates']
+
+
+def pem(name):
+    return '-----BEGIN CERTIFICATE-----\n{}\n-----END CERTIFICATE-----'.format(textwrap.fill(certificate(name), 64))
+
+
+class TestAdfsCertificates(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.cache_file = os.path.join(self.directory, 'adfs-certificates.json')
+
+        config_patch = mock.patch.dict(app.config, {'ADFS_CERTIFICATE_CACHE_FILE': self.cache_file,
+                                                    'ADFS_CERTIFICATE_REFRESH_INTERVAL': 0})
+        config_patch.start()
+        self.addCleanup(config_patch.stop)
+
+        get_patch = mock.patch('verification_ui.custom_extensions.adfs_certificates.main.requests.get')
+        self.mock_get = get_patch.start()
+        self.addCleanup(get_patch.stop)
+        self.mock_get.return_value.text = metadata(1, 2)
+
+    @mock.patch('verification_ui.custom_extensions.adfs_certificates.main.AdfsCertificates.init_app')
+    def test_extension_alternative_init(self, mock_init_app):
+        AdfsCertificates('foo')
+        mock_init_app.assert_called_once_with('foo')
+
+    def test_fetched_when_first_needed(self):
+        certificates = AdfsCertificates(app)
+
+        self.assertEqual(len(certificates.keys_for({})), 2)
+        self.assertEqual(len(certificates.keys_for({})), 2)
+        self.mock_get.assert_called_once_with('{}/federationMetadata/2007-06/federationmetadata.xml'.format(
+            app.config['ADFS_URL']), verify=False, timeout=app.config['ADFS_CERTIFICATE_TIMEOUT'])
+
+    def test_single_certificate(self):
+        self.mock_get.return_value.text = metadata(1)
+
+        self.assertEqual(fetched(AdfsCertificates(app)), [thumbprint(1)])
+
+    def test_connection_error_retried_once(self):
+        self.mock_get.side_effect = ConnectionError('nope')
+
+        with self.assertRaises(ApplicationError) as context:
+            AdfsCertificates(app).keys_for({})
+
+        self.assertEqual(context.exception.code, 'E802')
+        self.assertEqual(self.mock_get.call_count, 2)
+
+    def test_concurrent_refreshes_share_one_fetch(self):
+        started = threading.Event()
+        release = threading.Event()
+
+        def slow_get(*args, **kwargs):
+            started.set()
+            release.wait()
+            return mock.Mock(text=metadata(1))
+
+        self.mock_get.side_effect = slow_get
+        certificates = AdfsCertificates(app)
+        threads = [threading.Thread(target=certificates.refresh) for _ in range(5)]
+        threads[0].start()
+        started.wait()
+        for thread in threads[1:]:
+            thread.start()
+        time.sleep(0.05)
+        release.set()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(self.mock_get.call_count, 1)
+        self.assertEqual(certificates.stats()['refreshes'], 1)
+
+    def test_saved_for_new_workers(self):
+        AdfsCertificates(app).refresh()
+        with open(self.cache_file) as cache_file:
+            self.assertEqual(json.load(cache_file)['certificates'], [pem(1), pem(2)])
+
+        certificates = AdfsCertificates(app)
+
+        self.assertEqual(fetched(certificates), [thumbprint(1), thumbprint(2)])
+        self.assertEqual(self.mock_get.call_count, 1)
+        self.assertEqual(certificates.stats()['loaded_from_file'], 1)
+
+    def test_unreadable_file_ignored(self):
+        with open(self.cache_file, 'w') as cache_file:
+            cache_file.write('{"certif')
+
+        certificates = AdfsCertificates(app)
+
+        self.assertEqual(fetched(certificates), [thumbprint(1), thumbprint(2)])
+        self.assertEqual(self.mock_get.call_count, 1)
+
+    def test_file_others_can_write_to_ignored(self):
+        AdfsCertificates(app).refresh()
+        os.chmod(self.cache_file, 0o666)
+
+        certificates = AdfsCertificates(app)
+
+        self.assertEqual(certificates.stats()['loaded_from_file'], 0)
+
+    def test_file_in_directory_others_can_write_to_ignored(self):
+        AdfsCertificates(app).refresh()
+        os.chmod(self.directory, 0o777)
+
+        certificates = AdfsCertificates(app)
+
+        self.assertEqual(certificates.stats()['loaded_from_file'], 0)
+
+    def test_listeners_told_of_changes_only(self):
+        listener = mock.Mock()
+        certificates = AdfsCertificates(app)
+        certificates.on_change(listener)
+
+        certificates.refresh()
+        certificates.refresh()
+        self.assertEqual(listener.call_count, 1)
+
+        self.mock_get.return_value.text = metadata(2, 1)
+        certificates.refresh()
+        self.assertEqual(listener.call_count, 2)
+
+    def test_key_chosen_by_thumbprint(self):
+        certificates = AdfsCertificates(app)
+        all_keys = certificates.keys_for({'alg': 'RS256'})
+
+        self.assertEqual(certificates.keys_for({'x5t': thumbprint(2)}), all_keys[1:])
+        self.assertEqual(certificates.keys_for({'kid': thumbprint(1)}), all_keys[:1])
+        self.assertEqual(certificates.keys_for({'x5t': thumbprint(1) + '=', 'kid': thumbprint(1)}), all_keys[:1])
+        self.assertEqual(certificates.keys_for({'x5t': 'unknown'}), [])
+
+    def test_keys_only_parsed_on_refresh(self):
+        certificates = AdfsCertificates(app)
+        certificates.refresh()
+
+        with mock.patch('verification_ui.custom_extensions.adfs_certificates.main.jwk.construct') as mock_construct:
+            certificates.keys_for({'x5t': thumbprint(1)})
+            certificates.keys_for({'x5t': thumbprint(2)})
+
+        mock_construct.assert_not_called()
+
+    @mock.patch('verification_ui.custom_extensions.adfs_certificates.main.time.sleep')
+    def test_refreshed_in_background(self, mock_sleep):
+        app.config['ADFS_CERTIFICATE_REFRESH_INTERVAL'] = 60
+        certificates = AdfsCertificates(app)
+        refreshed = threading.Event()
+        # Park the background thread once it has refreshed
+        mock_sleep.side_effect = lambda seconds: threading.Event().wait()
+
+        with mock.patch.object(certificates, '_refresh_periodically') as mock_refresher:
+            certificates.keys_for({})
+            certificates.keys_for({})
+        mock_refresher.assert_called_once_with(60)
+
+        certificates.on_change(refreshed.set)
+        certificates._fetched_at = time.time() - 61
+        self.mock_get.return_value.text = metadata(2)
+        thread = threading.Thread(target=certificates._refresh_periodically, args=(60,))
+        thread.daemon = True
+        thread.start()
+        self.assertTrue(refreshed.wait(1))
+        self.assertEqual(fetched(certificates), [thumbprint(2)])
@@ -1,11 +1,15 @@
 import unittest
 from unittest import mock
+import json
 import os
+import shutil
+import tempfile
 from freezegun import freeze_time
+from flask import Flask
 
 from verification_ui.main import app
 from flask import render_template_string
-from verification_ui.custom_extensions.cachebust_static_assets.main import md5_for_file
+from verification_ui.custom_extensions.cachebust_static_assets.main import build_manifest, md5_for_file
 from verification_ui.custom_extensions.cachebust_static_assets.main import CachebustStaticAssets
 
 
@@ -13,6 +17,11 @@ class TestCachebustStaticAssets(unittest.TestCase):
     """These tests will only pass if STATIC_ASSETS_MODE is set to production. See unit_tests/__init__.py"""
     def setUp(self):
         self.app = app.test_client()
+        self.static_folder = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.static_folder)
+        os.mkdir(os.path.join(self.static_folder, 'stylesheets'))
+        with open(os.path.join(self.static_folder, 'stylesheets/test.css'), 'w') as test_file:
+            test_file.write('Hello')
 
     @mock.patch('verification_ui.custom_extensions.cachebust_static_assets.main.CachebustStaticAssets.init_app')
     def test_extension_alternative_init(self, mock_init_app):
@@ -45,37 +54,96 @@ class TestCachebustStaticAssets(unittest.TestCase):
 
         os.remove(filename)
 
-    def test_url_for_adds_cache_query_string(self):
-        filename = 'verification_ui/assets/dist/test.txt'
-        with open(filename, 'w+') as file:
-            file.write('Hello')
+    def test_build_manifest_writes_hashed_copies(self):
+        manifest = build_manifest(self.static_folder)
+
+        md5_value = md5_for_file(os.path.join(self.static_folder, 'stylesheets/test.css'), hexdigest=True)
+        self.assertEqual(manifest, {'stylesheets/test.css': 'stylesheets/test.{}.css'.format(md5_value[:10])})
+        with open(os.path.join(self.static_folder, manifest['stylesheets/test.css'])) as hashed_copy:
+            self.assertEqual(hashed_copy.read(), 'Hello')
+        with open(os.path.join(self.static_folder, 'manifest.json')) as manifest_file:
+            self.assertEqual(json.load(manifest_file), manifest)
+
+    def change_asset(self):
+        with open(os.path.join(self.static_folder, 'stylesheets/test.css'), 'a') as test_file:
+            test_file.write(' World')
+
+    def test_build_manifest_keeps_only_previous_builds_hashed_copies(self):
+        first = build_manifest(self.static_folder)['stylesheets/test.css']
+        self.change_asset()
+        second = build_manifest(self.static_folder)['stylesheets/test.css']
+
+        self.assertNotEqual(first, second)
+        # Still linked to by workers started before the second build
+        self.assertTrue(os.path.exists(os.path.join(self.static_folder, first)))
+        self.assertTrue(os.path.exists(os.path.join(self.static_folder, second)))
+
+        self.change_asset()
+        third = build_manifest(self.static_folder)['stylesheets/test.css']
+
+        self.assertFalse(os.path.exists(os.path.join(self.static_folder, first)))
+        self.assertTrue(os.path.exists(os.path.join(self.static_folder, second)))
+        self.assertTrue(os.path.exists(os.path.join(self.static_folder, third)))
+        # And neither the hashed copies nor the previous manifest are hashed again
+        self.assertEqual(len(build_manifest(self.static_folder)), 1)
+
+    def test_manifest_changing_after_init_app(self):
+        build_manifest(self.static_folder)
+        test_app = self.cachebusted_app()
+        client = test_app.test_client()
+        with test_app.test_request_context('/'):
+            linked = render_template_string("{{ url_for('static', filename='stylesheets/test.css') }}")
+
+        self.change_asset()
+        build_manifest(self.static_folder)
+
+        # The app still links to the copy from when it started, which is still there
+        with test_app.test_request_context('/'):
+            self.assertEqual(render_template_string("{{ url_for('static', filename='stylesheets/test.css') }}"),
+                             linked)
+        response = client.get(linked)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, b'Hello')
+        response.close()
 
-        with app.test_request_context('/'):
-            output = render_template_string("{{ url_for('static', filename='test.txt') }}")
+    def test_url_for_uses_hashed_filename_from_manifest(self):
+        manifest = build_manifest(self.static_folder)
+        test_app = self.cachebusted_app()
 
-        md5_value = md5_for_file(filename, hexdigest=True)
+        with test_app.test_request_context('/'), \
+                mock.patch('os.path.isfile') as mock_isfile, mock.patch('builtins.open') as mock_open:
+            output = render_template_string("{{ url_for('static', filename='stylesheets/test.css') }}")
 
-        self.assertIn('?cache={}'.format(md5_value), output)
+        # Looked up in the manifest, without touching the disk
+        mock_isfile.assert_not_called()
+        mock_open.assert_not_called()
+        self.assertEqual(output, '/ui/' + manifest['stylesheets/test.css'])
 
-        os.remove(filename)
+    def test_url_for_adds_cache_query_string_without_manifest(self):
+        test_app = self.cachebusted_app()
 
-    @mock.patch('verification_ui.custom_extensions.cachebust_static_assets.main.md5_for_file', wraps=md5_for_file)
-    def test_repeated_url_for_calls_hits_cache_not_disk(self, mock_md5_for_file):
-        filename = 'verification_ui/assets/dist/test.txt'
-        with open(filename, 'w+') as file:
-            file.write('Hello')
+        with test_app.test_request_context('/'):
+            output = render_template_string("{{ url_for('static', filename='stylesheets/test.css') }}")
 
-        with app.test_request_context('/'):
-            hash_one = render_template_string("{{ url_for('static', filename='test.txt') }}")
-            hash_two = render_template_string("{{ url_for('static', filename='test.txt') }}")
-            hash_three = render_template_string("{{ url_for('static', filename='test.txt') }}")
+        md5_value = md5_for_file(os.path.join(self.static_folder, 'stylesheets/test.css'), hexdigest=True)
+        self.assertIn('?cache={}'.format(md5_value), output)
 
-            self.assertEqual(mock_md5_for_file.call_count, 1)
+    def test_hashed_assets_are_immutable(self):
+        manifest = build_manifest(self.static_folder)
+        client = self.cachebusted_app().test_client()
 
-        self.assertEqual(hash_one, hash_two)
-        self.assertEqual(hash_two, hash_three)
+        response = client.get('/ui/' + manifest['stylesheets/test.css'])
+        self.assertIn('immutable', response.headers['Cache-Control'])
+        response.close()
 
-        os.remove(filename)
+        response = client.get('/ui/stylesheets/test.css')
+        self.assertNotIn('immutable', response.headers['Cache-Control'])
+        response.close()
+
+    def cachebusted_app(self):
+        test_app = Flask(__name__, static_folder=self.static_folder, static_url_path='/ui')
+        CachebustStaticAssets(test_app)
+        return test_app
 
     def test_hashed_url_for_only_runs_for_static_asset_routes(self):
         # with app.test_request_context('/'):
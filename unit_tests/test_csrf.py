@@ -0,0 +1,55 @@
+import unittest
+from flask import Flask, render_template_string
+from flask_wtf.csrf import generate_csrf
+
+from verification_ui.custom_extensions.csrf.main import CSRF, masked_csrf_token, unmask_csrf_token
+
+
+class TestCSRF(unittest.TestCase):
+    def setUp(self):
+        self.app = Flask(__name__)
+        self.app.secret_key = 'test'
+        CSRF(self.app)
+
+        @self.app.route('/form', methods=['GET', 'POST'])
+        def form():
+            return render_template_string('<input name="csrf_token" value="{{ csrf_token() }}">')
+
+        self.client = self.app.test_client()
+
+    def test_masked_token_is_different_every_time(self):
+        with self.app.test_request_context():
+            first, second = masked_csrf_token(), masked_csrf_token()
+
+            self.assertNotEqual(first, second)
+            self.assertNotIn(generate_csrf(), (first, second))
+            self.assertEqual(unmask_csrf_token(first), generate_csrf())
+            self.assertEqual(unmask_csrf_token(second), generate_csrf())
+
+    def test_tokens_that_arent_masked_are_left_as_they_are(self):
+        with self.app.test_request_context():
+            token = generate_csrf()
+
+        for sent in (token, '', None, 'not base64!', 'YWJj'):
+            self.assertEqual(unmask_csrf_token(sent), sent)
+
+    def test_masked_token_from_page_is_accepted(self):
+        page = self.client.get('/form').data.decode()
+        token = page.split('value="')[1].split('"')[0]
+
+        response = self.client.post('/form', data={'csrf_token': token})
+
+        self.assertEqual(response.status_code, 200)
+
+    def test_wrong_token_is_rejected(self):
+        self.client.get('/form')
+
+        response = self.client.post('/form', data={'csrf_token': masked_token_for_another_session(self.app)},
+                                    headers={'Referer': 'http://localhost/form'})
+
+        self.assertEqual(response.status_code, 302)
+
+
+def masked_token_for_another_session(app):
+    with app.test_request_context():
+        return masked_csrf_token()
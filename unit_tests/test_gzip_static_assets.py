@@ -2,109 +2,126 @@ import unittest
 from unittest import mock
 import os
 import gzip
-from werkzeug import Headers
-from flask_compress import Compress
+import shutil
+import tempfile
+from flask import Flask
+from werkzeug.datastructures import Headers
 
 from verification_ui.main import app
-from verification_ui.custom_extensions.gzip_static_assets.main import GzipStaticAssets
-from verification_ui.custom_extensions.gzip_static_assets.main import gzip_cache
-from verification_ui.custom_extensions.gzip_static_assets.main import gzip_cache_key
+from verification_ui.custom_extensions.gzip_static_assets import main as gzip_static_assets
+from verification_ui.custom_extensions.gzip_static_assets.main import GzipStaticAssets, precompress
+
+FILE_CONTENTS = "* { content: 'Test. Padded out to be worth compressing. Padded out to be worth compressing. Padded out to be worth compressing. Padded out to be worth compressing. Padded out to be worth compressing.'; }"   # noqa: E501
 
 
 class TestGzipStaticAssets(unittest.TestCase):
-    """These tests will only pass if STATIC_ASSETS_MODE is set to production. See unit_tests/__init__.py"""
+    """These tests use their own app and static folder, so they pass whatever STATIC_ASSETS_MODE is"""
     def setUp(self):
-        self.client = app.test_client()
+        self.static_folder = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.static_folder)
+        with open(os.path.join(self.static_folder, 'gzip-test.css'), 'w') as test_file:
+            test_file.write(FILE_CONTENTS)
+        with open(os.path.join(self.static_folder, 'image.png'), 'wb') as test_file:
+            test_file.write(b'\x89PNG' + b'\x00' * 500)
+
+        self.app = Flask(__name__, static_folder=self.static_folder, static_url_path='/ui')
+        GzipStaticAssets(self.app)
+        self.client = self.app.test_client()
 
     @mock.patch('verification_ui.custom_extensions.gzip_static_assets.main.GzipStaticAssets.init_app')
     def test_extension_alternative_init(self, mock_init_app):
         GzipStaticAssets('foo')
         mock_init_app.assert_called_once_with('foo')
 
-    def test_setting_up_cache_directory(self):
-        cache = gzip_cache()
+    def test_precompress_writes_compressed_copies(self):
+        results = precompress(self.static_folder)
 
-        # Check that the directory exists
-        self.assertTrue(os.path.exists('.cache/gzip'))
+        self.assertEqual(len(results), 1)
+        path, size, sizes = results[0]
+        self.assertEqual(path, 'gzip-test.css')
+        self.assertEqual(size, len(FILE_CONTENTS))
+        self.assertLess(sizes['gzip'], size)
+        with open(os.path.join(self.static_folder, 'gzip-test.css.gz'), 'rb') as compressed:
+            self.assertEqual(gzip.decompress(compressed.read()).decode('utf-8'), FILE_CONTENTS)
+        # Images are already compressed
+        self.assertFalse(os.path.exists(os.path.join(self.static_folder, 'image.png.gz')))
 
-        # And that it's empty. Note - don't use os.listdir because the FileSystemCache actually stores
-        # a count of the files in a file! So the number of files on disk will always be 1 more than the number
-        # of cache entries that we might expect
-        file_count = len(cache._list_dir())
-        self.assertEqual(file_count, 0)
+    def test_precompress_removes_copies_not_worth_keeping(self):
+        filename = os.path.join(self.static_folder, 'tiny.css')
+        with open(filename, 'w') as test_file:
+            test_file.write('*{}')
+        with open(filename + '.gz', 'wb') as stale:
+            stale.write(b'left over from a previous build')
 
-    def test_gzip_cache_key_format(self):
-        with app.test_request_context('/foo?cachebuster=123'):
-            response = mock.MagicMock(headers=Headers([('ETag', 'bar')]))
-            key = gzip_cache_key(response)
+        results = dict((path, sizes) for path, size, sizes in precompress(self.static_folder))
 
-        self.assertEqual(key, '/foobar')
+        self.assertEqual(results['tiny.css'], {})
+        self.assertFalse(os.path.exists(filename + '.gz'))
 
     def test_gzipped_response(self):
-        # Create test file
-        filename = 'verification_ui/assets/dist/gzip-test.css'
-        file_contents = "* { content: 'Test. Padded out to trigger gzip. Padded out to trigger gzip. Padded out to trigger gzip. Padded out to trigger gzip. Padded out to trigger gzip. Padded out to trigger gzip. Padded out to trigger gzip. Padded out to trigger gzip. Padded out to trigger gzip. Padded out to trigger gzip. Padded out to trigger gzip. Padded out to trigger gzip. Padded out to trigger gzip. Padded out to trigger gzip. Padded out to trigger gzip. Padded out to trigger gzip. Padded out to trigger gzip. Padded out to trigger gzip. Padded out to trigger gzip.'; }"   # noqa: E501
-        with open(filename, 'w+') as test_file:
-            test_file.write(file_contents)
+        precompress(self.static_folder)
 
-        response = self.client.get('/ui/gzip-test.css', headers=Headers([('Accept-encoding', 'gzip')]))
+        with mock.patch('gzip.compress') as mock_compress:
+            response = self.client.get('/ui/gzip-test.css', headers=Headers([('Accept-encoding', 'gzip')]))
 
-        # Check the response reports itself as gzip
-        self.assertEqual(response.content_encoding, 'gzip')
+        # Nothing was compressed to respond
+        mock_compress.assert_not_called()
 
-        # And that we haven't just received the original contents
-        self.assertNotEqual(response.data, file_contents)
+        # Check the response reports itself as gzip, with the original file's type
+        self.assertEqual(response.content_encoding, 'gzip')
+        self.assertEqual(response.mimetype, 'text/css')
+        self.assertIn('Accept-Encoding', response.vary)
 
         # Unzip it, check the contents is the same as the original
-        self.assertEqual(gzip.decompress(response.data).decode('utf-8'), file_contents)
-
+        self.assertEqual(gzip.decompress(response.data).decode('utf-8'), FILE_CONTENTS)
         response.close()
-        os.remove(filename)
-
-    def test_html_is_not_gzipped(self):
-        # response = self.client.get('/')
-        response = self.client.get('/worklist')
-
-        self.assertIsNone(response.content_encoding)
-        # self.assertIn('<span class="govuk-header__logotype-text">', response.data.decode('utf-8'))
-        self.assertIn('<div class="govuk-header__logo">', response.data.decode('utf-8'))
-
-    # @mock.patch.object(Compress, 'compress', wraps=Compress.compress)
-    def test_repeated_requests_returns_cached_value(self):
-        # Start with a clean cache
-        cache = gzip_cache()
-        cache.clear()
 
-        # Create test file
-        filename = 'verification_ui/assets/dist/gzip-test.css'
-        file_contents = "* { content: 'Test. Padded out to trigger gzip. Padded out to trigger gzip. Padded out to trigger gzip. Padded out to trigger gzip. Padded out to trigger gzip. Padded out to trigger gzip. Padded out to trigger gzip. Padded out to trigger gzip. Padded out to trigger gzip. Padded out to trigger gzip. Padded out to trigger gzip. Padded out to trigger gzip. Padded out to trigger gzip. Padded out to trigger gzip. Padded out to trigger gzip. Padded out to trigger gzip. Padded out to trigger gzip. Padded out to trigger gzip. Padded out to trigger gzip.'; }"   # noqa: E501
-        with open(filename, 'w+') as test_file:
-            test_file.write(file_contents)
+    def test_uncompressed_response_when_not_accepted(self):
+        precompress(self.static_folder)
 
-        compress_instance = Compress()
-        with mock.patch.object(Compress, 'compress', wraps=compress_instance.compress) as mock_compress:
-            # Do a first request to get the gzipped response
-            response = self.client.get('/ui/gzip-test.css',
-                                       headers=Headers([('Accept-encoding', 'gzip')]))
+        response = self.client.get('/ui/gzip-test.css', headers=Headers([('Accept-encoding', 'identity')]))
 
-            # Check that flask-compress was invoked
-            self.assertEqual(mock_compress.call_count, 1)
-
-            # Check the response reports itself as gzip
-            self.assertEqual(response.content_encoding, 'gzip')
-
-            response.close()
+        self.assertIsNone(response.content_encoding)
+        self.assertEqual(response.data.decode('utf-8'), FILE_CONTENTS)
+        self.assertIn('Accept-Encoding', response.vary)
+        response.close()
 
-            # Do a second request to get the gzipped response
-            response = self.client.get('/ui/gzip-test.css',
-                                       headers=Headers([('Accept-encoding', 'gzip')]))
+    def test_uncompressed_response_when_not_precompressed(self):
+        response = self.client.get('/ui/gzip-test.css', headers=Headers([('Accept-encoding', 'gzip, br')]))
 
-            # Check that flask-compress was *not* invoked again
-            self.assertEqual(mock_compress.call_count, 1)
+        self.assertIsNone(response.content_encoding)
+        self.assertEqual(response.data.decode('utf-8'), FILE_CONTENTS)
+        response.close()
 
-            # Check the response reports itself as gzip
-            self.assertEqual(response.content_encoding, 'gzip')
+    def test_best_encoding_accepted_is_chosen(self):
+        filename = os.path.join(self.static_folder, 'gzip-test.css')
+        # Stand-ins for the compressed copies, as brotli may not be installed
+        for suffix in ('.gz', '.br'):
+            with open(filename + suffix, 'wb') as compressed:
+                compressed.write(suffix.encode())
+
+        for accept_encoding, expected in [('gzip, deflate, br', 'br'),
+                                          ('gzip', 'gzip'),
+                                          ('br;q=0.5, gzip', 'gzip'),
+                                          ('*', 'br')]:
+            with self.subTest(accept_encoding=accept_encoding):
+                response = self.client.get('/ui/gzip-test.css',
+                                           headers=Headers([('Accept-encoding', accept_encoding)]))
+                self.assertEqual(response.content_encoding, expected)
+                response.close()
+
+    @unittest.skipIf(gzip_static_assets.brotli is None, 'brotli is not installed')
+    def test_brotli_response(self):
+        precompress(self.static_folder)
+
+        response = self.client.get('/ui/gzip-test.css', headers=Headers([('Accept-encoding', 'gzip, br')]))
+
+        self.assertEqual(response.content_encoding, 'br')
+        self.assertEqual(gzip_static_assets.brotli.decompress(response.data).decode('utf-8'), FILE_CONTENTS)
+        response.close()
 
-            response.close()
+    def test_html_is_not_gzipped(self):
+        response = app.test_client().get('/worklist', headers=Headers([('Accept-encoding', 'gzip')]))
 
-        os.remove(filename)
+        self.assertIsNone(response.content_encoding)
+        self.assertIn('<div class="govuk-header__logo">', response.data.decode('utf-8'))
@@ -1,4 +1,6 @@
 from verification_ui.main import app
+from unittest import mock
+import json
 import unittest
 
 
@@ -9,3 +11,13 @@ class TestHealth(unittest.TestCase):
 
     def test_health(self):
         self.assertEqual((self.app.get('/health')).status_code, 200)
+
+    @mock.patch('verification_ui.views.general.circuit_breakers')
+    def test_health_includes_circuit_breakers(self, mock_breakers):
+        mock_breakers.status.return_value = {'worklist': {'state': 'open', 'recent_calls': 20,
+                                                          'recent_failure_rate': 1.0}}
+
+        response = self.app.get('/health')
+
+        self.assertEqual(json.loads(response.get_data(as_text=True))['circuit_breakers'],
+                         {'worklist': {'state': 'open', 'recent_calls': 20, 'recent_failure_rate': 1.0}})
@@ -0,0 +1,110 @@
+import unittest
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+from unittest import mock
+from flask import g
+
+from verification_ui.main import app
+from verification_ui.custom_extensions.http_connection_pool.main import DeadlineExceeded, HttpConnectionPool, \
+    TracedSession, build_session, pool_stats
+
+
+class KeepAliveHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        body = b'{}'
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class StubServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class TestHttpConnectionPool(unittest.TestCase):
+    def setUp(self):
+        pool_stats.reset()
+
+    @mock.patch('verification_ui.custom_extensions.http_connection_pool.main.HttpConnectionPool.init_app')
+    def test_extension_alternative_init(self, mock_init_app):
+        HttpConnectionPool('foo')
+        mock_init_app.assert_called_once_with('foo')
+
+    def test_before_request_shares_one_session(self):
+        with app.test_request_context('/'):
+            app.preprocess_request()
+            first_session = g.requests.session
+
+        with app.test_request_context('/'):
+            app.preprocess_request()
+            second_session = g.requests.session
+
+        self.assertIs(first_session, second_session)
+
+    @mock.patch('requests.Session.get')
+    def test_trace_id_added_per_call(self, mock_get):
+        traced = TracedSession(build_session(1, 1, False, True), 'trace-123')
+        traced.get('http://localhost/foo', headers={'Accept': 'application/json'}, timeout=1)
+
+        headers = mock_get.call_args[1]['headers']
+        self.assertEqual(headers['X-Trace-ID'], 'trace-123')
+        self.assertEqual(headers['Accept'], 'application/json')
+
+    @mock.patch('requests.Session.get')
+    def test_deadline_caps_timeouts(self, mock_get):
+        traced = TracedSession(build_session(1, 1, False, True), 'trace-123', deadline=time.time() + 2)
+        traced.get('http://localhost/foo', timeout=(3.05, 10))
+
+        kwargs = mock_get.call_args[1]
+        connect, read = kwargs['timeout']
+        self.assertLessEqual(connect, 2)
+        self.assertLessEqual(read, 2)
+        self.assertLessEqual(int(kwargs['headers']['X-Deadline-Remaining-Ms']), 2000)
+
+    @mock.patch('requests.Session.get')
+    def test_deadline_passed(self, mock_get):
+        traced = TracedSession(build_session(1, 1, False, True), 'trace-123', deadline=time.time() - 1)
+
+        with self.assertRaises(DeadlineExceeded):
+            traced.get('http://localhost/foo', timeout=5)
+
+        mock_get.assert_not_called()
+
+    def test_connection_is_reused(self):
+        server = StubServer(('127.0.0.1', 0), KeepAliveHandler)
+        thread = threading.Thread(target=server.serve_forever)
+        thread.daemon = True
+        thread.start()
+
+        session = build_session(1, 1, False, True)
+        try:
+            url = 'http://127.0.0.1:{}/'.format(server.server_port)
+            session.get(url, timeout=5)
+            session.get(url, timeout=5)
+            session.get(url, timeout=5)
+        finally:
+            session.close()
+            server.shutdown()
+            server.server_close()
+
+        self.assertEqual(pool_stats.as_dict(), {'hits': 2, 'misses': 1, 'idle_evictions': 0})
+
+    def test_max_idle_is_set_per_pool(self):
+        short = build_session(1, 1, False, True, max_idle=1)
+        unlimited = build_session(1, 1, False, True)
+
+        short_pool = short.get_adapter('http://localhost/').poolmanager.connection_from_url('http://localhost/')
+        unlimited_pool = unlimited.get_adapter('http://localhost/').poolmanager.connection_from_url(
+            'http://localhost/')
+
+        self.assertEqual(short_pool.max_idle, 1)
+        self.assertIsNone(unlimited_pool.max_idle)
@@ -0,0 +1,150 @@
+from verification_ui.custom_extensions.adfs_certificates.main import AdfsCertificates
+from verification_ui.exceptions import ApplicationError
+from verification_ui.extensions import adfs_certificates
+from verification_ui.main import app
+from verification_ui.views import login
+from verification_ui.views.login import User, VerifiedTokenCache
+from unittest import mock
+from jose import jwt
+import base64
+import hashlib
+import os
+import time
+import unittest
+
+dir_ = os.path.dirname(os.path.abspath(__file__))
+
+
+def read_data(name):
+    with open(os.path.join(dir_, 'data/adfs_signing_{}'.format(name))) as data_file:
+        return data_file.read()
+
+
+def thumbprint(name):
+    der = base64.b64decode(''.join(line for line in read_data(name).splitlines() if not line.startswith('-----')))
+    return base64.urlsafe_b64encode(hashlib.sha1(der).digest()).decode().rstrip('=')
+
+
+class TestVerifiedTokenCache(unittest.TestCase):
+
+    def setUp(self):
+        self.cache = VerifiedTokenCache(max_size=2)
+        self.claims = {'UserName': 'testuser', 'exp': time.time() + 3600}
+
+    def test_remembers_claims(self):
+        self.assertIsNone(self.cache.get('token'))
+        self.cache.remember('token', self.claims, leeway=10)
+
+        self.assertIs(self.cache.get('token'), self.claims)
+        self.assertEqual(self.cache.stats(), {'hits': 1, 'misses': 1, 'invalidations': 0, 'entries': 1})
+
+    def test_tokens_are_not_kept(self):
+        self.cache.remember('token', self.claims, leeway=10)
+
+        self.assertNotIn('token', self.cache.entries.keys())
+
+    @mock.patch('verification_ui.views.login.time.time')
+    def test_expires_leeway_before_token(self, mock_time):
+        mock_time.return_value = 1000
+        self.cache.remember('token', {'UserName': 'testuser', 'exp': 1100}, leeway=10)
+
+        mock_time.return_value = 1089
+        self.assertIsNotNone(self.cache.get('token'))
+        mock_time.return_value = 1090
+        self.assertIsNone(self.cache.get('token'))
+        self.assertEqual(len(self.cache.entries), 0)
+
+    def test_does_not_remember_expiring_tokens(self):
+        self.cache.remember('token', {'UserName': 'testuser', 'exp': time.time() + 5}, leeway=10)
+        self.cache.remember('other_token', {'UserName': 'testuser'}, leeway=10)
+
+        self.assertEqual(len(self.cache.entries), 0)
+
+    def test_invalidate(self):
+        self.cache.remember('token', self.claims, leeway=10)
+        self.cache.remember('other_token', self.claims, leeway=10)
+
+        self.cache.invalidate('token')
+        self.assertIsNone(self.cache.get('token'))
+        self.assertIsNotNone(self.cache.get('other_token'))
+
+        self.cache.invalidate()
+        self.assertIsNone(self.cache.get('other_token'))
+
+    def test_forgotten_when_certificates_change(self):
+        self.assertIn(login.verified_tokens.invalidate, adfs_certificates._listeners)
+
+
+class TestUser(unittest.TestCase):
+
+    def setUp(self):
+        cache_patch = mock.patch('verification_ui.views.login.verified_tokens', VerifiedTokenCache(max_size=10))
+        self.verified_tokens = cache_patch.start()
+        self.addCleanup(cache_patch.stop)
+
+    @mock.patch('verification_ui.views.login.User._verify_token')
+    def test_token_only_verified_once(self, mock_verify):
+        mock_verify.return_value = {'UserName': 'testuser', 'exp': time.time() + 3600, 'group': ['admin']}
+
+        with app.app_context():
+            User(access_token='token')
+            user = User(access_token='token')
+
+        mock_verify.assert_called_once_with()
+        self.assertEqual(user.get_employee_legacy_id(), 'TESTUSER')
+        self.assertEqual(user.get_roles(), ['admin'])
+
+
+class TestVerifyToken(unittest.TestCase):
+
+    def setUp(self):
+        config_patch = mock.patch.dict(app.config, {'ADFS_CERTIFICATE_CACHE_FILE': None,
+                                                    'ADFS_CERTIFICATE_REFRESH_INTERVAL': 0})
+        config_patch.start()
+        self.addCleanup(config_patch.stop)
+
+        self.certificates = AdfsCertificates(app)
+        fetch_patch = mock.patch.object(self.certificates, '_fetch', return_value=[read_data('1.crt')])
+        self.fetch = fetch_patch.start()
+        self.addCleanup(fetch_patch.stop)
+        certificates_patch = mock.patch('verification_ui.views.login.adfs_certificates', self.certificates)
+        certificates_patch.start()
+        self.addCleanup(certificates_patch.stop)
+
+    def make_token(self, signed_with, headers=None):
+        return jwt.encode({'UserName': 'testuser', 'exp': time.time() + 3600,
+                           'aud': app.config['ROOT_URL'] + '/verification/login'},
+                          read_data('{}.key'.format(signed_with)), algorithm='RS256', headers=headers)
+
+    def verify(self, access_token):
+        user = User.__new__(User)
+        user.access_token = access_token
+        with app.app_context():
+            return user._verify_token()
+
+    def test_verified_with_key_named_in_header(self):
+        self.fetch.return_value = [read_data('1.crt'), read_data('2.crt')]
+        access_token = self.make_token(2, headers={'x5t': thumbprint('2.crt')})
+
+        with mock.patch.object(User, '_decode_jwt', autospec=True, side_effect=User._decode_jwt) as mock_decode:
+            self.assertEqual(self.verify(access_token)['UserName'], 'testuser')
+
+        self.assertEqual(mock_decode.call_args[0][1], self.certificates.keys_for({'x5t': thumbprint('2.crt')}))
+        self.assertEqual(self.fetch.call_count, 1)
+
+    def test_new_certificate_fetched(self):
+        access_token = self.make_token(2, headers={'x5t': thumbprint('2.crt')})
+        self.certificates.refresh()
+        self.fetch.return_value = [read_data('2.crt'), read_data('1.crt')]
+
+        self.assertEqual(self.verify(access_token)['UserName'], 'testuser')
+        self.assertEqual(self.fetch.call_count, 2)
+
+    def test_signed_with_unknown_key(self):
+        access_token = self.make_token(2)
+
+        with self.assertRaises(ApplicationError) as context:
+            self.verify(access_token)
+
+        self.assertEqual(context.exception.http_code, 403)
+        self.assertEqual(self.fetch.call_count, 2)
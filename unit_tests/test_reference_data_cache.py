@@ -0,0 +1,90 @@
+import unittest
+import time
+from unittest import mock
+
+from verification_ui.main import app
+from verification_ui.exceptions import ApplicationError
+from verification_ui.custom_extensions.reference_data_cache.main import ReferenceDataCache
+from verification_ui.utils.cache_utils import LRUCache
+
+
+class TestReferenceDataCache(unittest.TestCase):
+    def setUp(self):
+        self.cache = ReferenceDataCache(app)
+        self.loader = mock.MagicMock(return_value=['reason'])
+
+    @mock.patch('verification_ui.custom_extensions.reference_data_cache.main.ReferenceDataCache.init_app')
+    def test_extension_alternative_init(self, mock_init_app):
+        ReferenceDataCache('foo')
+        mock_init_app.assert_called_once_with('foo')
+
+    def test_loads_once_while_fresh(self):
+        with app.app_context():
+            first = self.cache.get_or_load('reasons', self.loader, ttl=60)
+            second = self.cache.get_or_load('reasons', self.loader, ttl=60)
+
+        self.assertEqual(first, ['reason'])
+        self.assertEqual(second, ['reason'])
+        self.assertEqual(self.loader.call_count, 1)
+        self.assertEqual(self.cache.stats()['hits'], 1)
+        self.assertEqual(self.cache.stats()['misses'], 1)
+
+    def test_stale_value_served_while_refreshing(self):
+        with app.app_context():
+            self.cache.get_or_load('reasons', self.loader, ttl=0, stale_ttl=60)
+            self.loader.return_value = ['new reason']
+
+            stale = self.cache.get_or_load('reasons', self.loader, ttl=0, stale_ttl=60)
+            self.assertEqual(stale, ['reason'])
+
+            for _ in range(50):
+                if self.cache.stats()['refreshes']:
+                    break
+                time.sleep(0.01)
+
+        self.assertEqual(self.loader.call_count, 2)
+        self.assertEqual(self.cache.stats()['stale_hits'], 1)
+        self.assertEqual(self.cache.stats()['refreshes'], 1)
+        self.assertEqual(self.cache.backend.get('reasons')[0], ['new reason'])
+
+    def test_expired_value_is_reloaded(self):
+        with app.app_context():
+            self.cache.get_or_load('reasons', self.loader, ttl=0, stale_ttl=0)
+            self.cache.get_or_load('reasons', self.loader, ttl=0, stale_ttl=0)
+
+        self.assertEqual(self.loader.call_count, 2)
+        self.assertEqual(self.cache.stats()['misses'], 2)
+
+    def test_errors_are_not_cached(self):
+        self.loader.side_effect = ApplicationError('Test error')
+
+        with app.app_context():
+            with self.assertRaises(ApplicationError):
+                self.cache.get_or_load('reasons', self.loader)
+
+        self.assertIsNone(self.cache.backend.get('reasons'))
+
+    def test_purge(self):
+        with app.app_context():
+            self.cache.get_or_load('reasons', self.loader)
+            self.cache.get_or_load('other', self.loader)
+            self.cache.purge('reasons')
+            self.assertIsNone(self.cache.backend.get('reasons'))
+            self.assertIsNotNone(self.cache.backend.get('other'))
+
+            self.cache.purge()
+            self.assertIsNone(self.cache.backend.get('other'))
+
+
+class TestLRUCache(unittest.TestCase):
+    def test_least_recently_used_entry_is_evicted(self):
+        cache = LRUCache(2)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        cache.get('a')
+        cache.set('c', 3)
+
+        self.assertEqual(cache.get('a'), 1)
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get('c'), 3)
+        self.assertEqual(cache.evictions, 1)
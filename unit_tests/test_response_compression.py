@@ -0,0 +1,188 @@
+import unittest
+from unittest import mock
+import gzip
+import json
+import os
+import re
+import zlib
+from flask import Flask, Response, jsonify, stream_with_context
+
+from verification_ui import config
+from verification_ui.main import app
+from verification_ui.extensions import response_compression as app_response_compression
+from verification_ui.dependencies.records import to_case_summaries
+from verification_ui.dependencies.verification_api import VerificationAPI
+from verification_ui.custom_extensions.response_compression import main as response_compression
+from verification_ui.custom_extensions.response_compression.main import ResponseCompression
+
+dir_ = os.path.dirname(os.path.abspath(__file__))
+personal_item_data = open(os.path.join(dir_, 'data/personal_item.json'), 'r').read()
+
+PAGE = '<html>' + '<tr><td>Padded out to be worth compressing</td></tr>' * 100 + '</html>'
+
+
+class TestResponseCompression(unittest.TestCase):
+    def setUp(self):
+        self.app = Flask(__name__)
+        self.app.config['RESPONSE_COMPRESSION_ENCODINGS'] = ['gzip']
+
+        @self.app.route('/page')
+        def page():
+            response = Response(PAGE)
+            response.set_etag('abc')
+            return response
+
+        @self.app.route('/small')
+        def small():
+            return '<p>Hello</p>'
+
+        @self.app.route('/json')
+        def json_page():
+            return jsonify(rows=[PAGE])
+
+        @self.app.route('/stream')
+        def stream():
+            def generate():
+                for row in range(3):
+                    yield '<tr><td>Row {}</td></tr>'.format(row) * 50
+            return Response(stream_with_context(generate()))
+
+        @self.app.route('/events')
+        def events():
+            return Response(PAGE, mimetype='text/event-stream')
+
+        self.compression = ResponseCompression(self.app)
+        self.client = self.app.test_client()
+
+    @mock.patch('verification_ui.custom_extensions.response_compression.main.ResponseCompression.init_app')
+    def test_extension_alternative_init(self, mock_init_app):
+        ResponseCompression('foo')
+        mock_init_app.assert_called_once_with('foo')
+
+    def test_html_is_compressed(self):
+        response = self.client.get('/page', headers={'Accept-Encoding': 'gzip'})
+
+        self.assertEqual(response.content_encoding, 'gzip')
+        self.assertIn('Accept-Encoding', response.vary)
+        self.assertEqual(response.headers['Content-Length'], str(len(response.data)))
+        self.assertEqual(gzip.decompress(response.data).decode('utf-8'), PAGE)
+        # The ETag no longer promises the same bytes as an uncompressed response
+        self.assertEqual(response.get_etag(), ('abc', True))
+
+    def test_json_is_compressed(self):
+        response = self.client.get('/json', headers={'Accept-Encoding': 'gzip'})
+
+        self.assertEqual(response.content_encoding, 'gzip')
+        self.assertEqual(json.loads(gzip.decompress(response.data).decode('utf-8')), {'rows': [PAGE]})
+
+    def test_not_compressed_when_not_accepted(self):
+        response = self.client.get('/page', headers={'Accept-Encoding': 'identity'})
+
+        self.assertIsNone(response.content_encoding)
+        self.assertIn('Accept-Encoding', response.vary)
+        self.assertEqual(response.data.decode('utf-8'), PAGE)
+
+    def test_small_responses_are_not_compressed(self):
+        response = self.client.get('/small', headers={'Accept-Encoding': 'gzip'})
+
+        self.assertIsNone(response.content_encoding)
+        self.assertEqual(response.data.decode('utf-8'), '<p>Hello</p>')
+
+    def test_event_streams_are_not_compressed(self):
+        response = self.client.get('/events', headers={'Accept-Encoding': 'gzip'})
+
+        self.assertIsNone(response.content_encoding)
+        self.assertEqual(response.data.decode('utf-8'), PAGE)
+
+    def test_streamed_response_is_compressed_a_chunk_at_a_time(self):
+        response = self.client.get('/stream', headers={'Accept-Encoding': 'gzip'}, buffered=False)
+
+        self.assertEqual(response.content_encoding, 'gzip')
+        self.assertNotIn('Content-Length', response.headers)
+
+        # Each chunk is flushed, so it can be decompressed without waiting for the rest of the response
+        decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        chunks = iter(response.response)
+        self.assertEqual(decompressor.decompress(next(chunks)).decode('utf-8'), '<tr><td>Row 0</td></tr>' * 50)
+
+        rest = b''.join(chunks)
+        response.close()
+        self.assertEqual(decompressor.decompress(rest).decode('utf-8'),
+                         '<tr><td>Row 1</td></tr>' * 50 + '<tr><td>Row 2</td></tr>' * 50)
+
+    def test_stats_per_endpoint(self):
+        self.client.get('/page', headers={'Accept-Encoding': 'gzip'})
+        response = self.client.get('/page', headers={'Accept-Encoding': 'gzip'})
+        self.client.get('/small', headers={'Accept-Encoding': 'gzip'})
+
+        stats = self.compression.stats()
+
+        self.assertEqual(list(stats), ['page'])
+        self.assertEqual(stats['page']['responses'], 2)
+        self.assertEqual(stats['page']['bytes_in'], 2 * len(PAGE))
+        self.assertEqual(stats['page']['bytes_out'], 2 * len(response.data))
+        self.assertEqual(stats['page']['bytes_saved'], 2 * (len(PAGE) - len(response.data)))
+
+    def test_off_without_encodings(self):
+        app = Flask(__name__)
+        app.route('/page')(lambda: PAGE)
+        ResponseCompression(app)
+
+        response = app.test_client().get('/page', headers={'Accept-Encoding': 'gzip'})
+
+        self.assertIsNone(response.content_encoding)
+
+    @mock.patch.object(response_compression, 'brotli', None)
+    def test_br_is_skipped_without_brotli(self):
+        app = Flask(__name__)
+        app.config['RESPONSE_COMPRESSION_ENCODINGS'] = ['br', 'gzip']
+        app.route('/page')(lambda: PAGE)
+        ResponseCompression(app)
+
+        response = app.test_client().get('/page', headers={'Accept-Encoding': 'br, gzip'})
+
+        self.assertEqual(response.content_encoding, 'gzip')
+
+    @unittest.skipIf(response_compression.brotli is None, 'brotli is not installed')
+    def test_brotli_is_preferred(self):
+        app = Flask(__name__)
+        app.config['RESPONSE_COMPRESSION_ENCODINGS'] = ['br', 'gzip']
+        app.route('/page')(lambda: PAGE)
+        ResponseCompression(app)
+
+        response = app.test_client().get('/page', headers={'Accept-Encoding': 'gzip, br'})
+
+        self.assertEqual(response.content_encoding, 'br')
+        self.assertEqual(response_compression.brotli.decompress(response.data).decode('utf-8'), PAGE)
+
+
+class TestAppResponseCompression(unittest.TestCase):
+
+    def setUp(self):
+        for patch in (mock.patch.object(app_response_compression, 'encodings', ['gzip']),
+                      mock.patch.object(config, 'LOGIN_DISABLED', 'True'),
+                      mock.patch.dict(app.config, {'LOGIN_DISABLED': True, 'WTF_CSRF_ENABLED': True}),
+                      mock.patch.object(VerificationAPI, '_request',
+                                        return_value=to_case_summaries([json.loads(personal_item_data)]))):
+            patch.start()
+            self.addCleanup(patch.stop)
+        self.client = app.test_client()
+        with self.client.session_transaction() as session:
+            session['username'] = 'LRTM101'
+
+    def test_worklist_is_compressed_and_its_csrf_token_still_works(self):
+        response = self.client.get('/verification/worklist', headers={'Accept-Encoding': 'gzip'})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.content_encoding, 'gzip')
+        page = gzip.decompress(response.data).decode('utf-8')
+        token = re.search(r'name="csrf_token" value="([^"]+)"', page).group(1)
+
+        response = self.client.post('/verification/worklist/bulk', data={'csrf_token': token},
+                                    headers={'Referer': 'http://localhost/verification/worklist'})
+        with self.client.session_transaction() as session:
+            flashed = [message for category, message in session.get('_flashes', [])]
+
+        self.assertEqual(response.status_code, 302)
+        # Past the CSRF check, to the bulk action's own
+        self.assertEqual(flashed, ['Choose what to do with the selected applications'])
@@ -0,0 +1,180 @@
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+from flask import Flask, session
+
+from verification_ui.custom_extensions.server_side_sessions import main as server_side_sessions
+from verification_ui.custom_extensions.server_side_sessions.main import KeyValueStore, LocalKeyValueClient, \
+    MemoryStore, SQLiteStore, ServerSideSessions
+
+
+def make_app(**config):
+    app = Flask(__name__)
+    app.config.update(SECRET_KEY='secret', SESSION_STORE='memory')
+    app.config.update(config)
+    ServerSideSessions(app)
+
+    @app.route('/set/<value>')
+    def set_value(value):
+        session['value'] = value
+        return ''
+
+    @app.route('/get')
+    def get_value():
+        return session.get('value', '')
+
+    @app.route('/clear')
+    def clear():
+        session.clear()
+        return ''
+
+    @app.route('/regenerate')
+    def regenerate():
+        session.regenerate()
+        return ''
+
+    return app
+
+
+def session_cookie(client):
+    cookies = [cookie for cookie in client.cookie_jar if cookie.name == 'session']
+    return cookies[0].value if cookies else None
+
+
+class TestServerSideSessions(unittest.TestCase):
+
+    def setUp(self):
+        self.app = make_app()
+        self.client = self.app.test_client()
+
+    @mock.patch('verification_ui.custom_extensions.server_side_sessions.main.ServerSideSessions.init_app')
+    def test_extension_alternative_init(self, mock_init_app):
+        ServerSideSessions('foo')
+        mock_init_app.assert_called_once_with('foo')
+
+    def test_cookie_only_holds_id(self):
+        self.client.get('/set/{}'.format('x' * 5000))
+
+        sid = session_cookie(self.client)
+        self.assertLess(len(sid), 50)
+        self.assertEqual(self.client.get('/get').get_data(as_text=True), 'x' * 5000)
+        self.assertIsNotNone(self.app.session_interface.store.get(sid))
+
+    def test_no_cookie_until_something_stored(self):
+        self.client.get('/get')
+
+        self.assertIsNone(session_cookie(self.client))
+
+    def test_unknown_id_not_used(self):
+        self.client.set_cookie('localhost', 'session', 'chosen-by-client')
+        self.client.get('/set/value')
+
+        self.assertNotEqual(session_cookie(self.client), 'chosen-by-client')
+        self.assertIsNone(self.app.session_interface.store.get('chosen-by-client'))
+
+    def test_cleared_session_removed(self):
+        self.client.get('/set/value')
+        sid = session_cookie(self.client)
+
+        self.client.get('/clear')
+
+        self.assertIsNone(session_cookie(self.client))
+        self.assertIsNone(self.app.session_interface.store.get(sid))
+
+    def test_regenerate(self):
+        self.client.get('/set/value')
+        old_sid = session_cookie(self.client)
+
+        self.client.get('/regenerate')
+
+        self.assertNotEqual(session_cookie(self.client), old_sid)
+        self.assertIsNone(self.app.session_interface.store.get(old_sid))
+        self.assertEqual(self.client.get('/get').get_data(as_text=True), 'value')
+
+    @mock.patch('verification_ui.custom_extensions.server_side_sessions.main.time.time')
+    def test_expired_sessions_cleaned_up(self, mock_time):
+        mock_time.return_value = 1000
+        self.app = make_app()
+        self.client = self.app.test_client()
+        store = self.app.session_interface.store
+        store.set('expired', 'data', ttl=10)
+
+        mock_time.return_value = 1020
+        self.client.get('/set/value')
+        self.assertEqual(len(store.entries), 2)
+
+        mock_time.return_value = 1000 + self.app.config['SESSION_CLEANUP_INTERVAL']
+        self.client.get('/set/value')
+        self.assertEqual(len(store.entries), 1)
+
+
+class TestStores(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def check_store(self, store):
+        with mock.patch('verification_ui.custom_extensions.server_side_sessions.main.time.time') as mock_time:
+            mock_time.return_value = 1000
+            store.set('sid', 'data', ttl=10)
+            store.set('other_sid', 'other data', ttl=100)
+            self.assertEqual(store.get('sid'), 'data')
+
+            store.delete('other_sid')
+            self.assertIsNone(store.get('other_sid'))
+
+            mock_time.return_value = 1010
+            store.cleanup()
+            self.assertIsNone(store.get('sid'))
+
+    def test_memory_store(self):
+        store = MemoryStore(max_size=10)
+        self.check_store(store)
+        self.assertEqual(len(store.entries), 0)
+
+    def test_sqlite_store(self):
+        path = os.path.join(self.directory, 'sessions.sqlite3')
+        self.check_store(SQLiteStore(path))
+
+        SQLiteStore(path).set('sid', 'data', ttl=10)
+        # Shared by everything using the same file
+        self.assertEqual(SQLiteStore(path).get('sid'), 'data')
+
+    def test_sqlite_store_uses_thread_pool_under_eventlet(self):
+        path = os.path.join(self.directory, 'sessions.sqlite3')
+        patcher = mock.Mock(**{'is_monkey_patched.return_value': True})
+        tpool = mock.Mock(**{'execute.side_effect': lambda call, *args: call(*args)})
+
+        with mock.patch.object(server_side_sessions, 'patcher', patcher), \
+                mock.patch.object(server_side_sessions, 'tpool', tpool):
+            store = SQLiteStore(path)
+            store.set('sid', 'data', ttl=10)
+            self.assertEqual(store.get('sid'), 'data')
+
+        patcher.is_monkey_patched.assert_called_with('thread')
+        self.assertEqual(tpool.execute.call_count, 3)
+
+    def test_key_value_store(self):
+        self.check_store(KeyValueStore(LocalKeyValueClient()))
+
+    def test_key_value_store_decodes(self):
+        client = mock.Mock()
+        client.get.return_value = b'data'
+        store = KeyValueStore(client)
+
+        store.set('sid', 'data', 10)
+        self.assertEqual(store.get('sid'), 'data')
+        client.setex.assert_called_once_with('verification-ui:session:sid', 10, 'data')
+
+    def test_sqlite_store_from_config(self):
+        app = make_app(SESSION_STORE='sqlite',
+                       SESSION_SQLITE_PATH=os.path.join(self.directory, 'sessions.sqlite3'))
+        client = app.test_client()
+
+        client.get('/set/value')
+
+        self.assertEqual(client.get('/get').get_data(as_text=True), 'value')
+        self.assertIsInstance(app.session_interface.store, SQLiteStore)
@@ -0,0 +1,93 @@
+import unittest
+from unittest import mock
+import os
+import shutil
+import stat
+import tempfile
+from flask import Flask, render_template
+
+from verification_ui.main import app
+from verification_ui.custom_extensions.template_cache.main import TemplateCache, compile_templates
+
+
+class TestTemplateCache(unittest.TestCase):
+    def setUp(self):
+        self.template_folder = tempfile.mkdtemp()
+        self.cache_directory = os.path.join(tempfile.mkdtemp(), 'templates')
+        self.addCleanup(shutil.rmtree, self.template_folder)
+        self.addCleanup(shutil.rmtree, os.path.dirname(self.cache_directory))
+        with open(os.path.join(self.template_folder, 'page.html'), 'w') as template:
+            template.write('<p>{{ message }}</p>')
+        with open(os.path.join(self.template_folder, 'broken.html'), 'w') as template:
+            template.write('{% if %}')
+
+    def make_app(self, **config):
+        test_app = Flask(__name__, template_folder=self.template_folder)
+        test_app.config.update(config)
+        TemplateCache(test_app)
+        return test_app
+
+    @mock.patch('verification_ui.custom_extensions.template_cache.main.TemplateCache.init_app')
+    def test_extension_alternative_init(self, mock_init_app):
+        TemplateCache('foo')
+        mock_init_app.assert_called_once_with('foo')
+
+    def test_compiled_templates_are_kept_in_the_cache_directory(self):
+        test_app = self.make_app(TEMPLATE_BYTECODE_CACHE_DIR=self.cache_directory)
+        with test_app.app_context():
+            self.assertEqual(render_template('page.html', message='Hello'), '<p>Hello</p>')
+
+        self.assertEqual(len(os.listdir(self.cache_directory)), 1)
+
+        # A new worker loads it from there rather than compiling it
+        test_app = self.make_app(TEMPLATE_BYTECODE_CACHE_DIR=self.cache_directory)
+        with mock.patch.object(test_app.jinja_env, 'compile') as mock_compile, test_app.app_context():
+            self.assertEqual(render_template('page.html', message='Hello'), '<p>Hello</p>')
+        mock_compile.assert_not_called()
+
+    def test_cache_directory_is_private(self):
+        self.make_app(TEMPLATE_BYTECODE_CACHE_DIR=self.cache_directory)
+
+        self.assertEqual(stat.S_IMODE(os.stat(self.cache_directory).st_mode) & 0o077, 0)
+
+    def test_cache_directory_others_can_write_to_is_not_used(self):
+        os.makedirs(self.cache_directory)
+        os.chmod(self.cache_directory, 0o777)
+
+        test_app = self.make_app(TEMPLATE_BYTECODE_CACHE_DIR=self.cache_directory)
+
+        self.assertIsNone(test_app.jinja_env.bytecode_cache)
+
+    def test_no_cache_directory(self):
+        test_app = self.make_app()
+
+        self.assertIsNone(test_app.jinja_env.bytecode_cache)
+
+    def test_compile_templates(self):
+        test_app = self.make_app(TEMPLATE_BYTECODE_CACHE_DIR=self.cache_directory)
+
+        compiled, failed = compile_templates(test_app)
+
+        self.assertEqual(compiled, ['page.html'])
+        self.assertEqual([name for name, error in failed], ['broken.html'])
+        self.assertEqual(len(os.listdir(self.cache_directory)), 1)
+
+    def test_warm_up(self):
+        test_app = self.make_app(TEMPLATE_WARM_UP=True)
+
+        TemplateCache().warm_up(test_app)
+
+        self.assertEqual(len(test_app.jinja_env.cache), 1)
+
+    def test_no_warm_up(self):
+        test_app = self.make_app()
+
+        TemplateCache().warm_up(test_app)
+
+        self.assertEqual(len(test_app.jinja_env.cache), 0)
+
+    def test_app_templates_all_compile(self):
+        compiled, failed = compile_templates(app)
+
+        self.assertIn('app/worklist.html', compiled)
+        self.assertEqual(failed, [])
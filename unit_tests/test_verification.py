@@ -7,6 +7,8 @@ from urllib.parse import urlparse
 from verification_ui.main import app
 from verification_ui.exceptions import ApplicationError
 from verification_ui.views import verification
+from verification_ui.utils.pagination import Page
+from verification_ui.dependencies.verification_api import FanOutResult
 
 
 dir_ = os.path.dirname(os.path.abspath(__file__))
@@ -42,6 +44,48 @@ class TestVerification(unittest.TestCase):
         self.assertIn('Worklist', data)
         self.assertIn('Mr Test User', data)
 
+    @mock.patch('verification_ui.views.verification.build_row')
+    @mock.patch('verification_ui.views.verification.VerificationAPI')
+    def test_get_worklist_page(self, mock_api, mock_build):
+        mock_api.return_value.get_worklist.return_value = Page([{'case_id': 3}], 2, 5, 'status',
+                                                               next_cursor='next', previous_cursor='previous')
+        mock_build.return_value = [{'text': 'Mr Test User'}]
+
+        response = self.app.get('/verification/worklist?sort=status&cursor=abc')
+        data = response.data.decode()
+
+        self.assertEqual(response.status_code, 200)
+        mock_api.return_value.get_worklist.assert_called_once_with(sort_by='status', cursor='abc', limit=50)
+        mock_build.assert_called_once_with({'case_id': 3})
+        self.assertIn('Showing 3 to 3 of 5 applications', data)
+        self.assertIn('cursor=next', data)
+        self.assertIn('cursor=previous', data)
+
+    @mock.patch('verification_ui.views.verification.VerificationAPI')
+    def test_bulk_action(self, mock_api):
+        mock_api.return_value.bulk_approve.return_value = {
+            '1': FanOutResult(value={}),
+            '2': FanOutResult(error=ApplicationError('Locked to someone_else', http_code=409))
+        }
+        test_form_data = {'action': 'approve', 'item_ids': ['1', '2']}
+
+        response = self.app.post('/verification/worklist/bulk', data=test_form_data)
+        data = response.data.decode()
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('Done for 1 of 2 applications', data)
+        self.assertIn('Not done: Locked to someone_else', data)
+
+    @mock.patch('verification_ui.views.verification.VerificationAPI')
+    def test_bulk_action_nothing_selected(self, mock_api):
+        test_form_data = {'action': 'lock'}
+
+        response = self.app.post('/verification/worklist/bulk', data=test_form_data, follow_redirects=False)
+
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(urlparse(response.location).path, '/verification/worklist')
+        mock_api.return_value.bulk_lock.assert_not_called()
+
     @mock.patch('verification_ui.views.verification.VerificationAPI')
     def test_get_worklist_error(self, mock_api):
         mock_api.return_value.get_worklist.side_effect = ApplicationError('Test error')
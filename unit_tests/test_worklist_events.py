@@ -0,0 +1,142 @@
+import unittest
+from unittest import mock
+from flask import g, has_request_context
+
+from verification_ui.main import app
+from verification_ui.custom_extensions.http_connection_pool.main import TracedSession
+from verification_ui.custom_extensions.worklist_events.main import WorklistEvents
+from verification_ui.views.verification import _format_worklist_events
+
+
+class TestWorklistEvents(unittest.TestCase):
+    def setUp(self):
+        # Nothing polls in the background unless a test asks it to
+        self.config = mock.patch.dict(app.config, {'WORKLIST_EVENTS_POLL_INTERVAL': 0,
+                                                   'WORKLIST_EVENTS_HISTORY': 3,
+                                                   'WORKLIST_EVENTS_MAX_AGE': 60})
+        self.config.start()
+        self.addCleanup(self.config.stop)
+        self.events = WorklistEvents(app)
+
+    @mock.patch('verification_ui.custom_extensions.worklist_events.main.WorklistEvents.init_app')
+    def test_extension_alternative_init(self, mock_init_app):
+        WorklistEvents('foo')
+        mock_init_app.assert_called_once_with('foo')
+
+    def test_published_changes_are_sent_to_listeners(self):
+        listener = self.events.listen(timeout=0.01)
+        # Nothing has happened yet, so there's only a keep alive
+        self.assertIsNone(next(listener))
+
+        self.events.publish(1, staff_id='LRTM101')
+        event = next(listener)
+
+        self.assertEqual(event['type'], 'case')
+        self.assertEqual(event['case_id'], '1')
+        self.assertEqual(event['staff_id'], 'LRTM101')
+        self.assertEqual(self.events.stats()['listeners'], 1)
+        listener.close()
+        self.assertEqual(self.events.stats()['listeners'], 0)
+
+    def test_missed_events_are_sent_on_reconnecting(self):
+        self.events.publish(1, staff_id='LRTM101')
+        last_seen = self.events._events[-1]['id']
+        self.events.publish(2, staff_id='LRTM102')
+        self.events.publish(1, staff_id=None)
+
+        listener = self.events.listen(last_seen, timeout=0.01)
+
+        self.assertEqual([(event['case_id'], event['staff_id']) for event in [next(listener), next(listener)]],
+                         [('2', 'LRTM102'), ('1', None)])
+        self.assertIsNone(next(listener))
+
+    def test_reload_if_missed_events_forgotten(self):
+        self.events.publish(1, staff_id='LRTM101')
+        last_seen = self.events._events[-1]['id']
+        for case_id in range(2, 6):
+            self.events.publish(case_id, staff_id='LRTM101')
+
+        listener = self.events.listen(last_seen, timeout=0.01)
+
+        self.assertEqual(next(listener)['type'], 'reload')
+
+    def test_unknown_event_id_starts_from_now(self):
+        self.events.publish(1, staff_id='LRTM101')
+
+        listener = self.events.listen('another-process-1', timeout=0.01)
+
+        self.assertIsNone(next(listener))
+
+    def test_listening_stops_after_max_age(self):
+        with mock.patch.dict(app.config, {'WORKLIST_EVENTS_MAX_AGE': 0}):
+            self.assertEqual(list(self.events.listen(timeout=0.01)), [])
+
+    @mock.patch('verification_ui.dependencies.verification_api.VerificationAPI.get_worklist')
+    def test_poll_publishes_differences(self, mock_get_worklist):
+        mock_get_worklist.return_value = [
+            {'case_id': 1, 'status': 'Pending', 'staff_id': None},
+            {'case_id': 2, 'status': 'Pending', 'staff_id': None},
+            {'case_id': 3, 'status': 'In Progress', 'staff_id': 'LRTM101'}
+        ]
+        self.events.poll()
+        # The first worklist is only what the next is compared with
+        self.assertEqual(self.events.stats()['published'], 0)
+
+        mock_get_worklist.return_value = [
+            {'case_id': 1, 'status': 'Pending', 'staff_id': None},
+            {'case_id': 2, 'status': 'In Progress', 'staff_id': 'LRTM102'}
+        ]
+        self.events.poll()
+
+        events = [(event['type'], event['case_id'], event.get('staff_id')) for event in self.events._events]
+        self.assertEqual(events, [('case', '2', 'LRTM102'), ('removed', '3', None)])
+        self.assertEqual(self.events.stats()['polls'], 2)
+
+    @mock.patch('verification_ui.dependencies.verification_api.VerificationAPI.get_worklist')
+    def test_poll_is_not_a_request(self, mock_get_worklist):
+        calls = []
+
+        def get_worklist():
+            calls.append((has_request_context(), g.requests, g.trace_id))
+            return []
+
+        mock_get_worklist.side_effect = get_worklist
+        with mock.patch.object(app, 'preprocess_request') as mock_preprocess_request:
+            self.events.poll()
+
+        mock_preprocess_request.assert_not_called()
+        in_request, requests_session, trace_id = calls[0]
+        self.assertFalse(in_request)
+        self.assertIsInstance(requests_session, TracedSession)
+        self.assertEqual(requests_session.trace_id, trace_id)
+
+    @mock.patch('verification_ui.dependencies.verification_api.VerificationAPI.get_worklist')
+    def test_changes_already_published_are_not_repeated(self, mock_get_worklist):
+        mock_get_worklist.return_value = [{'case_id': 1, 'status': 'Pending', 'staff_id': None}]
+        self.events.poll()
+        self.events.publish(1, staff_id='LRTM101')
+
+        mock_get_worklist.return_value = [{'case_id': 1, 'status': 'Pending', 'staff_id': 'LRTM101'}]
+        self.events.poll()
+
+        self.assertEqual(self.events.stats()['published'], 1)
+        self.assertEqual(self.events._events[-1]['status'], 'Pending')
+
+    def test_format_worklist_events(self):
+        events = [
+            None,
+            {'id': 'a-1', 'type': 'case', 'case_id': '1', 'status': 'In Progress', 'staff_id': 'LRTM101'},
+            {'id': 'a-2', 'type': 'case', 'case_id': '2', 'staff_id': 'LRTM102'},
+            {'id': 'a-3', 'type': 'removed', 'case_id': '3'}
+        ]
+
+        stream = list(_format_worklist_events(events, 'LRTM101'))
+
+        self.assertEqual(stream[0], 'retry: 5000\n\n')
+        self.assertEqual(stream[1], ': keepalive\n\n')
+        self.assertTrue(stream[2].startswith('id: a-1\nevent: case\ndata: {'))
+        self.assertIn('status-in-progress', stream[2])
+        self.assertIn('Locked to you', stream[2])
+        self.assertNotIn('status_html', stream[3])
+        self.assertIn('LRTM102', stream[3])
+        self.assertEqual(stream[4], 'id: a-3\nevent: removed\ndata: {"case_id": "3"}\n\n')
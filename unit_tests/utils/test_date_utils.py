@@ -0,0 +1,40 @@
+import unittest
+from datetime import datetime
+from verification_ui.utils.date_utils import format_timestamp, parse_timestamp
+
+
+class TestDateUtils(unittest.TestCase):
+
+    def test_parse_timestamp(self):
+        self.assertEqual(parse_timestamp('2019-01-02T03:04:05.123456'), datetime(2019, 1, 2, 3, 4, 5, 123456))
+        self.assertEqual(parse_timestamp('2019-01-02 03:04:05.123456'), datetime(2019, 1, 2, 3, 4, 5, 123456))
+
+    def test_parse_timestamp_short_fraction(self):
+        # Notes' dates are cut to 25 characters, leaving only five digits of the fraction
+        self.assertEqual(parse_timestamp('2019-01-02 03:04:05.12345'), datetime(2019, 1, 2, 3, 4, 5, 123450))
+        self.assertEqual(parse_timestamp('2019-01-02T03:04:05.1'), datetime(2019, 1, 2, 3, 4, 5, 100000))
+
+    def test_parse_timestamp_matches_strptime(self):
+        timestamps = ['2019-1-02T03:04:05.000000', '2019-02-30T03:04:05.000000', '2019-01-02T24:04:05.000000',
+                      '2019-01-02T03:04:05', '2019-01-02X03:04:05.000000', '2019-01-02T03:04:05.1234567',
+                      '2019-01-02T03:04:05.12345a', '']
+
+        for timestamp in timestamps:
+            try:
+                expected = datetime.strptime(timestamp, '%Y-%m-%dT%H:%M:%S.%f')
+            except ValueError:
+                with self.assertRaises(ValueError):
+                    parse_timestamp(timestamp)
+            else:
+                self.assertEqual(parse_timestamp(timestamp), expected)
+
+    def test_format_timestamp_remembers_result(self):
+        format_timestamp.cache_clear()
+
+        first = format_timestamp('2019-01-02T03:04:05.000000', '%d %B %Y')
+        second = format_timestamp('2019-01-02T03:04:05.000000', '%d %B %Y')
+
+        self.assertEqual(first, '02 January 2019')
+        self.assertEqual(second, first)
+        self.assertEqual(format_timestamp.cache_info().hits, 1)
+        self.assertEqual(format_timestamp.cache_info().misses, 1)
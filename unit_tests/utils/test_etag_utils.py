@@ -0,0 +1,60 @@
+import unittest
+from unittest import mock
+from flask import flash, session
+from verification_ui.main import app
+from verification_ui.utils.etag_utils import conditional_page, page_etag
+
+
+class TestEtagUtils(unittest.TestCase):
+
+    def test_page_etag_needs_every_part(self):
+        with app.test_request_context('/verification/worklist'):
+            session['username'] = 'LRTM101'
+
+            self.assertIsNotNone(page_etag('"v1"', 50))
+            self.assertIsNone(page_etag(None, 50))
+
+    def test_page_etag_changes_with_data_and_user(self):
+        with app.test_request_context('/verification/worklist'):
+            session['username'] = 'LRTM101'
+            etag = page_etag('"v1"')
+
+            self.assertEqual(page_etag('"v1"'), etag)
+            self.assertNotEqual(page_etag('"v2"'), etag)
+
+            session['username'] = 'LRTM102'
+            self.assertNotEqual(page_etag('"v1"'), etag)
+
+        with app.test_request_context('/verification/worklist?sort=status'):
+            session['username'] = 'LRTM101'
+            self.assertNotEqual(page_etag('"v1"'), etag)
+
+    def test_conditional_page_not_modified(self):
+        render = mock.Mock(return_value='page')
+
+        with app.test_request_context('/verification/worklist', headers={'If-None-Match': 'W/"abc"'}):
+            response = conditional_page('abc', render)
+
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.headers['ETag'], 'W/"abc"')
+        self.assertEqual(response.headers['Cache-Control'], 'private, no-cache')
+        render.assert_not_called()
+
+    def test_conditional_page_modified(self):
+        render = mock.Mock(return_value='page')
+
+        with app.test_request_context('/verification/worklist', headers={'If-None-Match': 'W/"old"'}):
+            response = conditional_page('abc', render)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_data(as_text=True), 'page')
+        self.assertEqual(response.headers['ETag'], 'W/"abc"')
+
+    def test_conditional_page_always_rendered_with_flashed_messages(self):
+        render = mock.Mock(return_value='page')
+
+        with app.test_request_context('/verification/worklist', headers={'If-None-Match': 'W/"abc"'}):
+            flash('Application was approved')
+            response = conditional_page('abc', render)
+
+        self.assertEqual(response, 'page')
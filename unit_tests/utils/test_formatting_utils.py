@@ -1,5 +1,6 @@
 import unittest
 import os
+import copy
 import json
 from unittest import mock
 from verification_ui.main import app
@@ -15,7 +16,8 @@ from verification_ui.utils.formatting_utils import (build_row,
                                                     format_status,
                                                     format_contactable,
                                                     format_contact_by,
-                                                    build_dataset_activity)
+                                                    build_dataset_activity,
+                                                    build_more_downloads)
 
 
 dir_ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -50,6 +52,17 @@ class TestFormattingUtils(unittest.TestCase):
 
         self.assertEqual(worklist_row, expected_result)
 
+    @mock.patch('verification_ui.utils.formatting_utils.format_status',
+                return_value='<span class="status-pending">Pending</span>')
+    @mock.patch('verification_ui.utils.formatting_utils.format_name', return_value='Mr Test User')
+    @mock.patch('verification_ui.utils.formatting_utils.format_date', return_value='01/01/2019')
+    def test_build_row_selectable(self, *_):
+        worklist_row = build_row(self.test_personal_item, selectable=True)
+
+        self.assertEqual(len(worklist_row), 6)
+        self.assertIn('name="item_ids" type="checkbox" value="1"', worklist_row[0]['html'])
+        self.assertEqual(worklist_row[1], {'text': '01/01/2019'})
+
     @mock.patch('verification_ui.utils.formatting_utils.session', return_value=mock.MagicMock())
     @mock.patch('verification_ui.utils.formatting_utils.format_status',
                 return_value='<span class="status-pending">Pending</span>')
@@ -496,3 +509,175 @@ class TestFormattingUtils(unittest.TestCase):
         self.assertEqual('Licence agreed on 27 September 2018', activity['datasets'][0]['summary']['text'])
         self.assertIn('This account has not downloaded any files for this dataset.',
                       activity['datasets'][0]['content']['html'])
+
+    def test_build_dataset_activity_sample_listed_first(self):
+        dataset_activity = [
+                                {
+                                    "name": "nps_sample",
+                                    "title": "National Polygon Service Sample",
+                                    "download_history": [
+                                        {
+                                            "date": "2018-07-20T12:12:12.000000",
+                                            "file": "LR_NPS_SAMPLE.zip"
+                                        }
+                                    ],
+                                    "private": False,
+                                    "licence_agreed": True
+                                },
+                                {
+                                    "name": "nps",
+                                    "title": "National Polygon Service",
+                                    "download_history": [],
+                                    "private": True,
+                                    "licence_agreed": False
+                                },
+                                {
+                                    "name": "ccod",
+                                    "title": "UK companies that own property in England and Wales",
+                                    "download_history": [],
+                                    "private": True,
+                                    "licence_agreed": True
+                                }
+                            ]
+
+        activity = build_dataset_activity(dataset_activity)
+
+        self.assertEqual(1, activity['download_count'])
+        self.assertEqual(['National Polygon Service', 'UK companies that own property in England and Wales'],
+                         [dataset['heading']['text'] for dataset in activity['datasets']])
+        self.assertEqual('Sample licence has been agreed', activity['datasets'][0]['summary']['text'])
+        self.assertIn('Sample dataset', activity['datasets'][0]['content']['html'])
+
+    def test_build_dataset_activity_does_not_change_activity(self):
+        dataset_activity = [
+                                {
+                                    "name": "nps",
+                                    "title": "National Polygon Service",
+                                    "download_history": [
+                                        {
+                                            "date": "2018-08-28T12:12:12.000000",
+                                            "file": "NSD_COU_2019_08.zip"
+                                        }
+                                    ],
+                                    "private": True,
+                                    "licence_agreed": True
+                                },
+                                {
+                                    "name": "nps_sample",
+                                    "title": "National Polygon Service Sample",
+                                    "download_history": [
+                                        {
+                                            "date": "2018-07-20T12:12:12.000000",
+                                            "file": "LR_NPS_SAMPLE.zip"
+                                        }
+                                    ],
+                                    "private": False,
+                                    "licence_agreed": True
+                                }
+                            ]
+        original = copy.deepcopy(dataset_activity)
+
+        first = build_dataset_activity(dataset_activity)
+        second = build_dataset_activity(dataset_activity)
+
+        self.assertEqual(original, dataset_activity)
+        self.assertEqual(first, second)
+        self.assertEqual(2, second['download_count'])
+
+    def test_build_dataset_activity_none(self):
+        activity = build_dataset_activity([])
+
+        self.assertEqual({'download_count': 0, 'datasets': []}, activity)
+
+    def test_build_dataset_activity_paged(self):
+        dataset_activity = [
+                                {
+                                    "name": "ccod",
+                                    "title": "UK companies that own property in England and Wales",
+                                    "download_history": [
+                                        {
+                                            "date": "2018-09-2{}T12:12:12.000000".format(day),
+                                            "file": "CCOD_COU_2019_08.zip"
+                                        } for day in range(1, 6)
+                                    ],
+                                    "private": False,
+                                    "licence_agreed": True
+                                }
+                            ]
+        more_url = mock.Mock(return_value='/more?a=1&b=2')
+
+        activity = build_dataset_activity(dataset_activity, page_size=2, more_url=more_url)
+
+        # The summary still covers every download
+        self.assertEqual(5, activity['download_count'])
+        self.assertEqual('21 September 2018', activity['oldest_download_date'])
+        html = activity['datasets'][0]['content']['html']
+        self.assertEqual(2, html.count('<td scope="row"'))
+        self.assertIn('href="/more?a=1&amp;b=2" data-more-downloads', html)
+        more_url.assert_called_once_with('ccod', 2)
+
+    def test_build_dataset_activity_fits_on_page(self):
+        dataset_activity = [
+                                {
+                                    "name": "ccod",
+                                    "title": "UK companies that own property in England and Wales",
+                                    "download_history": [
+                                        {
+                                            "date": "2018-09-28T12:12:12.000000",
+                                            "file": "CCOD_COU_2019_08.zip"
+                                        }
+                                    ],
+                                    "private": False,
+                                    "licence_agreed": True
+                                }
+                            ]
+        more_url = mock.Mock()
+
+        paged = build_dataset_activity(dataset_activity, page_size=1, more_url=more_url)
+
+        self.assertEqual(build_dataset_activity(dataset_activity), paged)
+        more_url.assert_not_called()
+
+    def test_build_more_downloads(self):
+        dataset_activity = [
+                                {
+                                    "name": "nps",
+                                    "title": "National Polygon Service",
+                                    "download_history": [
+                                        {
+                                            "date": "2018-09-2{}T12:12:12.000000".format(day),
+                                            "file": "LR_NPS_COU_2019_08.zip"
+                                        } for day in range(1, 4)
+                                    ],
+                                    "private": True,
+                                    "licence_agreed": True
+                                },
+                                {
+                                    "name": "nps_sample",
+                                    "title": "National Polygon Service Sample",
+                                    "download_history": [
+                                        {
+                                            "date": "2018-09-10T12:12:12.000000",
+                                            "file": "LR_NPS_SAMPLE.zip"
+                                        }
+                                    ],
+                                    "private": False,
+                                    "licence_agreed": True
+                                }
+                            ]
+        more_url = mock.Mock(return_value='/more')
+
+        middle = build_more_downloads(dataset_activity, 'nps', 1, 2, more_url)
+        last = build_more_downloads(dataset_activity, 'nps', 3, 2, more_url)
+
+        self.assertEqual('National Polygon Service', middle['title'])
+        self.assertEqual(2, middle['rows'].count('<tr'))
+        self.assertIn('data-more-downloads', middle['more'])
+        more_url.assert_called_once_with('nps', 3)
+        # The sample's downloads come after the full dataset's
+        self.assertEqual(1, last['rows'].count('<tr'))
+        self.assertIn('Sample dataset', last['rows'])
+        self.assertIsNone(last['more'])
+
+    def test_build_more_downloads_unknown_dataset(self):
+        self.assertIsNone(build_more_downloads([], 'ccod', 0, 100, mock.Mock()))
@@ -0,0 +1,94 @@
+import base64
+import json
+import unittest
+from verification_ui.utils.pagination import paginate
+
+
+class TestPagination(unittest.TestCase):
+
+    def setUp(self):
+        self.items = [
+            {'case_id': 3, 'date_added': '2019-01-03T10:00:00', 'status': 'Pending', 'staff_id': None},
+            {'case_id': 1, 'date_added': '2019-01-01T10:00:00', 'status': 'In Progress', 'staff_id': 'LRTM101'},
+            {'case_id': 5, 'date_added': '2019-01-05T10:00:00', 'status': 'Pending', 'staff_id': None},
+            {'case_id': 2, 'date_added': '2019-01-02T10:00:00', 'status': 'Pending', 'staff_id': 'LRTM102'},
+            {'case_id': 4, 'date_added': '2019-01-04T10:00:00', 'status': 'In Progress', 'staff_id': None}
+        ]
+
+    def test_no_limit_returns_everything_sorted(self):
+        page = paginate(self.items)
+
+        self.assertEqual([item['case_id'] for item in page], [1, 2, 3, 4, 5])
+        self.assertEqual(page.total, 5)
+        self.assertIsNone(page.next_cursor)
+        self.assertIsNone(page.previous_cursor)
+
+    def test_pages_forwards_and_backwards(self):
+        first = paginate(self.items, limit=2)
+        self.assertEqual([item['case_id'] for item in first], [1, 2])
+        self.assertIsNone(first.previous_cursor)
+
+        second = paginate(self.items, cursor=first.next_cursor, limit=2)
+        self.assertEqual([item['case_id'] for item in second], [3, 4])
+        self.assertEqual(second.start, 2)
+
+        last = paginate(self.items, cursor=second.next_cursor, limit=2)
+        self.assertEqual([item['case_id'] for item in last], [5])
+        self.assertIsNone(last.next_cursor)
+
+        back = paginate(self.items, cursor=last.previous_cursor, limit=2)
+        self.assertEqual([item['case_id'] for item in back], [3, 4])
+
+    def test_cursor_survives_items_being_removed(self):
+        first = paginate(self.items, limit=2)
+        remaining = [item for item in self.items if item['case_id'] != 2]
+
+        second = paginate(remaining, cursor=first.next_cursor, limit=2)
+
+        self.assertEqual([item['case_id'] for item in second], [3, 4])
+
+    def test_sort_by_status_then_case_id(self):
+        page = paginate(self.items, sort_by='status')
+
+        self.assertEqual([item['case_id'] for item in page], [1, 4, 2, 3, 5])
+
+    def test_sort_by_lock_owner_puts_unlocked_first(self):
+        page = paginate(self.items, sort_by='lock_owner')
+
+        self.assertEqual([item['case_id'] for item in page], [3, 4, 5, 1, 2])
+
+    def test_unreadable_cursor_gives_first_page(self):
+        page = paginate(self.items, cursor='not-a-cursor', limit=2)
+
+        self.assertEqual([item['case_id'] for item in page], [1, 2])
+
+    def test_cursor_past_the_end_gives_last_page(self):
+        first = paginate(self.items, limit=3)
+        # The cases after the cursor have since left the list
+        remaining = [item for item in self.items if item['case_id'] <= 3]
+
+        page = paginate(remaining, cursor=first.next_cursor, limit=2)
+
+        self.assertEqual([item['case_id'] for item in page], [2, 3])
+        self.assertIsNone(page.next_cursor)
+        back = paginate(remaining, cursor=page.previous_cursor, limit=2)
+        self.assertEqual([item['case_id'] for item in back], [1, 2])
+
+    def test_cursor_past_the_end_of_an_empty_list(self):
+        first = paginate(self.items, limit=3)
+
+        page = paginate([], cursor=first.next_cursor, limit=3)
+
+        self.assertEqual(list(page), [])
+        self.assertIsNone(page.next_cursor)
+        self.assertIsNone(page.previous_cursor)
+
+    def test_cursor_with_wrong_types_gives_first_page(self):
+        for position in (['after', [1, 2]], ['after', ['2019-01-02T10:00:00', '2']], ['before', ['x']],
+                         ['after', '2019'], ['after', ['2019-01-02T10:00:00', True]]):
+            with self.subTest(position=position):
+                cursor = base64.urlsafe_b64encode(json.dumps(position).encode()).decode()
+
+                page = paginate(self.items, cursor=cursor, limit=2)
+
+                self.assertEqual([item['case_id'] for item in page], [1, 2])
@@ -0,0 +1,40 @@
+import unittest
+from flask import flash, session
+from verification_ui.main import app
+from verification_ui.utils import template_utils
+from verification_ui.utils.template_utils import stream_template
+
+
+class TestTemplateUtils(unittest.TestCase):
+
+    def test_stream_template_sends_page_before_rows_are_built(self):
+        built = []
+
+        def rows():
+            for row in range(3):
+                built.append(row)
+                yield row
+
+        template = app.jinja_env.from_string('{{ "x" * size }}{% for row in rows %}<p>{{ row }}</p>{% endfor %}')
+        with app.test_request_context('/verification/worklist'):
+            response = stream_template(template, rows=rows(), size=template_utils.STREAM_BUFFER_SIZE)
+            chunks = iter(response.response)
+
+            self.assertEqual(next(chunks), 'x' * template_utils.STREAM_BUFFER_SIZE)
+            self.assertEqual(built, [])
+            self.assertEqual(''.join(chunks), '<p>0</p><p>1</p><p>2</p>')
+            self.assertEqual(built, [0, 1, 2])
+
+        self.assertEqual(response.mimetype, 'text/html')
+        self.assertTrue(response.is_streamed)
+
+    def test_stream_template_changes_session_before_streaming(self):
+        template = app.jinja_env.from_string('{{ get_flashed_messages()|join }} {{ csrf_token() }}')
+        with app.test_request_context('/verification/worklist'):
+            flash('Saved')
+            response = stream_template(template)
+
+            # Done before the page is rendered, so they're in the session that's saved with the response
+            self.assertNotIn('_flashes', session)
+            self.assertIn('csrf_token', session)
+            self.assertTrue(''.join(response.response).startswith('Saved '))
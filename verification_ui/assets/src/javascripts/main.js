@@ -2,3 +2,5 @@ import './modules/govuk-frontend'
 import './modules/cookie-banner'
 import './modules/decline-form'
 import './modules/contact-pref-form'
+import './modules/dataset-activity'
+import './modules/worklist-events'
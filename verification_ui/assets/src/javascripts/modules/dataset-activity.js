@@ -0,0 +1,62 @@
+import { Accordion } from 'govuk-frontend/all'
+
+// The account page only links to the dataset activity, it's loaded in once that section is first opened
+var activity = document.querySelector('[data-dataset-activity]')
+
+function fetchFragment (url, callback) {
+    var request = new XMLHttpRequest()
+    request.open('GET', url + (url.indexOf('?') === -1 ? '?' : '&') + 'partial=1')
+    request.onload = function () {
+        if (request.status === 200) {
+            var fragment = document.createElement('div')
+            fragment.innerHTML = request.responseText
+            callback(fragment)
+        }
+    }
+    request.send()
+}
+
+function loadActivity () {
+    if (window.location.hash !== '#activity' || activity.getAttribute('data-loaded')) {
+        return
+    }
+    activity.setAttribute('data-loaded', 'true')
+
+    fetchFragment(activity.getAttribute('data-dataset-activity'), function (fragment) {
+        activity.innerHTML = fragment.innerHTML
+        var accordion = activity.querySelector('[data-module="accordion"]')
+        if (accordion) {
+            new Accordion(accordion).init()
+        }
+    })
+}
+
+if (activity) {
+    loadActivity()
+    window.addEventListener('hashchange', loadActivity)
+
+    // Each dataset's downloads are shown a page at a time, with the next page added to the end of the table
+    activity.addEventListener('click', function (event) {
+        var link = event.target
+        if (!link.hasAttribute('data-more-downloads')) {
+            return
+        }
+        event.preventDefault()
+
+        var more = link.parentNode
+        var table = more.previousElementSibling
+        fetchFragment(link.getAttribute('href'), function (fragment) {
+            var rows = fragment.querySelectorAll('tbody tr')
+            for (var i = 0; i < rows.length; i++) {
+                table.tBodies[0].appendChild(rows[i])
+            }
+
+            var next = fragment.querySelector('[data-more-downloads]')
+            if (next) {
+                more.parentNode.replaceChild(next.parentNode, more)
+            } else {
+                more.parentNode.removeChild(more)
+            }
+        })
+    })
+}
@@ -0,0 +1,41 @@
+// Keeps the worklist's lock and status columns up to date as cases are locked, unlocked, approved or declined
+var worklist = document.querySelector('[data-worklist-events]')
+
+// Each row is found by its select checkbox, so only the rows on this page are changed
+function findRow (caseId) {
+    var checkbox = document.getElementById('select-' + caseId)
+    return checkbox ? checkbox.closest('tr') : null
+}
+
+if (worklist && window.EventSource) {
+    var events = new EventSource(worklist.getAttribute('data-worklist-events'))
+
+    events.addEventListener('case', function (event) {
+        var change = JSON.parse(event.data)
+        var row = findRow(change.case_id)
+        if (!row) {
+            return
+        }
+
+        // Columns are select, date, name, status, details and lock
+        if (change.status_html !== undefined) {
+            row.cells[3].innerHTML = change.status_html
+        }
+        if (change.lock_html !== undefined) {
+            row.cells[5].innerHTML = change.lock_html
+        }
+    })
+
+    events.addEventListener('removed', function (event) {
+        var row = findRow(JSON.parse(event.data).case_id)
+        if (row) {
+            row.parentNode.removeChild(row)
+        }
+    })
+
+    // Sent when this page has missed too much to be brought up to date
+    events.addEventListener('reload', function () {
+        events.close()
+        window.location.reload()
+    })
+}
@@ -30,6 +30,47 @@ SECRET_KEY = os.environ['SECRET_KEY']
 
 # Dependencies
 VERIFICATION_API_URL = os.environ["VERIFICATION_API_URL"]
+# Calls to other APIs share a pool of connections per worker (see HttpConnectionPool). The number of hosts to keep
+# pools for and of connections to keep open to each, whether to wait for a free connection rather than open (and
+# then discard) extra ones, whether to turn on TCP keep-alive, and how long (in seconds) a connection can sit
+# unused in the pool before it's closed rather than reused
+HTTP_POOL_CONNECTIONS = int(os.environ['HTTP_POOL_CONNECTIONS'])
+HTTP_POOL_MAXSIZE = int(os.environ['HTTP_POOL_MAXSIZE'])
+HTTP_POOL_BLOCK = os.environ['HTTP_POOL_BLOCK'].lower() == 'true'
+HTTP_POOL_KEEP_ALIVE = os.environ['HTTP_POOL_KEEP_ALIVE'].lower() == 'true'
+HTTP_POOL_MAX_IDLE = int(os.environ['HTTP_POOL_MAX_IDLE'])
+# Seconds each request has for all its calls to other APIs (0 for no limit), other than bulk actions' calls, which
+# have VERIFICATION_API_BULK_DEADLINE instead
+HTTP_REQUEST_DEADLINE = int(os.environ['HTTP_REQUEST_DEADLINE'])
+# Pages that make several independent calls to the Verification API make them concurrently; this is the
+# longest (in seconds) a page will wait for them all, and how many may be in flight at once
+VERIFICATION_API_FAN_OUT_DEADLINE = int(os.environ['VERIFICATION_API_FAN_OUT_DEADLINE'])
+VERIFICATION_API_FAN_OUT_WORKERS = int(os.environ['VERIFICATION_API_FAN_OUT_WORKERS'])
+# Bulk actions send one request per case, this many at a time, and give up on any left after the deadline
+VERIFICATION_API_BULK_WORKERS = int(os.environ['VERIFICATION_API_BULK_WORKERS'])
+VERIFICATION_API_BULK_DEADLINE = int(os.environ['VERIFICATION_API_BULK_DEADLINE'])
+# Connect timeout, and read timeouts for each kind of call (see endpoint_family in verification_api.py) as
+# "family=seconds,..." pairs. Families not listed use DEFAULT_TIMEOUT.
+VERIFICATION_API_CONNECT_TIMEOUT = float(os.environ['VERIFICATION_API_CONNECT_TIMEOUT'])
+VERIFICATION_API_READ_TIMEOUTS = dict((family.strip(), float(seconds)) for family, seconds in
+                                      (pair.split('=') for pair in
+                                       os.environ['VERIFICATION_API_READ_TIMEOUTS'].split(',') if pair))
+# GETs that fail with a connection error, timeout or 502/503/504 are retried up to this many times, with
+# jittered exponential backoff starting at VERIFICATION_API_RETRY_BACKOFF seconds. At most
+# VERIFICATION_API_RETRY_RATIO of GETs are retried, plus a reserve of VERIFICATION_API_RETRY_RESERVE retries.
+VERIFICATION_API_GET_RETRIES = int(os.environ['VERIFICATION_API_GET_RETRIES'])
+VERIFICATION_API_RETRY_BACKOFF = float(os.environ['VERIFICATION_API_RETRY_BACKOFF'])
+VERIFICATION_API_RETRY_RATIO = float(os.environ['VERIFICATION_API_RETRY_RATIO'])
+VERIFICATION_API_RETRY_RESERVE = int(os.environ['VERIFICATION_API_RETRY_RESERVE'])
+# Calls to each endpoint family are stopped for VERIFICATION_API_BREAKER_PROBE_INTERVAL seconds (then probed
+# with a single call) once at least VERIFICATION_API_BREAKER_FAILURE_RATE of the last
+# VERIFICATION_API_BREAKER_WINDOW_SIZE calls, and at least VERIFICATION_API_BREAKER_MINIMUM_CALLS, have failed
+VERIFICATION_API_BREAKER_FAILURE_RATE = float(os.environ['VERIFICATION_API_BREAKER_FAILURE_RATE'])
+VERIFICATION_API_BREAKER_MINIMUM_CALLS = int(os.environ['VERIFICATION_API_BREAKER_MINIMUM_CALLS'])
+VERIFICATION_API_BREAKER_WINDOW_SIZE = int(os.environ['VERIFICATION_API_BREAKER_WINDOW_SIZE'])
+VERIFICATION_API_BREAKER_PROBE_INTERVAL = int(os.environ['VERIFICATION_API_BREAKER_PROBE_INTERVAL'])
+# The number of worklist/case responses to remember (per worker) so they can be re-requested conditionally
+VERIFICATION_API_CONDITIONAL_GET_ENTRIES = int(os.environ['VERIFICATION_API_CONDITIONAL_GET_ENTRIES'])
 
 # Content security policy mode
 # Can be either 'full' or 'report-only'
@@ -43,13 +84,14 @@ CONTENT_SECURITY_POLICY_MODE = os.environ['CONTENT_SECURITY_POLICY_MODE']
 # Static assets mode
 # Can be either 'development' or 'production'
 # 'development' will:
-#   - Not gzip static assets
+#   - Serve static assets as they are
 #   - Set far *past* expiry headers on static asset requests to prevent your browser from caching them
 #   - Not add cachebusters to static asset query strings
 # 'production' will:
-#   - gzip static assets
+#   - Serve the gzip/Brotli copies of static assets written by `manage.py precompress`
 #   - Set far *future* expiry headers on static asset requests to force browsers to cache for a long time
-#   - Add cachebusters to static asset query strings to invalidate browsers' caches when necessary
+#   - Link to the content-hashed copies of static assets in the manifest written by `manage.py build_manifest`
+#     (or add cachebusters to their query strings without one) to invalidate browsers' caches when necessary
 STATIC_ASSETS_MODE = os.environ['STATIC_ASSETS_MODE']
 
 # Using SQLAlchemy/Postgres?
@@ -64,9 +106,53 @@ ADFS_STATE = os.environ['ADFS_STATE']
 JWT_LEEWAY = os.environ['JWT_LEEWAY']
 ROOT_URL = os.environ['ROOT_URL']
 ADFS_ROLE = os.environ['ADFS_ROLE']
+# How often (in seconds) the token signing certificates are fetched from ADFS, the timeout for fetching them,
+# and where the last ones fetched are kept so newly started workers don't have to fetch them first (nothing to not
+# keep them). The file and its directory must belong to the app's user with no one else able to write to them
+ADFS_CERTIFICATE_REFRESH_INTERVAL = int(os.environ['ADFS_CERTIFICATE_REFRESH_INTERVAL'])
+ADFS_CERTIFICATE_TIMEOUT = float(os.environ['ADFS_CERTIFICATE_TIMEOUT'])
+ADFS_CERTIFICATE_CACHE_FILE = os.environ['ADFS_CERTIFICATE_CACHE_FILE']
+# Number of verified access tokens to remember, so they aren't verified again on every request
+VERIFIED_TOKEN_CACHE_SIZE = int(os.environ['VERIFIED_TOKEN_CACHE_SIZE'])
+
+# Where sessions are kept (memory, sqlite or key-value - see ServerSideSessions) and how long (in seconds) they
+# last after they were last changed. SQLite is only for a single host, as its database is a local file
+SESSION_STORE = os.environ['SESSION_STORE']
+SESSION_SQLITE_PATH = os.environ['SESSION_SQLITE_PATH']
+SESSION_KEY_VALUE_URL = os.environ['SESSION_KEY_VALUE_URL']
+PERMANENT_SESSION_LIFETIME = int(os.environ['SESSION_LIFETIME'])
 
 # Yes i know we should fail fast but its important to set this to false by default
 LOGIN_DISABLED = os.environ.get('LOGIN_DISABLED', False)
 
 # Limit number of results returned from search to prevent session becoming too large
 VERIFICATION_SEARCH_LIMIT = int(os.environ.get('VERIFICATION_SEARCH_LIMIT'))
+
+# Number of applications shown on each page of the worklist
+WORKLIST_PAGE_SIZE = int(os.environ['WORKLIST_PAGE_SIZE'])
+
+# Whether the worklist and search pages are sent as they're rendered (true) or once they've been rendered (false)
+STREAM_LIST_PAGES = os.environ['STREAM_LIST_PAGES'].lower() == 'true'
+
+# How often (in seconds) the worklist is checked for changes to send to open worklist pages (0 to not check)
+WORKLIST_EVENTS_POLL_INTERVAL = int(os.environ['WORKLIST_EVENTS_POLL_INTERVAL'])
+
+# Number of each dataset's downloads shown at a time on an account's dataset activity
+DATASET_ACTIVITY_PAGE_SIZE = int(os.environ['DATASET_ACTIVITY_PAGE_SIZE'])
+
+# Where compiled templates are kept so workers can load them rather than compile them again (nothing to not keep
+# them). It must belong to the app's user with no one else able to write to it (it's created that way if it isn't
+# there), and whether every template is compiled as a worker starts rather than when a page first needs it
+TEMPLATE_BYTECODE_CACHE_DIR = os.environ['TEMPLATE_BYTECODE_CACHE_DIR']
+TEMPLATE_WARM_UP = os.environ['TEMPLATE_WARM_UP'].lower() == 'true'
+
+# Encodings HTML and JSON responses are compressed with, in order of preference (e.g. "br,gzip" - br needs the
+# brotli package), or nothing to not compress them. Responses smaller than the minimum size (in bytes) are sent
+# as they are. Levels are 1-9 for gzip and 0-11 for br
+# Compressing a response that holds a secret next to something the requester chose lets an attacker work the
+# secret out from the response sizes (BREACH), so the CSRF token is masked differently in every page
+RESPONSE_COMPRESSION_ENCODINGS = [encoding.strip() for encoding in
+                                  os.environ['RESPONSE_COMPRESSION_ENCODINGS'].split(',') if encoding.strip()]
+RESPONSE_COMPRESSION_MIN_SIZE = int(os.environ['RESPONSE_COMPRESSION_MIN_SIZE'])
+RESPONSE_COMPRESSION_GZIP_LEVEL = int(os.environ['RESPONSE_COMPRESSION_GZIP_LEVEL'])
+RESPONSE_COMPRESSION_BROTLI_QUALITY = int(os.environ['RESPONSE_COMPRESSION_BROTLI_QUALITY'])
@@ -0,0 +1,220 @@
+from verification_ui.dependencies.single_flight import SingleFlight
+from verification_ui.exceptions import ApplicationError
+from verification_ui.utils.file_utils import is_private, make_private_directory
+from collections import OrderedDict
+from jose import jwk
+from jose.constants import ALGORITHMS
+from requests.exceptions import ConnectionError, Timeout
+import base64
+import hashlib
+import json
+import os
+import requests
+import tempfile
+import textwrap
+import threading
+import time
+import xmltodict
+
+
+class AdfsCertificates(object):
+    """Keeps hold of the certificates ADFS signs access tokens with, for verifying them
+
+    The certificates are fetched from the ADFS federation metadata by a background thread every
+    ADFS_CERTIFICATE_REFRESH_INTERVAL seconds, rather than inside users' requests. They can also be refreshed on
+    demand (e.g. when a token can't be verified as ADFS has started using a new certificate), and only one fetch
+    runs at a time: anyone else wanting a refresh while it's running waits for it and gets its result.
+
+    The last certificates fetched are saved to ADFS_CERTIFICATE_CACHE_FILE, so newly started workers can verify
+    tokens straight away without waiting on ADFS. Tokens signed with whatever is in that file are trusted, so it's
+    only loaded if both it and its directory belong to the app's user and no one else can write to them.
+
+    Each certificate's public key is parsed once, when it's fetched, and indexed by the certificate's thumbprint.
+    ADFS puts the thumbprint of the certificate it signed a token with in the token's header, so the right key
+    can be picked out directly rather than trying each in turn.
+    """
+
+    def __init__(self, app=None):
+        self.app = app
+        self._certificates = []
+        self._keys = OrderedDict()
+        self._fetched_at = 0
+        self._listeners = []
+        self._refresher_pid = None
+        self._lock = threading.Lock()
+        self._single_flight = SingleFlight()
+        self._stats = dict(refreshes=0, refresh_failures=0, loaded_from_file=0)
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('ADFS_CERTIFICATE_REFRESH_INTERVAL', 6 * 60 * 60)
+        app.config.setdefault('ADFS_CERTIFICATE_TIMEOUT', 10)
+        app.config.setdefault('ADFS_CERTIFICATE_CACHE_FILE', None)
+
+        self.app = app
+        self._load_file()
+
+    def on_change(self, listener):
+        """Call listener() whenever a refresh brings back different certificates"""
+        self._listeners.append(listener)
+
+    def keys_for(self, header):
+        """Public keys to verify a token with, given its (unverified) header
+
+        Only the key of the certificate named in the header's x5t (or kid) is returned, or none if it's one that
+        hasn't been fetched. Tokens that don't name one get every key. The keys are fetched first if there
+        aren't any yet.
+        """
+        self._start_refresher()
+        if not self._keys:
+            self.refresh()
+
+        with self._lock:
+            keys = self._keys
+        thumbprint = header.get('x5t') or header.get('kid')
+        if not thumbprint:
+            return list(keys.values())
+        key = keys.get(thumbprint.rstrip('='))
+        return [] if key is None else [key]
+
+    def refresh(self):
+        """Fetch the current certificates from ADFS, joining a fetch that is already running if there is one"""
+        return self._single_flight.do('certificates', self._refresh)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['certificates'] = list(self._keys)
+            stats['fetched_at'] = self._fetched_at
+        return stats
+
+    def _refresh(self):
+        self.app.logger.info('Refreshing certificates from ADFS')
+        try:
+            certificates = self._fetch()
+            keys = _parse_certificates(certificates)
+        except Exception:
+            self._count('refresh_failures')
+            raise
+
+        with self._lock:
+            changed = certificates != self._certificates
+            self._certificates = certificates
+            self._keys = keys
+            self._fetched_at = time.time()
+            self._stats['refreshes'] += 1
+
+        if not certificates:
+            self.app.logger.info('Unable to retrieve certs from ADFS')
+        if changed:
+            self.app.logger.info('ADFS certs changed, now: {}'.format(certificates))
+            self._save_file(certificates)
+            for listener in self._listeners:
+                listener()
+        return certificates
+
+    def _fetch(self, is_a_retry=False):
+        url = '{}/federationMetadata/2007-06/federationmetadata.xml'.format(self.app.config['ADFS_URL'])
+        try:
+            res = requests.get(url, verify=False, timeout=self.app.config['ADFS_CERTIFICATE_TIMEOUT'])
+        except (ConnectionError, Timeout):
+            if not is_a_retry:
+                self.app.logger.warning('Failed to connect to ADFS, retrying')
+                return self._fetch(is_a_retry=True)
+            raise ApplicationError('Unable to connect to ADFS', 'E802', http_code=500)
+
+        adfs_meta_dict = xmltodict.parse(res.text)
+        certs = adfs_meta_dict['EntityDescriptor']['RoleDescriptor'][1]['KeyDescriptor']
+        # if there is only one cert then the cert variable will be a dict, if there are 2 it will be a list
+        if isinstance(certs, dict):
+            certs = [certs]
+        return [_reformat_adfs_cert(cert['KeyInfo']['X509Data']['X509Certificate']) for cert in certs[:2]]
+
+    def _start_refresher(self):
+        # Threads don't survive gunicorn forking its workers, so each process starts its own the first time
+        # the certificates are needed
+        interval = self.app.config['ADFS_CERTIFICATE_REFRESH_INTERVAL']
+        with self._lock:
+            if not interval or self._refresher_pid == os.getpid():
+                return
+            self._refresher_pid = os.getpid()
+
+        thread = threading.Thread(target=self._refresh_periodically, args=(interval,))
+        thread.daemon = True
+        thread.start()
+
+    def _refresh_periodically(self, interval):
+        while True:
+            # Checked at least every minute, as refreshes made on demand put the next one back
+            wait = self._fetched_at + interval - time.time()
+            if wait > 0:
+                time.sleep(min(wait, 60))
+                continue
+            try:
+                self.refresh()
+            except Exception as e:
+                self.app.logger.warning('Failed to refresh ADFS certs: {}'.format(repr(e)))
+                # Don't hammer ADFS while it's unavailable
+                time.sleep(min(interval, 60))
+
+    def _load_file(self):
+        path = self.app.config['ADFS_CERTIFICATE_CACHE_FILE']
+        if not path or not os.path.exists(path):
+            return
+        if not is_private(path) or not is_private(os.path.dirname(os.path.abspath(path))):
+            self.app.logger.error('Ignoring ADFS cert cache file {}, as it (or its directory) belongs to another user '
+                                  'or others can write to it'.format(path))
+            return
+        try:
+            with open(path) as cache_file:
+                saved = json.load(cache_file)
+            certificates, fetched_at = saved['certificates'], saved['fetched_at']
+            keys = _parse_certificates(certificates)
+        except Exception as e:
+            self.app.logger.warning('Ignoring unreadable ADFS cert cache file {}: {}'.format(path, repr(e)))
+            return
+
+        with self._lock:
+            self._certificates = certificates
+            self._keys = keys
+            self._fetched_at = fetched_at
+            self._stats['loaded_from_file'] += 1
+
+    def _save_file(self, certificates):
+        path = self.app.config['ADFS_CERTIFICATE_CACHE_FILE']
+        if not path:
+            return
+        # Written to a temporary file then moved into place, so other workers never read half a file
+        try:
+            if not make_private_directory(os.path.dirname(os.path.abspath(path))):
+                self.app.logger.error('Not saving ADFS certs to {}, as its directory belongs to another user or '
+                                      'others can write to it'.format(path))
+                return
+            descriptor, temporary_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)))
+            with os.fdopen(descriptor, 'w') as temporary_file:
+                json.dump({'certificates': certificates, 'fetched_at': self._fetched_at}, temporary_file)
+            os.replace(temporary_path, path)
+        except OSError as e:
+            self.app.logger.warning('Unable to save ADFS certs to {}: {}'.format(path, repr(e)))
+
+    def _count(self, name):
+        with self._lock:
+            self._stats[name] += 1
+
+
+def _reformat_adfs_cert(cert_string):
+    """Convert x509 certificates from adfs metadata into a usable format"""
+    split = textwrap.fill(cert_string, 64)
+    cert = "-----BEGIN CERTIFICATE-----\n{}\n-----END CERTIFICATE-----".format(split)
+    return cert
+
+
+def _parse_certificates(certificates):
+    """Index the public keys of PEM encoded certificates by the certificates' (x5t) thumbprints"""
+    keys = OrderedDict()
+    for certificate in certificates:
+        der = base64.b64decode(''.join(line for line in certificate.splitlines() if not line.startswith('-----')))
+        thumbprint = base64.urlsafe_b64encode(hashlib.sha1(der).digest()).decode().rstrip('=')
+        keys[thumbprint] = jwk.construct(certificate, ALGORITHMS.RS256).prepared_key
+    return keys
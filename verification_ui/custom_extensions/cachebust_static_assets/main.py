@@ -1,13 +1,28 @@
 from flask import current_app
+from flask import request
 from flask import url_for
 import hashlib
+import json
 import os
+import re
+import time
 
 
-cache_busting_values = {}
+# A copy of an asset made by build_manifest, e.g. stylesheets/main.0123456789.css
+HASHED_NAME = re.compile(r'\.[0-9a-f]{10}\.[^./]+$')
+# Seconds browsers can keep a hashed copy for, a year being the longest they're asked to by convention
+HASHED_ASSET_MAX_AGE = 365 * 24 * 60 * 60
+# Files that aren't referenced by name from the templates
+UNHASHED_EXTENSIONS = ('.map', '.gz', '.br', '.tmp')
 
 
 class CachebustStaticAssets(object):
+    """Points url_for('static') at a copy of each asset named after its contents, so browsers can keep it forever
+
+    The copies and the manifest of them (STATIC_ASSETS_MANIFEST in the static folder) are written when the assets
+    are built (see build_manifest), and the manifest is read once here. Without one, every asset is hashed once
+    here instead, and the hash added to its URLs as a query string.
+    """
 
     def __init__(self, app=None):
         self.app = app
@@ -15,38 +30,128 @@ class CachebustStaticAssets(object):
             self.init_app(app)
 
     def init_app(self, app):
+        app.config.setdefault('STATIC_ASSETS_MANIFEST', 'manifest.json')
+
+        # Logical asset name -> content-hashed copy, or -> md5 of the file when there's no manifest
+        manifest = {}
+        cache_busting_values = {}
+        manifest_path = os.path.join(app.static_folder, app.config['STATIC_ASSETS_MANIFEST'])
+        if os.path.isfile(manifest_path):
+            with open(manifest_path) as manifest_file:
+                manifest = json.load(manifest_file)
+        else:
+            app.logger.warning('No static assets manifest at {}, so assets will be cachebusted with a query '
+                               'string'.format(manifest_path))
+            for filename in _assets(app.static_folder):
+                cache_busting_values[filename] = md5_for_file(os.path.join(app.static_folder, filename),
+                                                              hexdigest=True)
+        app.extensions['cachebust_static_assets'] = dict(manifest=manifest,
+                                                         cache_busting_values=cache_busting_values)
+        hashed_filenames = set(manifest.values())
 
         @app.context_processor
         def override_url_for():
             return dict(url_for=hashed_url_for)
 
+        @app.after_request
+        def immutable_hashed_assets(response):
+            # A hashed copy's contents never change, so browsers needn't even revalidate it
+            if request.endpoint == 'static' and request.view_args.get('filename') in hashed_filenames \
+                    and response.status_code in (200, 206, 304):
+                response.cache_control.public = True
+                response.cache_control.max_age = HASHED_ASSET_MAX_AGE
+                response.cache_control['immutable'] = None
+                response.expires = time.time() + HASHED_ASSET_MAX_AGE
+            return response
+
 
 def hashed_url_for(endpoint, **values):
 
     """Cachebusting
 
-    Use the md5 hash of the file on disk to perform cachebusting duties.
+    Use the content-hashed copy of the file from the manifest, or the md5 hash of the file as a query string.
     This forces browsers to download new versions of files when they change.
     """
     if endpoint == 'static':
         filename = values.get('filename', None)
+        assets = current_app.extensions['cachebust_static_assets']
 
-        if filename:
-            file_path = os.path.join(current_app.root_path, current_app.static_folder, filename)
+        if filename in assets['manifest']:
+            values['filename'] = assets['manifest'][filename]
+        elif filename in assets['cache_busting_values']:
+            values['cache'] = assets['cache_busting_values'][filename]
 
-            if os.path.isfile(file_path):
-                # Store the hashes in a dict so that on subsequent
-                # requests we don't have to md5 the file every time
-                cached_hash = cache_busting_values.get(file_path)
+    return url_for(endpoint, **values)
 
-                if cached_hash:
-                    values['cache'] = cached_hash
-                else:
-                    file_hash = md5_for_file(file_path, hexdigest=True)
-                    cache_busting_values[file_path] = file_hash
-                    values['cache'] = file_hash
 
-    return url_for(endpoint, **values)
+def build_manifest(directory, manifest_name='manifest.json'):
+    """Copy each asset in directory to a name including a hash of its contents, and write a manifest of them
+
+    Run after the assets are built (and before they're precompressed). Returns the manifest, a dict of logical
+    asset name (e.g. stylesheets/main.css) -> hashed copy (e.g. stylesheets/main.0123456789.css).
+
+    Workers only read the manifest when they start, so ones started before this build still link to the previous
+    build's copies. Those are kept (and its manifest with them, as the manifest name with .previous added), and
+    only copies from the builds before it are removed.
+    """
+    manifest_path = os.path.join(directory, manifest_name)
+    previous_manifest_path = _previous_manifest_path(manifest_path)
+    previous = _read_manifest(manifest_path)
+    older = _read_manifest(previous_manifest_path)
+
+    built = {}
+    for filename in _assets(directory, skip=(manifest_name, os.path.basename(previous_manifest_path))):
+        stem, extension = os.path.splitext(filename)
+        hashed_filename = '{}.{}{}'.format(stem, md5_for_file(os.path.join(directory, filename),
+                                                              hexdigest=True)[:10], extension)
+        with open(os.path.join(directory, filename), 'rb') as asset:
+            _write(os.path.join(directory, hashed_filename), asset.read())
+        built[filename] = hashed_filename
+
+    _write(previous_manifest_path, json.dumps(previous, indent=2, sort_keys=True).encode())
+    _write(manifest_path, json.dumps(built, indent=2, sort_keys=True).encode())
+
+    for hashed_filename in set(older.values()) - set(previous.values()) - set(built.values()):
+        for stale in [hashed_filename] + [hashed_filename + suffix for suffix in ('.gz', '.br')]:
+            if os.path.isfile(os.path.join(directory, stale)):
+                os.remove(os.path.join(directory, stale))
+
+    return built
+
+
+def _previous_manifest_path(manifest_path):
+    stem, extension = os.path.splitext(manifest_path)
+    return '{}.previous{}'.format(stem, extension)
+
+
+def _read_manifest(path):
+    if not os.path.isfile(path):
+        return {}
+    with open(path) as manifest_file:
+        return json.load(manifest_file)
+
+
+def _assets(directory, skip=()):
+    """The names of the assets in directory (relative to it, with / separators), without any hashed copies
+
+    Hidden directories (e.g. .govuk-frontend) are left out, as what's in them is only referenced from the
+    stylesheets and the GOV.UK template, not with url_for.
+    """
+    for root, directories, files in os.walk(directory):
+        directories[:] = sorted(name for name in directories if not name.startswith('.'))
+        for name in sorted(files):
+            filename = os.path.relpath(os.path.join(root, name), directory).replace(os.sep, '/')
+            if filename in skip or name.endswith(UNHASHED_EXTENSIONS) or HASHED_NAME.search(name):
+                continue
+            yield filename
+
+
+def _write(path, data):
+    # Written alongside then moved into place, so a request never gets half a file
+    temporary_path = path + '.tmp'
+    with open(temporary_path, 'wb') as output:
+        output.write(data)
+    os.replace(temporary_path, path)
 
 
 def md5_for_file(path, block_size=256*128, hexdigest=False):
@@ -1,7 +1,18 @@
 from flask import flash, redirect, request
-from flask_wtf.csrf import CSRFError, CSRFProtect
+from flask_wtf.csrf import CSRFError, CSRFProtect, generate_csrf
+import base64
+import binascii
+import os
 
-csrf = CSRFProtect()
+
+class MaskedCSRFProtect(CSRFProtect):
+    """CSRFProtect that takes the masked tokens pages are given (see masked_csrf_token)"""
+
+    def _get_csrf_token(self):
+        return unmask_csrf_token(super(MaskedCSRFProtect, self)._get_csrf_token())
+
+
+csrf = MaskedCSRFProtect()
 
 
 class CSRF(object):
@@ -23,6 +34,8 @@ class CSRF(object):
 
         global csrf
         csrf.init_app(app)
+        # In place of flask-wtf's own, so every token put in a page is masked
+        app.jinja_env.globals['csrf_token'] = masked_csrf_token
 
         app.register_error_handler(CSRFError, handle_csrf_error)
 
@@ -30,3 +43,36 @@ class CSRF(object):
 def handle_csrf_error(e):
     flash('The form you were submitting has expired. Please try again.', 'error')
     return redirect(request.referrer)
+
+
+def masked_csrf_token():
+    """The session's CSRF token, masked with a new random pad each time it's put in a page
+
+    Pages are compressed (see ResponseCompression), and some reflect what's in the request (e.g. search terms).
+    If the token were the same in every response, an attacker who can make requests for the user and see how big
+    the responses are could work it out a character at a time from how well each one compresses (BREACH). Masked,
+    it never repeats, so there's nothing to match against. The pad is sent along with the token XORed with it.
+    """
+    token = generate_csrf().encode()
+    pad = os.urandom(len(token))
+    return base64.urlsafe_b64encode(pad + _xor(pad, token)).decode()
+
+
+def unmask_csrf_token(masked):
+    """The token masked_csrf_token was given, or what was sent as it is if it isn't a masked token (so it's
+    validated, and most likely rejected, as it would have been before)"""
+    # Signed tokens have dots in, which masked ones can't
+    if not masked or '.' in masked:
+        return masked
+    try:
+        data = base64.urlsafe_b64decode(masked.encode())
+        half = len(data) // 2
+        if not data or len(data) % 2:
+            return masked
+        return _xor(data[:half], data[half:]).decode()
+    except (ValueError, binascii.Error):
+        return masked
+
+
+def _xor(first, second):
+    return bytes(a ^ b for a, b in zip(first, second))
@@ -3,7 +3,6 @@ from flask import request
 from flask_logconfig import LogConfig
 from pathlib import Path
 
-import requests
 import uuid
 
 
@@ -11,10 +10,8 @@ def before_request():
     # Sets the transaction trace id on the global object if provided in the HTTP header from the caller.
     # Generate a new one if it has not. We will use this in log messages.
     g.trace_id = request.headers.get('X-Trace-ID', uuid.uuid4().hex)
-    # We also create a session-level requests object for the app to use with the header pre-set, so other APIs
-    # will receive it. These lines can be removed if the app will not make requests to other LR APIs!
-    g.requests = requests.Session()
-    g.requests.headers.update({'X-Trace-ID': g.trace_id})
+    # The requests object other LR APIs are called with (g.requests) is set up by the http_connection_pool
+    # extension, which adds this trace id to every outbound call so those APIs will receive it.
 
 
 class EnhancedLogging(object):
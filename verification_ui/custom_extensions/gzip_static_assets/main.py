@@ -1,13 +1,33 @@
-from flask import request
-from flask_compress import Compress
-from werkzeug.contrib.cache import FileSystemCache
+from flask import current_app, request, send_from_directory
+from flask.helpers import safe_join
+import gzip
+import mimetypes
+import os
 
+# Brotli is optional, assets are only precompressed with gzip without it
+try:
+    import brotli
+except ImportError:
+    brotli = None
 
-compress = Compress()
+# The file each encoding's copy of an asset is kept in is the asset's name with this added
+SUFFIXES = {
+    'br': '.br',
+    'gzip': '.gz'
+}
+# Assets worth compressing. Images and web fonts (other than EOT) are already compressed
+PRECOMPRESS_EXTENSIONS = ('.css', '.js', '.map', '.json', '.svg', '.txt', '.ico', '.eot', '.ttf')
+# A copy that isn't at least this much smaller than the original isn't kept
+MINIMUM_SAVING = 0.05
 
 
 class GzipStaticAssets(object):
-    """Gzip compression with Flask-Compress"""
+    """Serves static assets from copies compressed when the assets were built (see precompress)
+
+    The copy to send is picked from those that exist by the request's Accept-Encoding, preferring the encodings
+    in STATIC_ASSETS_ENCODINGS in that order if the browser doesn't mind which. Assets without a copy the browser
+    accepts are sent as they are, so nothing is ever compressed while responding.
+    """
 
     def __init__(self, app=None):
         self.app = app
@@ -15,21 +35,77 @@ class GzipStaticAssets(object):
             self.init_app(app)
 
     def init_app(self, app):
+        app.config.setdefault('STATIC_ASSETS_ENCODINGS', ['br', 'gzip'])
+
+        send_static_file = app.view_functions['static']
+
+        def static(filename):
+            encoding, encoded = best_encoding(filename)
+            if encoding is None:
+                response = send_static_file(filename=filename)
+            else:
+                response = send_from_directory(current_app.static_folder, encoded,
+                                               mimetype=mimetypes.guess_type(filename)[0],
+                                               cache_timeout=current_app.get_send_file_max_age(filename))
+                response.headers['Content-Encoding'] = encoding
+            response.vary.add('Accept-Encoding')
+            return response
+
+        app.view_functions['static'] = static
+
+
+def best_encoding(filename):
+    """The encoding to send the static asset filename with, and the file with that copy of it in
+
+    (None, None) if it should be sent as it is.
+    """
+    path = safe_join(current_app.static_folder, filename)
+    available = [encoding for encoding in current_app.config['STATIC_ASSETS_ENCODINGS']
+                 if os.path.isfile(path + SUFFIXES[encoding])]
+    encoding = request.accept_encodings.best_match(available) if available else None
+    if encoding is None:
+        return None, None
+    return encoding, filename + SUFFIXES[encoding]
+
+
+def precompress(directory):
+    """Write a gzip (and, if the brotli package is installed, a Brotli) compressed copy of each asset in directory
+
+    Run after the assets are built. Returns a list of (asset path, size, {encoding: compressed size}) for each
+    asset compressed. Copies that aren't worth keeping are removed, as are any left from a previous build.
+    """
+    compressors = [('gzip', lambda data: gzip.compress(data, compresslevel=9, mtime=0))]
+    if brotli is not None:
+        compressors.append(('br', lambda data: brotli.compress(data, quality=11)))
 
-        app.config.setdefault('COMPRESS_MIMETYPES', ['text/css', 'application/javascript'])
-        app.config.setdefault('COMPRESS_CACHE_BACKEND', gzip_cache)
-        app.config.setdefault('COMPRESS_CACHE_KEY', gzip_cache_key)
+    results = []
+    for root, directories, files in os.walk(directory):
+        directories.sort()
+        for name in sorted(files):
+            if not name.endswith(PRECOMPRESS_EXTENSIONS):
+                continue
 
-        compress.init_app(app)
+            path = os.path.join(root, name)
+            with open(path, 'rb') as asset:
+                data = asset.read()
 
+            sizes = {}
+            for encoding, compress in compressors:
+                compressed = compress(data)
+                encoded_path = path + SUFFIXES[encoding]
+                if len(compressed) <= len(data) * (1 - MINIMUM_SAVING):
+                    _write(encoded_path, compressed)
+                    sizes[encoding] = len(compressed)
+                elif os.path.exists(encoded_path):
+                    os.remove(encoded_path)
+            results.append((os.path.relpath(path, directory), len(data), sizes))
 
-def gzip_cache():
-    """Set up a caching system for the gzipped assets"""
-    cache = FileSystemCache(cache_dir='.cache/gzip')
-    cache.clear()
-    return cache
+    return results
 
 
-def gzip_cache_key(response):
-    """Gzip cache key"""
-    return request.path + response.headers.get('ETag', '')
+def _write(path, data):
+    # Written alongside then moved into place, so a request never gets half a file
+    temporary_path = path + '.tmp'
+    with open(temporary_path, 'wb') as encoded:
+        encoded.write(data)
+    os.replace(temporary_path, path)
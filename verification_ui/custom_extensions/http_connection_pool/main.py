@@ -0,0 +1,233 @@
+from flask import current_app, g
+from functools import partial
+from http.cookiejar import DefaultCookiePolicy
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+import requests
+import socket
+import threading
+import time
+
+
+class PoolStats(object):
+    """Process-wide counters for the shared connection pool
+
+    A hit is a request that was sent down an already open connection, a miss is one that had to open
+    (or re-open) a connection first. Idle evictions are connections we closed because they had been
+    sitting in the pool for longer than HTTP_POOL_MAX_IDLE seconds.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.hits = 0
+            self.misses = 0
+            self.idle_evictions = 0
+
+    def record(self, hit, evicted=False):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+            if evicted:
+                self.idle_evictions += 1
+
+    def as_dict(self):
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'idle_evictions': self.idle_evictions
+            }
+
+
+pool_stats = PoolStats()
+
+
+class _CountingPoolMixin(object):
+    """Counts connection reuse and closes connections that have been idle for too long
+
+    urllib3 hands back a connection with an open socket when it can reuse one, otherwise either a brand new
+    connection or one it has just closed because the server dropped it. Either of the latter is a miss.
+    """
+
+    def __init__(self, *args, max_idle=None, **kwargs):
+        self.max_idle = max_idle
+        super(_CountingPoolMixin, self).__init__(*args, **kwargs)
+
+    def _get_conn(self, timeout=None):
+        conn = super(_CountingPoolMixin, self)._get_conn(timeout=timeout)
+        hit = getattr(conn, 'sock', None) is not None
+        evicted = False
+
+        last_used = getattr(conn, 'last_used', None)
+        if hit and self.max_idle is not None and last_used is not None \
+                and time.monotonic() - last_used > self.max_idle:
+            conn.close()
+            hit = False
+            evicted = True
+
+        pool_stats.record(hit, evicted)
+        return conn
+
+    def _put_conn(self, conn):
+        if conn is not None:
+            conn.last_used = time.monotonic()
+        return super(_CountingPoolMixin, self)._put_conn(conn)
+
+
+class CountingHTTPConnectionPool(_CountingPoolMixin, HTTPConnectionPool):
+    pass
+
+
+class CountingHTTPSConnectionPool(_CountingPoolMixin, HTTPSConnectionPool):
+    pass
+
+
+class PooledHTTPAdapter(HTTPAdapter):
+    """HTTPAdapter that uses the counting pools and optionally turns on TCP keep-alive"""
+
+    def __init__(self, keep_alive=True, max_idle=None, **kwargs):
+        self.keep_alive = keep_alive
+        self.max_idle = max_idle
+        super(PooledHTTPAdapter, self).__init__(**kwargs)
+
+    def init_poolmanager(self, *args, **kwargs):
+        if self.keep_alive:
+            kwargs['socket_options'] = HTTPConnection.default_socket_options + [
+                (socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+            ]
+        super(PooledHTTPAdapter, self).init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            'http': partial(CountingHTTPConnectionPool, max_idle=self.max_idle),
+            'https': partial(CountingHTTPSConnectionPool, max_idle=self.max_idle)
+        }
+
+
+class DeadlineExceeded(requests.exceptions.Timeout):
+    """The request being served has used up all the time it has for calls to other APIs"""
+
+
+class TracedSession(object):
+    """Per-request view of the shared session
+
+    Adds the X-Trace-ID header to each call rather than to the session itself, as the session (and its
+    connections) is shared by every request being served by this worker.
+
+    If given a deadline (a time.time() value) it's shared by all the calls made while serving the request.
+    Each call's timeouts are cut down to the time left before it, the time left is sent on in the
+    X-Deadline-Remaining-Ms header so the other API can give up when we will have, and once it has passed
+    calls fail straight away with DeadlineExceeded.
+    """
+
+    def __init__(self, session, trace_id, deadline=None):
+        self.session = session
+        self.trace_id = trace_id
+        self.deadline = deadline
+
+    def get(self, url, **kwargs):
+        return self.session.get(url, **self._prepare(kwargs))
+
+    def post(self, url, **kwargs):
+        return self.session.post(url, **self._prepare(kwargs))
+
+    def put(self, url, **kwargs):
+        return self.session.put(url, **self._prepare(kwargs))
+
+    def delete(self, url, **kwargs):
+        return self.session.delete(url, **self._prepare(kwargs))
+
+    def with_deadline(self, seconds):
+        """A view of the same session with its own deadline, seconds from now, in place of this one's"""
+        return TracedSession(self.session, self.trace_id, time.time() + seconds)
+
+    def remaining(self):
+        """Seconds left before the deadline, or None if there isn't one"""
+        if self.deadline is None:
+            return None
+        return self.deadline - time.time()
+
+    def _prepare(self, kwargs):
+        headers = dict(kwargs.get('headers') or {})
+        headers['X-Trace-ID'] = self.trace_id
+
+        remaining = self.remaining()
+        if remaining is not None:
+            if remaining <= 0:
+                raise DeadlineExceeded('Request deadline exceeded')
+            headers['X-Deadline-Remaining-Ms'] = str(int(remaining * 1000))
+            kwargs['timeout'] = _cap_timeout(kwargs.get('timeout'), remaining)
+
+        kwargs['headers'] = headers
+        return kwargs
+
+
+def _cap_timeout(timeout, remaining):
+    # requests takes either one timeout for both connecting and reading, or a (connect, read) tuple
+    if timeout is None:
+        return remaining
+    if isinstance(timeout, tuple):
+        return tuple(remaining if part is None else min(part, remaining) for part in timeout)
+    return min(timeout, remaining)
+
+
+def build_session(pool_connections, pool_maxsize, pool_block, keep_alive, max_idle=None):
+    """Create a requests Session backed by a connection pool that can be shared between requests"""
+    session = requests.Session()
+
+    # The session is shared by every user of the app, so never remember cookies set by upstream services
+    session.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+
+    adapter = PooledHTTPAdapter(keep_alive=keep_alive,
+                                max_idle=max_idle,
+                                pool_connections=pool_connections,
+                                pool_maxsize=pool_maxsize,
+                                pool_block=pool_block)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+
+class HttpConnectionPool(object):
+    """Process-wide pooled HTTP client
+
+    One requests Session (and so one urllib3 pool manager) is created per worker process and reused by every
+    request, so calls to other APIs no longer pay for a new TCP connection and TLS handshake each time.
+    The pool's queues and locks are green-thread safe once eventlet has monkey patched the worker.
+    """
+
+    def __init__(self, app=None):
+        self.app = app
+        self.session = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.session = build_session(app.config['HTTP_POOL_CONNECTIONS'],
+                                     app.config['HTTP_POOL_MAXSIZE'],
+                                     app.config['HTTP_POOL_BLOCK'],
+                                     app.config['HTTP_POOL_KEEP_ALIVE'],
+                                     app.config['HTTP_POOL_MAX_IDLE'])
+
+        app.before_request(self.before_request)
+
+    def before_request(self):
+        # Relies on the enhanced logging extension having set the trace id first
+        g.requests = self.traced_session(g.trace_id)
+
+    def traced_session(self, trace_id):
+        """A TracedSession of the shared session for trace_id, with HTTP_REQUEST_DEADLINE seconds from now"""
+        deadline = current_app.config['HTTP_REQUEST_DEADLINE']
+        if deadline:
+            deadline = time.time() + deadline
+        else:
+            deadline = None
+        return TracedSession(self.session, trace_id, deadline)
+
+    def stats(self):
+        return pool_stats.as_dict()
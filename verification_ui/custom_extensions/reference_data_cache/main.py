@@ -0,0 +1,121 @@
+from flask import current_app, has_request_context
+from verification_ui.utils.cache_utils import LRUCache
+from verification_ui.utils.context_utils import in_request_context
+import threading
+import time
+
+
+class ReferenceDataCache(object):
+    """Cache for reference data from other APIs that rarely changes (e.g. common decline reasons)
+
+    Entries are fresh for their TTL. After that they are still served for up to their stale TTL while a
+    background refresh fetches a new copy, so users don't wait on the refresh. Once that has passed too,
+    the data is loaded again before it's returned.
+
+    The storage is pluggable: REFERENCE_DATA_CACHE_BACKEND is a function taking the app and returning an
+    object with get(key), set(key, value), delete(key) and clear() methods. The default keeps entries in a
+    size bounded, least recently used, in-process store.
+    """
+
+    def __init__(self, app=None):
+        self.app = app
+        self.backend = None
+        self._refreshing = set()
+        self._lock = threading.Lock()
+        self._stats = dict(hits=0, stale_hits=0, misses=0, refreshes=0, refresh_failures=0)
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('REFERENCE_DATA_CACHE_BACKEND', lru_backend)
+        app.config.setdefault('REFERENCE_DATA_CACHE_MAX_SIZE', 100)
+        # Seconds an entry is fresh for, then the further seconds it can be served stale while it's refreshed
+        app.config.setdefault('REFERENCE_DATA_CACHE_TTL', 60 * 60)
+        app.config.setdefault('REFERENCE_DATA_CACHE_STALE_TTL', 24 * 60 * 60)
+
+        self.backend = app.config['REFERENCE_DATA_CACHE_BACKEND'](app)
+
+    def get_or_load(self, key, loader, ttl=None, stale_ttl=None):
+        """Return the cached value for key, calling loader() to get it if it isn't cached
+
+        If loader raises, nothing is cached and the exception is passed on to the caller.
+        """
+        if ttl is None:
+            ttl = current_app.config['REFERENCE_DATA_CACHE_TTL']
+        if stale_ttl is None:
+            stale_ttl = current_app.config['REFERENCE_DATA_CACHE_STALE_TTL']
+
+        entry = self.backend.get(key)
+        now = time.time()
+
+        if entry is not None:
+            value, fresh_until, stale_until = entry
+            if now < fresh_until:
+                self._count('hits')
+                return value
+            if now < stale_until:
+                self._count('stale_hits')
+                self._refresh_in_background(key, loader, ttl, stale_ttl)
+                return value
+
+        self._count('misses')
+        return self._load(key, loader, ttl, stale_ttl)
+
+    def purge(self, key=None):
+        """Remove key from the cache, or everything if no key is given"""
+        if key is None:
+            self.backend.clear()
+        else:
+            self.backend.delete(key)
+        current_app.logger.info('Purged reference data cache (key: {}). Stats: {}'.format(key, self.stats()))
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats)
+
+    def _load(self, key, loader, ttl, stale_ttl):
+        value = loader()
+        now = time.time()
+        self.backend.set(key, (value, now + ttl, now + ttl + stale_ttl))
+        return value
+
+    def _refresh_in_background(self, key, loader, ttl, stale_ttl):
+        # Only one refresh per key at a time, everyone else carries on with the stale value
+        with self._lock:
+            if key in self._refreshing:
+                return
+            self._refreshing.add(key)
+
+        def refresh():
+            try:
+                self._load(key, loader, ttl, stale_ttl)
+                self._count('refreshes')
+                current_app.logger.info('Refreshed reference data {}'.format(key))
+            except Exception as e:
+                self._count('refresh_failures')
+                current_app.logger.warning('Failed to refresh reference data {}: {}'.format(key, repr(e)))
+            finally:
+                with self._lock:
+                    self._refreshing.discard(key)
+
+        if has_request_context():
+            target = in_request_context(refresh)
+        else:
+            app = current_app._get_current_object()
+
+            def target():
+                with app.app_context():
+                    refresh()
+
+        thread = threading.Thread(target=target)
+        thread.daemon = True
+        thread.start()
+
+    def _count(self, name):
+        with self._lock:
+            self._stats[name] += 1
+
+
+def lru_backend(app):
+    """Default backend for the reference data cache"""
+    return LRUCache(app.config['REFERENCE_DATA_CACHE_MAX_SIZE'])
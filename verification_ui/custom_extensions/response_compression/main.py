@@ -0,0 +1,166 @@
+from flask import request
+import threading
+import time
+import zlib
+
+# Brotli is optional, responses are only compressed with gzip without it
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+class ResponseCompression(object):
+    """Compresses HTML and JSON responses with the first of RESPONSE_COMPRESSION_ENCODINGS (e.g. ['br', 'gzip'])
+    the browser accepts
+
+    Off unless some encodings are given. Responses smaller than RESPONSE_COMPRESSION_MIN_SIZE bytes aren't
+    compressed, as the saving isn't worth the time. Streamed responses are compressed a chunk at a time, and each
+    chunk is flushed, so the browser still gets each part of the page as soon as it's ready. Static assets are
+    left to GzipStaticAssets, and event streams aren't compressed at all.
+
+    Pages can reflect what's in the request (e.g. search terms), so anything secret in a compressed page could be
+    worked out from the sizes of responses to requests an attacker makes for the user (BREACH). The CSRF token is
+    the secret in these pages, and it's masked differently in every page for this reason (see masked_csrf_token).
+    Anything else secret added to pages needs the same.
+
+    The bytes in and out and the time spent compressing are counted per endpoint (see stats).
+    """
+
+    def __init__(self, app=None):
+        self.app = app
+        self.encodings = []
+        self._lock = threading.Lock()
+        self._stats = {}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('RESPONSE_COMPRESSION_ENCODINGS', [])
+        app.config.setdefault('RESPONSE_COMPRESSION_MIMETYPES', ['text/html', 'application/json'])
+        app.config.setdefault('RESPONSE_COMPRESSION_MIN_SIZE', 1024)
+        app.config.setdefault('RESPONSE_COMPRESSION_GZIP_LEVEL', 6)
+        # 0 to 11. Higher than about 5 costs far more time than it saves in bytes for pages made on each request
+        app.config.setdefault('RESPONSE_COMPRESSION_BROTLI_QUALITY', 4)
+
+        self.encodings = [encoding for encoding in app.config['RESPONSE_COMPRESSION_ENCODINGS']
+                          if encoding in COMPRESSORS]
+        if 'br' in self.encodings and brotli is None:
+            app.logger.warning('The brotli package is not installed, so responses will not be compressed with br')
+            self.encodings.remove('br')
+
+        levels = {
+            'gzip': app.config['RESPONSE_COMPRESSION_GZIP_LEVEL'],
+            'br': app.config['RESPONSE_COMPRESSION_BROTLI_QUALITY']
+        }
+        mimetypes = app.config['RESPONSE_COMPRESSION_MIMETYPES']
+        min_size = app.config['RESPONSE_COMPRESSION_MIN_SIZE']
+
+        @app.after_request
+        def compress_response(response):
+            if not self.encodings or response.mimetype not in mimetypes or response.status_code != 200 \
+                    or response.direct_passthrough or 'Content-Encoding' in response.headers:
+                return response
+
+            response.vary.add('Accept-Encoding')
+            encoding = request.accept_encodings.best_match(self.encodings)
+            if encoding is None:
+                return response
+            if not response.is_streamed and response.content_length is not None \
+                    and response.content_length < min_size:
+                return response
+
+            compressor = COMPRESSORS[encoding](levels[encoding])
+            if response.is_streamed:
+                response.response = self._compress_stream(request.endpoint, compressor, response.response)
+                response.headers.pop('Content-Length', None)
+            else:
+                data = response.get_data()
+                started = time.perf_counter()
+                compressed = compressor.compress(data) + compressor.finish()
+                self._count(request.endpoint, len(data), len(compressed), time.perf_counter() - started)
+                response.set_data(compressed)
+
+            response.headers['Content-Encoding'] = encoding
+            # The compressed response isn't byte for byte the same as the uncompressed one any more
+            etag, weak = response.get_etag()
+            if etag is not None and not weak:
+                response.set_etag(etag, weak=True)
+            return response
+
+    def _compress_stream(self, endpoint, compressor, chunks):
+        size = compressed_size = 0
+        seconds = 0
+        try:
+            for chunk in chunks:
+                if isinstance(chunk, str):
+                    chunk = chunk.encode('utf-8')
+                started = time.perf_counter()
+                compressed = compressor.compress(chunk) + compressor.flush()
+                seconds += time.perf_counter() - started
+                size += len(chunk)
+                compressed_size += len(compressed)
+                yield compressed
+            started = time.perf_counter()
+            compressed = compressor.finish()
+            seconds += time.perf_counter() - started
+            compressed_size += len(compressed)
+            yield compressed
+        finally:
+            if hasattr(chunks, 'close'):
+                chunks.close()
+            self._count(endpoint, size, compressed_size, seconds)
+
+    def _count(self, endpoint, size, compressed_size, seconds):
+        with self._lock:
+            stats = self._stats.setdefault(endpoint, dict(responses=0, bytes_in=0, bytes_out=0, seconds=0.0))
+            stats['responses'] += 1
+            stats['bytes_in'] += size
+            stats['bytes_out'] += compressed_size
+            stats['seconds'] += seconds
+
+    def stats(self):
+        """Per endpoint, how many responses were compressed, the bytes before and after, and the seconds taken"""
+        with self._lock:
+            stats = {}
+            for endpoint, counts in self._stats.items():
+                stats[endpoint] = dict(counts, bytes_saved=counts['bytes_in'] - counts['bytes_out'],
+                                       seconds=round(counts['seconds'], 6))
+        return stats
+
+
+class GzipCompressor(object):
+
+    def __init__(self, level):
+        # gzip rather than zlib headers
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def compress(self, data):
+        return self._compressor.compress(data)
+
+    def flush(self):
+        return self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self):
+        return self._compressor.flush()
+
+
+class BrotliCompressor(object):
+
+    def __init__(self, quality):
+        self._compressor = brotli.Compressor(quality=quality)
+
+    def compress(self, data):
+        return self._compressor.process(data)
+
+    def flush(self):
+        return self._compressor.flush()
+
+    def finish(self):
+        return self._compressor.finish()
+
+
+COMPRESSORS = {
+    'gzip': GzipCompressor,
+    'br': BrotliCompressor
+}
@@ -0,0 +1,296 @@
+from flask.json.tag import TaggedJSONSerializer
+from flask.sessions import SessionInterface, SessionMixin
+from werkzeug.datastructures import CallbackDict
+from verification_ui.utils.cache_utils import LRUCache
+import secrets
+import sqlite3
+import threading
+import time
+
+# Only there when running under gunicorn's eventlet worker (see run.sh)
+try:
+    from eventlet import patcher, tpool
+except ImportError:
+    patcher = tpool = None
+
+
+class ServerSideSessions(object):
+    """Keeps the contents of sessions on the server, so the session cookie only has to hold a random session id
+
+    Flask's default session keeps everything (including the user's whole ADFS access token) in a signed cookie,
+    which the browser uploads and we check the signature of on every request.
+
+    The storage is chosen with SESSION_STORE:
+
+        memory - in-process and size bounded, only for running a single process locally
+        sqlite - a SQLite database at SESSION_SQLITE_PATH, shared by every worker on one node (so only for a
+            single host)
+        key-value - a Redis server at SESSION_KEY_VALUE_URL, shared by every node. If no URL is given an
+            in-process stand-in is used, for running locally
+
+    or can be a function taking the app and returning an object with get(sid), set(sid, data, ttl), delete(sid)
+    and cleanup() methods. Sessions expire PERMANENT_SESSION_LIFETIME after they were last saved, and expired
+    ones are cleaned up every SESSION_CLEANUP_INTERVAL seconds.
+    """
+
+    def __init__(self, app=None):
+        self.app = app
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('SESSION_STORE', 'memory')
+        app.config.setdefault('SESSION_MEMORY_MAX_SIZE', 1000)
+        app.config.setdefault('SESSION_SQLITE_PATH', None)
+        app.config.setdefault('SESSION_KEY_VALUE_URL', None)
+        app.config.setdefault('SESSION_CLEANUP_INTERVAL', 5 * 60)
+
+        store = app.config['SESSION_STORE']
+        if not callable(store):
+            store = STORES[store]
+        app.session_interface = ServerSideSessionInterface(store(app), app.config['SESSION_CLEANUP_INTERVAL'])
+
+
+class ServerSideSession(CallbackDict, SessionMixin):
+
+    def __init__(self, initial=None, sid=None, new=False):
+        def on_update(self):
+            self.modified = True
+
+        super(ServerSideSession, self).__init__(initial, on_update)
+        self.sid = sid
+        self.new = new
+        self.modified = False
+        self.previous_sid = None
+
+    def regenerate(self):
+        """Move the session to a new id, e.g. when the user logs in, so an id known to anyone else stops working"""
+        if self.previous_sid is None:
+            self.previous_sid = self.sid
+        self.sid = _new_sid()
+        self.modified = True
+
+
+class ServerSideSessionInterface(SessionInterface):
+    """Loads and saves sessions from/to a store, keyed by the session id in the cookie"""
+    session_class = ServerSideSession
+    # The same serializer Flask's cookie sessions use, so sessions can hold the same types
+    serializer = TaggedJSONSerializer()
+
+    def __init__(self, store, cleanup_interval):
+        self.store = store
+        self.cleanup_interval = cleanup_interval
+        self._next_cleanup = time.time() + cleanup_interval
+        self._lock = threading.Lock()
+
+    def open_session(self, app, request):
+        sid = request.cookies.get(app.session_cookie_name)
+        if sid:
+            data = self.store.get(sid)
+            if data is not None:
+                return self.session_class(self.serializer.loads(data), sid=sid)
+
+        # Ids are only ever made here, so a client can't choose its own (or reuse an expired one)
+        return self.session_class(sid=_new_sid(), new=True)
+
+    def save_session(self, app, session, response):
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+
+        if session.previous_sid is not None:
+            self.store.delete(session.previous_sid)
+
+        if not session:
+            if session.modified:
+                self.store.delete(session.sid)
+                response.delete_cookie(app.session_cookie_name, domain=domain, path=path)
+            return
+
+        if self.should_set_cookie(app, session):
+            ttl = int(app.permanent_session_lifetime.total_seconds())
+            self.store.set(session.sid, self.serializer.dumps(dict(session)), ttl)
+            response.set_cookie(app.session_cookie_name, session.sid,
+                                expires=self.get_expiration_time(app, session),
+                                httponly=self.get_cookie_httponly(app),
+                                domain=domain,
+                                path=path,
+                                secure=self.get_cookie_secure(app),
+                                samesite=self.get_cookie_samesite(app))
+
+        self._cleanup_if_due()
+
+    def _cleanup_if_due(self):
+        with self._lock:
+            if time.time() < self._next_cleanup:
+                return
+            self._next_cleanup = time.time() + self.cleanup_interval
+        self.store.cleanup()
+
+
+def _new_sid():
+    return secrets.token_urlsafe(32)
+
+
+class MemoryStore(object):
+    """Sessions held in-process, in a size bounded least recently used store"""
+
+    def __init__(self, max_size):
+        self.entries = LRUCache(max_size)
+
+    def get(self, sid):
+        entry = self.entries.get(sid)
+        if entry is None:
+            return None
+        data, expires_at = entry
+        if time.time() >= expires_at:
+            self.entries.delete(sid)
+            return None
+        return data
+
+    def set(self, sid, data, ttl):
+        self.entries.set(sid, (data, time.time() + ttl))
+
+    def delete(self, sid):
+        self.entries.delete(sid)
+
+    def cleanup(self):
+        for sid in self.entries.keys():
+            # Expired entries are removed as they're looked at
+            self.get(sid)
+
+
+class SQLiteStore(object):
+    """Sessions held in a SQLite database, which every process on the same machine can share
+
+    Only for running on a single host: the database is a local file, so sessions aren't shared with other
+    machines (use the key-value store for that).
+
+    sqlite3 blocks the whole process while it waits on the database, so under eventlet, where every request in a
+    worker is a green thread in one OS thread, each call is made in eventlet's pool of real threads instead.
+    Otherwise one request waiting on a locked database would stall all the others in its worker.
+    """
+    # Seconds to wait for another process to finish writing before giving up
+    timeout = 1
+
+    def __init__(self, path):
+        self.path = path
+        self._execute(self._create)
+
+    def get(self, sid):
+        row = self._execute(self._query, 'SELECT data FROM sessions WHERE sid = ? AND expires_at > ?',
+                            (sid, time.time()))
+        return None if row is None else row[0]
+
+    def set(self, sid, data, ttl):
+        self._execute(self._query, 'INSERT OR REPLACE INTO sessions (sid, data, expires_at) VALUES (?, ?, ?)',
+                      (sid, data, time.time() + ttl))
+
+    def delete(self, sid):
+        self._execute(self._query, 'DELETE FROM sessions WHERE sid = ?', (sid,))
+
+    def cleanup(self):
+        self._execute(self._query, 'DELETE FROM sessions WHERE expires_at <= ?', (time.time(),))
+
+    def _create(self):
+        with self._connect() as connection:
+            # Readers don't wait on writers (or each other) in write-ahead log mode
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('CREATE TABLE IF NOT EXISTS sessions '
+                               '(sid TEXT PRIMARY KEY, data TEXT NOT NULL, expires_at REAL NOT NULL)')
+            connection.execute('CREATE INDEX IF NOT EXISTS sessions_expires_at ON sessions (expires_at)')
+
+    def _query(self, statement, parameters):
+        with self._connect() as connection:
+            return connection.execute(statement, parameters).fetchone()
+
+    def _connect(self):
+        # A connection per call, as they can't be shared between threads. Opening one is cheap
+        return _closing_connection(sqlite3.connect(self.path, timeout=self.timeout))
+
+    def _execute(self, call, *args):
+        if tpool is not None and patcher.is_monkey_patched('thread'):
+            return tpool.execute(call, *args)
+        return call(*args)
+
+
+class KeyValueStore(object):
+    """Sessions held in a key-value server such as Redis, which every machine can share
+
+    client needs Redis's get(key), setex(key, ttl, value) and delete(key) methods. The server expires the
+    sessions itself, so there's nothing to clean up.
+    """
+    prefix = 'verification-ui:session:'
+
+    def __init__(self, client):
+        self.client = client
+
+    def get(self, sid):
+        data = self.client.get(self.prefix + sid)
+        return data.decode() if isinstance(data, bytes) else data
+
+    def set(self, sid, data, ttl):
+        self.client.setex(self.prefix + sid, ttl, data)
+
+    def delete(self, sid):
+        self.client.delete(self.prefix + sid)
+
+    def cleanup(self):
+        pass
+
+
+class LocalKeyValueClient(object):
+    """In-process stand-in for a Redis client, for running locally without a Redis server"""
+
+    def __init__(self):
+        self._store = MemoryStore(max_size=10000)
+
+    def get(self, key):
+        return self._store.get(key)
+
+    def setex(self, key, ttl, value):
+        self._store.set(key, value, ttl)
+
+    def delete(self, key):
+        self._store.delete(key)
+
+
+class _closing_connection(object):
+    """Commits (or rolls back) on leaving the block like a sqlite3 connection does, then closes it too"""
+
+    def __init__(self, connection):
+        self.connection = connection
+
+    def __enter__(self):
+        return self.connection.__enter__()
+
+    def __exit__(self, *exc_info):
+        try:
+            return self.connection.__exit__(*exc_info)
+        finally:
+            self.connection.close()
+
+
+def memory_store(app):
+    return MemoryStore(app.config['SESSION_MEMORY_MAX_SIZE'])
+
+
+def sqlite_store(app):
+    return SQLiteStore(app.config['SESSION_SQLITE_PATH'])
+
+
+def key_value_store(app):
+    url = app.config['SESSION_KEY_VALUE_URL']
+    if not url:
+        app.logger.warning('No SESSION_KEY_VALUE_URL given, so sessions are only kept in this process')
+        return KeyValueStore(LocalKeyValueClient())
+
+    # Optional, as it's only needed when sessions are shared between machines
+    import redis
+    return KeyValueStore(redis.StrictRedis.from_url(url))
+
+
+STORES = {
+    'memory': memory_store,
+    'sqlite': sqlite_store,
+    'key-value': key_value_store
+}
@@ -0,0 +1,82 @@
+from jinja2 import FileSystemBytecodeCache
+from verification_ui.utils.file_utils import make_private_directory
+import os
+import time
+
+
+class TemplateCache(object):
+    """Keeps compiled templates on disk, and can compile all of them as a worker starts
+
+    Jinja compiles each template the first time it's used, in every worker, so the first requests after a deploy
+    (or a new worker starting) are slow. With TEMPLATE_BYTECODE_CACHE_DIR set, compiled templates are kept there
+    and loaded by later workers instead. Jinja checks each one against its template's source, so an edited
+    template is compiled again rather than an old version being used. The cache can be filled as part of the
+    build with `manage.py compile_templates`. Compiled templates are code the app runs, so the directory is only
+    used if it belongs to the app's user and no one else can write to it.
+
+    With TEMPLATE_WARM_UP, every template is compiled (or loaded from the cache) when the worker starts, rather
+    than when a page first needs it (see warm_up).
+    """
+
+    def __init__(self, app=None):
+        self.app = app
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('TEMPLATE_BYTECODE_CACHE_DIR', None)
+        app.config.setdefault('TEMPLATE_WARM_UP', False)
+
+        directory = app.config['TEMPLATE_BYTECODE_CACHE_DIR']
+        if directory:
+            if make_private_directory(directory):
+                app.jinja_env.bytecode_cache = AtomicFileSystemBytecodeCache(directory)
+            else:
+                app.logger.error('Not keeping compiled templates in {}, as it belongs to another user or others can '
+                                 'write to it'.format(directory))
+
+    def warm_up(self, app):
+        """Compile every template now if TEMPLATE_WARM_UP is on
+
+        Templates are checked for unknown filters as they're compiled, so this has to be called once everything
+        adding filters and globals (extensions and blueprints) has been registered.
+        """
+        if not app.config.get('TEMPLATE_WARM_UP'):
+            return
+
+        started = time.perf_counter()
+        compiled, failed = compile_templates(app)
+        app.logger.info('Compiled {} templates in {:.3f}s'.format(len(compiled), time.perf_counter() - started))
+        for name, error in failed:
+            app.logger.warning('Could not compile template {}: {}'.format(name, repr(error)))
+
+
+def compile_templates(app):
+    """Compile (or load from the bytecode cache) every template the app can load
+
+    Returns the names of the templates compiled, and a list of (name, error) for any that couldn't be. Compiled
+    templates are kept in the Jinja environment's in-memory cache, and written to the bytecode cache if there is
+    one.
+    """
+    compiled = []
+    failed = []
+    for name in app.jinja_env.list_templates(extensions=['html']):
+        try:
+            app.jinja_env.get_template(name)
+        except Exception as error:
+            failed.append((name, error))
+        else:
+            compiled.append(name)
+    return compiled, failed
+
+
+class AtomicFileSystemBytecodeCache(FileSystemBytecodeCache):
+    """Writes each compiled template alongside then moves it into place, so a worker never loads half of one
+    another worker is still writing"""
+
+    def dump_bytecode(self, bucket):
+        path = self._get_cache_filename(bucket)
+        temporary_path = '{}.{}.tmp'.format(path, os.getpid())
+        with open(temporary_path, 'wb') as output:
+            bucket.write_bytecode(output)
+        os.replace(temporary_path, path)
@@ -0,0 +1,182 @@
+from collections import deque
+from flask import g
+import itertools
+import os
+import threading
+import time
+import uuid
+
+
+class WorklistEvents(object):
+    """Tells open worklist pages when a case is locked, unlocked or has its status changed, so they can update
+    those rows in place rather than being reloaded
+
+    Changes are published by this app's own actions (e.g. locking a case) as they happen. Changes made by anyone
+    else (e.g. another instance of this app) are found by fetching the worklist every
+    WORKLIST_EVENTS_POLL_INTERVAL seconds while any page is listening, and comparing it with the last one. The
+    worklist is fetched conditionally, so this is usually a 304. A poll interval of 0 turns polling off.
+
+    Events are numbered, and the last WORKLIST_EVENTS_HISTORY are kept so a page that reconnects (sending the
+    last number it saw) is sent the ones it missed.
+    """
+
+    def __init__(self, app=None):
+        self.app = app
+        self._events = deque()
+        self._ids = itertools.count(1)
+        # Event ids are only meaningful to the process that made them
+        self._instance = uuid.uuid4().hex[:8]
+        self._cases = {}
+        self._polled = False
+        self._listeners = 0
+        self._poller_pid = None
+        self._condition = threading.Condition()
+        self._stats = dict(published=0, polls=0, poll_failures=0)
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        app.config.setdefault('WORKLIST_EVENTS_POLL_INTERVAL', 15)
+        app.config.setdefault('WORKLIST_EVENTS_HISTORY', 1000)
+        # Seconds between comments sent to keep an idle connection open, and before a page is asked to reconnect
+        app.config.setdefault('WORKLIST_EVENTS_KEEPALIVE', 15)
+        app.config.setdefault('WORKLIST_EVENTS_MAX_AGE', 5 * 60)
+        self._events = deque(maxlen=app.config['WORKLIST_EVENTS_HISTORY'])
+
+    def publish(self, case_id, **changes):
+        """Tell listeners a case has changed, e.g. publish(1, staff_id='LRTM101') or publish(1, status='Approved')"""
+        case_id = str(case_id)
+        with self._condition:
+            state = dict(self._cases.get(case_id, {}), **changes)
+            self._cases[case_id] = state
+            self._add_event(dict(state, type='case', case_id=case_id))
+
+    def listen(self, last_event_id=None, timeout=None):
+        """Yield the events published from now on (or since last_event_id), or None after timeout seconds without
+        any, for WORKLIST_EVENTS_MAX_AGE seconds
+
+        If last_event_id is too old for the events since then to still be known, a 'reload' event is yielded
+        first, as the page listening can't be brought up to date.
+        """
+        if timeout is None:
+            timeout = self.app.config['WORKLIST_EVENTS_KEEPALIVE']
+        finish_at = time.time() + self.app.config['WORKLIST_EVENTS_MAX_AGE']
+
+        with self._condition:
+            self._listeners += 1
+            seen = self._last_id()
+            replay = self._events_since(last_event_id)
+        self._start_poller()
+
+        try:
+            if replay is None:
+                yield dict(type='reload', id=self._event_id(seen))
+            else:
+                for event in replay:
+                    yield event
+
+            while time.time() < finish_at:
+                with self._condition:
+                    if self._last_id() == seen:
+                        self._condition.wait(min(timeout, max(finish_at - time.time(), 0)))
+                    events = [event for event in self._events if event['number'] > seen]
+                    seen = self._last_id()
+                if events:
+                    for event in events:
+                        yield event
+                else:
+                    yield None
+        finally:
+            with self._condition:
+                self._listeners -= 1
+
+    def poll(self):
+        """Fetch the worklist and publish any differences from the last time it was fetched"""
+        # Imported here as the Verification API client needs the app's extensions to have been created first
+        from verification_ui.dependencies.verification_api import VerificationAPI
+        from verification_ui.extensions import http_connection_pool
+
+        # Not part of any request, so the poll gets a trace id and session of its own like a request would
+        with self.app.app_context():
+            g.trace_id = uuid.uuid4().hex
+            g.requests = http_connection_pool.traced_session(g.trace_id)
+            worklist = VerificationAPI().get_worklist()
+
+        current = {str(item['case_id']): dict(status=item['status'], staff_id=item['staff_id'])
+                   for item in worklist}
+        with self._condition:
+            self._stats['polls'] += 1
+            # The first worklist fetched is only what later ones are compared with
+            if self._polled:
+                for case_id, state in current.items():
+                    if self._cases.get(case_id) != state:
+                        self._add_event(dict(state, type='case', case_id=case_id))
+                for case_id in set(self._cases) - set(current):
+                    self._add_event(dict(type='removed', case_id=case_id))
+            self._cases = current
+            self._polled = True
+
+    def stats(self):
+        with self._condition:
+            stats = dict(self._stats)
+            stats['listeners'] = self._listeners
+            stats['cases'] = len(self._cases)
+        return stats
+
+    def _add_event(self, event):
+        # Must be called holding self._condition
+        event['number'] = next(self._ids)
+        event['id'] = self._event_id(event['number'])
+        self._events.append(event)
+        self._stats['published'] += 1
+        self._condition.notify_all()
+
+    def _event_id(self, number):
+        return '{}-{}'.format(self._instance, number)
+
+    def _last_id(self):
+        return self._events[-1]['number'] if self._events else 0
+
+    def _events_since(self, last_event_id):
+        """The events after last_event_id, or None if some of them have already been forgotten"""
+        instance, _, number = (last_event_id or '').partition('-')
+        if instance != self._instance or not number.isdigit():
+            # Nothing, or an id from another process (which can't be caught up on), so start from now
+            return []
+
+        number = int(number)
+        if self._events and number < self._events[0]['number'] - 1:
+            return None
+        return [event for event in self._events if event['number'] > number]
+
+    def _start_poller(self):
+        interval = self.app.config['WORKLIST_EVENTS_POLL_INTERVAL']
+        with self._condition:
+            # Threads don't survive a fork, so each worker process starts its own
+            if not interval or self._poller_pid == os.getpid():
+                return
+            self._poller_pid = os.getpid()
+
+        thread = threading.Thread(target=self._poll_periodically, args=(interval,))
+        thread.daemon = True
+        thread.start()
+
+    def _poll_periodically(self, interval):
+        while True:
+            with self._condition:
+                listening = self._listeners > 0
+                if not listening:
+                    # Stop until a page is listening again, and compare with a fresh worklist then
+                    self._poller_pid = None
+                    self._polled = False
+            if not listening:
+                return
+
+            try:
+                self.poll()
+            except Exception as e:
+                with self._condition:
+                    self._stats['poll_failures'] += 1
+                self.app.logger.warning('Failed to poll the worklist for changes: {}'.format(repr(e)))
+            time.sleep(interval)
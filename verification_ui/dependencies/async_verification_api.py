@@ -0,0 +1,213 @@
+import asyncio
+import json
+import logging
+import aiohttp
+from common_utilities import errors
+from verification_ui import config
+from verification_ui.dependencies.records import to_case_summaries
+from verification_ui.dependencies.verification_api import FanOutResult, build_dataset_access_update, \
+    endpoint_family
+from verification_ui.exceptions import ApplicationError
+from verification_ui.utils.json_utils import loads
+from verification_ui.utils.pagination import DEFAULT_SORT, paginate
+
+log = logging.getLogger(__name__)
+
+
+class AsyncVerificationAPI(object):
+    """asyncio client for the Verification API, with the same methods and errors as VerificationAPI
+
+    Unlike VerificationAPI it isn't tied to a Flask request, so it can be used from batch jobs as well as
+    pages. All calls share one pooled aiohttp session, so hundreds of them can be in flight at once from a
+    single thread. Use it as an async context manager, or call close() when done with it:
+
+        async with AsyncVerificationAPI(trace_id=g.trace_id) as verification_api:
+            results = await verification_api.fan_out({'case': verification_api.get_item(1), ...})
+    """
+
+    def __init__(self, base_url=None, trace_id=None, timeout=None, pool_size=100):
+        self.base_url = base_url or config.VERIFICATION_API_URL
+        self.trace_id = trace_id
+        self.timeout = config.DEFAULT_TIMEOUT if timeout is None else timeout
+        self.pool_size = pool_size
+        self._session = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    @property
+    def session(self):
+        # Created on first use, as it has to be made inside the event loop it will be used from
+        if self._session is None:
+            headers = {'Accept': 'application/json'}
+            if self.trace_id:
+                headers['X-Trace-ID'] = self.trace_id
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.pool_size),
+                timeout=aiohttp.ClientTimeout(total=self.timeout),
+                cookie_jar=aiohttp.DummyCookieJar(),
+                headers=headers)
+        return self._session
+
+    async def _request(self, uri, data=None, records=None):
+        url = '{}/{}'.format(self.base_url, uri)
+        timeout = aiohttp.ClientTimeout(total=self.timeout,
+                                        sock_connect=config.VERIFICATION_API_CONNECT_TIMEOUT,
+                                        sock_read=config.VERIFICATION_API_READ_TIMEOUTS.get(endpoint_family(uri),
+                                                                                            self.timeout))
+
+        try:
+            if data is None:
+                response = await self.session.get(url, timeout=timeout)
+            else:
+                response = await self.session.post(url, data=data, timeout=timeout,
+                                                   headers={'Content-Type': 'application/json'})
+            async with response:
+                status = response.status
+                if status == 204:
+                    return {}
+                if status == 404:
+                    error = 'Not Found'
+                    raise ApplicationError(
+                        *errors.get('verification_ui', 'API_HTTP_ERROR', filler=str(error)),
+                        http_code=status)
+                else:
+                    response.raise_for_status()
+                    body = loads(await response.read())
+                    return body if records is None else records(body)
+
+        except aiohttp.ClientResponseError as error:
+            log.error('Encountered non-2xx HTTP code when accessing {}'.format(url))
+            log.error('Error: {}'.format(error))
+            raise ApplicationError(*errors.get('verification_ui', 'API_HTTP_ERROR', filler=str(error)))
+        # aiohttp's own timeouts are also connection errors, so these have to be caught first
+        except asyncio.TimeoutError as error:
+            log.error('Encountered a timeout while accessing {}'.format(url))
+            raise ApplicationError(*errors.get('verification_ui', 'API_TIMEOUT', filler=str(error)))
+        except aiohttp.ClientConnectionError as error:
+            log.error('Encountered an error while connecting to Verification API')
+            raise ApplicationError(*errors.get('verification_ui', 'API_CONN_ERROR', filler=str(error)))
+
+    async def fan_out(self, calls, deadline=None):
+        """Await several independent calls at the same time, like VerificationAPI.fan_out
+
+        calls is a dict of name -> coroutine (e.g. verification_api.get_item(1)). Returns a dict of
+        name -> FanOutResult. Calls still running when the deadline passes are cancelled.
+        """
+        if not calls:
+            return {}
+
+        if deadline is None:
+            deadline = config.VERIFICATION_API_FAN_OUT_DEADLINE
+
+        tasks = {name: asyncio.ensure_future(call) for name, call in calls.items()}
+        await asyncio.wait(tasks.values(), timeout=deadline)
+
+        results = {}
+        for name, task in tasks.items():
+            if not task.done():
+                task.cancel()
+                log.error('Call to Verification API for {} did not finish within {}s'.format(name, deadline))
+                error = ApplicationError(*errors.get('verification_ui', 'API_TIMEOUT',
+                                                     filler='Deadline of {}s exceeded'.format(deadline)))
+                results[name] = FanOutResult(error=error)
+            elif task.exception() is not None:
+                results[name] = FanOutResult(error=task.exception())
+            else:
+                results[name] = FanOutResult(value=task.result())
+
+        return results
+
+    async def get_worklist(self, sort_by=DEFAULT_SORT, cursor=None, limit=None):
+        log.info('Retrieving list of applications pending approval...')
+        worklist = await self._request(uri='worklist', records=to_case_summaries)
+        return paginate(worklist, sort_by, cursor, limit)
+
+    async def get_item(self, item_id):
+        log.info('Retrieving details for case...')
+        return await self._request(uri='case/{}'.format(item_id))
+
+    async def approve_worklist_item(self, item_id, staff_id):
+        log.info('Approving worklist item...')
+        data = json.dumps({
+            'staff_id': staff_id
+        })
+        return await self._request(uri='case/{}/approve'.format(item_id), data=data)
+
+    async def decline_worklist_item(self, item_id, staff_id, reason, advice):
+        log.info('Declining worklist item...')
+        data = json.dumps({
+            'staff_id': staff_id,
+            'reason': reason,
+            'advice': advice
+        })
+        return await self._request(uri='case/{}/decline'.format(item_id), data=data)
+
+    async def close_account(self, item_id, staff_id, requester, reason):
+        log.info('Closing account...')
+        data = json.dumps({
+            'staff_id': staff_id,
+            'requester': requester,
+            'close_detail': reason
+        })
+        return await self._request(uri='case/{}/close'.format(item_id), data=data)
+
+    async def add_note(self, item_id, staff_id, note_text):
+        log.info('Adding note to notepad...')
+        data = json.dumps({
+            'staff_id': staff_id,
+            'note_text': note_text
+        })
+        return await self._request(uri='case/{}/note'.format(item_id), data=data)
+
+    async def lock(self, item_id, staff_id):
+        log.info('Locking item to current user...')
+        data = json.dumps({
+            'staff_id': staff_id
+        })
+        return await self._request(uri='case/{}/lock'.format(item_id), data=data)
+
+    async def unlock(self, item_id):
+        log.info('Unlocking item...')
+        return await self._request(uri='case/{}/unlock'.format(item_id), data='')
+
+    async def perform_search(self, search_params):
+        log.info('Performing search...')
+        data = json.dumps(search_params)
+        return await self._request(uri='search', data=data, records=to_case_summaries)
+
+    async def get_decline_reasons(self):
+        log.info('Retrieving common decline reasons...')
+        return await self._request(uri='decline-reasons')
+
+    async def update_user_details(self, case_id, params):
+        log.info('Updating user details')
+        data = json.dumps(params)
+        return await self._request(uri='case/{}/update'.format(case_id), data=data)
+
+    async def get_dataset_activity(self, case_id):
+        log.info('Getting download history for case')
+        return await self._request(uri='dataset-activity/{}'.format(case_id))
+
+    async def get_user_dataset_access(self, case_id):
+        log.info('Getting data access for case')
+        return await self._request(uri='dataset-access/{}'.format(case_id))
+
+    async def update_dataset_access(self, case_id, staff_id, current_access, updated_access):
+        log.info('Updating users access to datasets...')
+        data_dict = build_dataset_access_update(staff_id, current_access, updated_access)
+
+        # Only call API to update if anything to update
+        if data_dict['licences']:
+            return await self._request(uri='case/{}/update_dataset_access'.format(case_id),
+                                       data=json.dumps(data_dict))
+
+        return {}
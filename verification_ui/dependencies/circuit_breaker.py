@@ -0,0 +1,106 @@
+from collections import deque
+from verification_ui.exceptions import CircuitOpenError
+import threading
+import time
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half-open'
+
+
+class CircuitBreaker(object):
+    """Stops calls to an API that is failing, so they fail straight away rather than waiting to time out
+
+    Closed: calls are made as normal, and the outcomes of the last window_size are kept. Once there have been
+    at least minimum_calls and the failure rate reaches failure_rate, the breaker opens.
+    Open: calls fail immediately with CircuitOpenError. After probe_interval seconds it goes half-open.
+    Half-open: one call at a time is let through as a probe. If it succeeds the breaker closes, if it fails
+    the breaker opens again.
+    """
+
+    def __init__(self, name, failure_rate, minimum_calls, window_size, probe_interval):
+        self.name = name
+        self.failure_rate = failure_rate
+        self.minimum_calls = minimum_calls
+        self.probe_interval = probe_interval
+        self.state = CLOSED
+        self.opened_at = None
+        self._outcomes = deque(maxlen=window_size)
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def before_call(self):
+        """Raise CircuitOpenError if the call shouldn't be made"""
+        with self._lock:
+            if self.state == OPEN:
+                if time.time() - self.opened_at < self.probe_interval:
+                    raise self._open_error()
+                self.state = HALF_OPEN
+            if self.state == HALF_OPEN:
+                if self._probing:
+                    raise self._open_error()
+                self._probing = True
+
+    def record_success(self):
+        with self._lock:
+            if self.state == HALF_OPEN:
+                self.state = CLOSED
+                self._outcomes.clear()
+                self._probing = False
+            self._outcomes.append(False)
+
+    def record_failure(self):
+        with self._lock:
+            if self.state == HALF_OPEN:
+                self._open()
+                return
+            self._outcomes.append(True)
+            failures = sum(self._outcomes)
+            if len(self._outcomes) >= self.minimum_calls and failures >= self.failure_rate * len(self._outcomes):
+                self._open()
+
+    def record_inconclusive(self):
+        """The call ended without showing whether the API is working, so let another probe through"""
+        with self._lock:
+            self._probing = False
+
+    def status(self):
+        with self._lock:
+            calls = len(self._outcomes)
+            return {
+                'state': self.state,
+                'recent_calls': calls,
+                'recent_failure_rate': round(sum(self._outcomes) / calls, 2) if calls else 0
+            }
+
+    def _open(self):
+        self.state = OPEN
+        self.opened_at = time.time()
+        self._probing = False
+
+    def _open_error(self):
+        retry_in = max(0, int(self.probe_interval - (time.time() - self.opened_at)))
+        return CircuitOpenError('Verification API ({}) is unavailable, not calling it for {}s'
+                                .format(self.name, retry_in))
+
+
+class CircuitBreakers(object):
+    """One CircuitBreaker per endpoint family, created as each family is first called"""
+
+    def __init__(self, failure_rate, minimum_calls, window_size, probe_interval):
+        self.settings = dict(failure_rate=failure_rate, minimum_calls=minimum_calls, window_size=window_size,
+                             probe_interval=probe_interval)
+        self._breakers = {}
+        self._lock = threading.Lock()
+
+    def get(self, name):
+        with self._lock:
+            breaker = self._breakers.get(name)
+            if breaker is None:
+                breaker = self._breakers[name] = CircuitBreaker(name, **self.settings)
+            return breaker
+
+    def status(self):
+        with self._lock:
+            breakers = list(self._breakers.values())
+        return {breaker.name: breaker.status() for breaker in breakers}
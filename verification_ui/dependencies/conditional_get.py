@@ -0,0 +1,73 @@
+from verification_ui.utils.cache_utils import LRUCache
+import threading
+
+
+class ConditionalGetStore(object):
+    """Remembers the validators (ETag/Last-Modified) and parsed body of the last response for each URL
+
+    They're used to make the next GET of that URL conditional. If the API says it hasn't changed (304) the
+    parsed body from last time is reused, saving both the download and the JSON decode. The same object is
+    handed to every caller, so it must be treated as read only.
+    """
+
+    def __init__(self, max_size):
+        self.entries = LRUCache(max_size)
+        self._lock = threading.Lock()
+        self._stats = dict(conditional_requests=0, not_modified=0, bytes_saved=0)
+
+    def validators(self, url):
+        """Headers that make a GET of url conditional, or an empty dict if there's nothing to validate"""
+        entry = self.entries.get(url)
+        if entry is None:
+            return {}
+
+        headers = {}
+        if entry['etag']:
+            headers['If-None-Match'] = entry['etag']
+        if entry['last_modified']:
+            headers['If-Modified-Since'] = entry['last_modified']
+        if headers:
+            self._count('conditional_requests')
+        return headers
+
+    def remember(self, url, response, body):
+        etag = response.headers.get('ETag')
+        last_modified = response.headers.get('Last-Modified')
+        if not etag and not last_modified:
+            self.entries.delete(url)
+            return
+
+        self.entries.set(url, {
+            'etag': etag,
+            'last_modified': last_modified,
+            'body': body,
+            'size': len(response.content)
+        })
+
+    def reuse(self, url):
+        """Return the body remembered for url after a 304, or None if it has since been evicted"""
+        entry = self.entries.get(url)
+        if entry is None:
+            return None
+
+        with self._lock:
+            self._stats['not_modified'] += 1
+            self._stats['bytes_saved'] += entry['size']
+        return entry['body']
+
+    def version(self, url, body):
+        """The ETag (or Last-Modified) the API gave body, or None if body isn't the last response remembered for url"""
+        entry = self.entries.get(url)
+        if entry is None or entry['body'] is not body:
+            return None
+        return entry['etag'] or entry['last_modified']
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        stats['entries'] = len(self.entries)
+        return stats
+
+    def _count(self, name):
+        with self._lock:
+            self._stats[name] += 1
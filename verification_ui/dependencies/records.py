@@ -0,0 +1,66 @@
+class Record(object):
+    """Compact, read only, record of the fields of an API payload that the app actually uses
+
+    Fields are held in __slots__ rather than a dict per item, so a large list of them (e.g. the worklist)
+    takes far less memory than the decoded JSON it came from. They can still be read like the dicts they
+    replace (record['status'], record.get('status')), so the formatting functions work on either.
+    Fields missing from the payload are None.
+    """
+    __slots__ = ()
+    nested = {}
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        # Setting slots through their descriptors directly is much quicker than setattr, which matters when
+        # there are thousands of records to make
+        cls._setters = tuple((name, getattr(cls, name).__set__, cls.nested.get(name)) for name in cls.__slots__)
+
+    @classmethod
+    def from_dict(cls, data):
+        record = cls.__new__(cls)
+        get = data.get
+        for name, set_field, nested in cls._setters:
+            value = get(name)
+            if nested is not None and value is not None:
+                value = nested.from_dict(value)
+            set_field(record, value)
+        return record
+
+    def __getitem__(self, name):
+        try:
+            return getattr(self, name)
+        except AttributeError:
+            raise KeyError(name)
+
+    def __contains__(self, name):
+        return name in self.__slots__
+
+    def get(self, name, default=None):
+        return getattr(self, name) if name in self.__slots__ else default
+
+    def __setattr__(self, name, value):
+        raise AttributeError('{} is read only'.format(type(self).__name__))
+
+    def __eq__(self, other):
+        return type(self) is type(other) and all(self[name] == other[name] for name in self.__slots__)
+
+    def __repr__(self):
+        return '{}({})'.format(type(self).__name__,
+                               ', '.join('{}={!r}'.format(name, self[name]) for name in self.__slots__))
+
+
+class RegistrationData(Record):
+    """The registration details used to list and describe a case (see build_row and build_details_table)"""
+    __slots__ = ('title', 'first_name', 'last_name', 'user_type', 'address_line_1', 'address_line_2', 'city',
+                 'postcode', 'country', 'telephone_number', 'email', 'contactable', 'contact_preferences',
+                 'organisation_name', 'organisation_type', 'registration_number', 'country_of_incorporation')
+
+
+class CaseSummary(Record):
+    """A case as listed in the worklist or search results"""
+    __slots__ = ('case_id', 'status', 'staff_id', 'date_added', 'registration_data')
+    nested = {'registration_data': RegistrationData}
+
+
+def to_case_summaries(items):
+    return [CaseSummary.from_dict(item) for item in items]
@@ -0,0 +1,44 @@
+import random
+import threading
+
+
+class RetryBudget(object):
+    """Caps retries at a fraction of the requests being made, so a slow or failing API isn't hit even harder
+
+    Every request adds ratio to the budget and every retry takes one from it, so over time at most that
+    fraction of requests are retried. The budget holds at most reserve retries, which also lets the odd
+    retry through while traffic is light.
+    """
+
+    def __init__(self, ratio, reserve):
+        self.ratio = ratio
+        self.reserve = reserve
+        self._balance = float(reserve)
+        self._lock = threading.Lock()
+        self._stats = dict(requests=0, retries=0, retries_refused=0)
+
+    def record_request(self):
+        with self._lock:
+            self._stats['requests'] += 1
+            self._balance = min(self._balance + self.ratio, self.reserve)
+
+    def try_spend(self):
+        """Take a retry from the budget, returning False if there isn't one left"""
+        with self._lock:
+            if self._balance < 1:
+                self._stats['retries_refused'] += 1
+                return False
+            self._balance -= 1
+            self._stats['retries'] += 1
+            return True
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['balance'] = round(self._balance, 2)
+        return stats
+
+
+def backoff(attempt, base, cap):
+    """Seconds to wait before retry number attempt (from 1), with "full jitter" so retries don't bunch up"""
+    return random.uniform(0, min(cap, base * 2 ** (attempt - 1)))
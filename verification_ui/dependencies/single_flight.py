@@ -0,0 +1,60 @@
+import threading
+
+
+class _Flight(object):
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight(object):
+    """Collapses identical concurrent calls into one
+
+    While a call for a key is in progress, anyone else making a call for the same key waits for it to finish
+    and gets its result (or exception) rather than making the call again. Only use it for calls whose result
+    can be shared, as every waiter is handed the same object.
+
+    Uses threading primitives, which gunicorn's eventlet worker monkey patches, so the waiting is done by green
+    threads yielding to each other rather than blocking the worker.
+    """
+
+    def __init__(self):
+        self._flights = {}
+        self._lock = threading.Lock()
+        self._stats = dict(calls=0, collapsed=0)
+
+    def do(self, key, call):
+        with self._lock:
+            flight = self._flights.get(key)
+            if flight is None:
+                flight = self._flights[key] = _Flight()
+                self._stats['calls'] += 1
+                leader = True
+            else:
+                self._stats['collapsed'] += 1
+                leader = False
+
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+
+        try:
+            flight.result = call()
+            return flight.result
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+            flight.done.set()
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['in_flight'] = len(self._flights)
+        return stats
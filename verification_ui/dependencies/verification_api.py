@@ -1,28 +1,111 @@
 import requests
 import json
+import time
+from collections import OrderedDict
+from functools import partial
+from concurrent.futures import ThreadPoolExecutor, wait
 from flask import current_app, g
 from common_utilities import errors
+from verification_ui import config
+from verification_ui.custom_extensions.http_connection_pool.main import DeadlineExceeded, TracedSession
+from verification_ui.dependencies.circuit_breaker import CircuitBreakers
+from verification_ui.dependencies.conditional_get import ConditionalGetStore
+from verification_ui.dependencies.records import to_case_summaries
+from verification_ui.dependencies.retry_budget import RetryBudget, backoff
+from verification_ui.dependencies.single_flight import SingleFlight
 from verification_ui.exceptions import ApplicationError
+from verification_ui.extensions import reference_data_cache
+from verification_ui.utils.context_utils import in_request_context
+from verification_ui.utils.json_utils import decode_response
+from verification_ui.utils.pagination import DEFAULT_SORT, paginate
+
+
+conditional_get_store = ConditionalGetStore(config.VERIFICATION_API_CONDITIONAL_GET_ENTRIES)
+single_flight = SingleFlight()
+retry_budget = RetryBudget(config.VERIFICATION_API_RETRY_RATIO, config.VERIFICATION_API_RETRY_RESERVE)
+circuit_breakers = CircuitBreakers(config.VERIFICATION_API_BREAKER_FAILURE_RATE,
+                                   config.VERIFICATION_API_BREAKER_MINIMUM_CALLS,
+                                   config.VERIFICATION_API_BREAKER_WINDOW_SIZE,
+                                   config.VERIFICATION_API_BREAKER_PROBE_INTERVAL)
+
+# Responses to a GET that are worth retrying, and the longest to wait before a retry
+RETRY_STATUSES = (502, 503, 504)
+RETRY_BACKOFF_CAP = 2
+
+
+def endpoint_family(uri):
+    """The kind of call uri is, e.g. 'case' for case/1 and 'case-update' for case/1/lock
+
+    Used to look up settings (such as timeouts) that differ between the API's endpoints.
+    """
+    parts = uri.split('/')
+    if parts[0] == 'case' and len(parts) > 2:
+        return 'case-update'
+    return parts[0]
+
+
+class FanOutResult(object):
+    """The outcome of one of the calls made by VerificationAPI.fan_out"""
+
+    def __init__(self, value=None, error=None):
+        self.value = value
+        self.error = error
+
+    def get(self):
+        """Return the call's result, or raise the ApplicationError it failed with"""
+        if self.error is not None:
+            raise self.error
+        return self.value
 
 
 class VerificationAPI(object):
     def __init__(self):
         self.base_url = current_app.config['VERIFICATION_API_URL']
+        # uri -> the API's version (ETag or Last-Modified) of what the cacheable GETs of it returned, or None if
+        # it didn't give one. Lets pages tell whether they would be rendered from the same data as last time
+        self.versions = {}
+
+    def _request(self, uri, data=None, cacheable=False, records=None):
+        """Call the API, GETting uri if there's no data to POST to it
+
+        If cacheable is True the GET is made conditional on the response having changed since last time, and
+        if it hasn't the previously returned (shared, so read only) object is returned again. Concurrent
+        cacheable GETs of the same uri are collapsed into one call, whose result they all share.
 
-    def _request(self, uri, data=None):
+        records is an optional function to turn the decoded body into the (compact) records that are returned.
+        """
         url = '{}/{}'.format(self.base_url, uri)
+        if cacheable:
+            body = single_flight.do(url, lambda: self._send(uri, data, cacheable, records))
+            self.versions[uri] = conditional_get_store.version(url, body)
+            return body
+        return self._send(uri, data, cacheable, records)
+
+    def _send(self, uri, data, cacheable, records=None):
+        url = '{}/{}'.format(self.base_url, uri)
+        family = endpoint_family(uri)
         headers = {'Accept': 'application/json'}
-        timeout = current_app.config['DEFAULT_TIMEOUT']
+        timeout = (current_app.config['VERIFICATION_API_CONNECT_TIMEOUT'],
+                   current_app.config['VERIFICATION_API_READ_TIMEOUTS'].get(family,
+                                                                            current_app.config['DEFAULT_TIMEOUT']))
+
+        # Fails straight away, with CircuitOpenError, if this part of the API has been failing
+        breaker = circuit_breakers.get(family)
+        breaker.before_call()
 
         try:
-            if data is None:
-                response = g.requests.get(url, headers=headers, timeout=timeout)
-            else:
-                headers['Content-Type'] = 'application/json'
-                response = g.requests.post(url, headers=headers, timeout=timeout, data=data)
+            if data is None and cacheable:
+                headers.update(conditional_get_store.validators(url))
+            response = self._call(breaker, url, headers, timeout, data)
             status = response.status_code
             if status == 204:
                 return {}
+            if status == 304 and cacheable:
+                body = conditional_get_store.reuse(url)
+                if body is None:
+                    # Evicted since we asked, so ask again without the validators
+                    return self._send(uri, data, False, records)
+                return body
             if status == 404:
                 error = 'Not Found'
                 raise ApplicationError(
@@ -30,7 +113,12 @@ class VerificationAPI(object):
                     http_code=status)
             else:
                 response.raise_for_status()
-                return response.json()
+                body = decode_response(response)
+                if records is not None:
+                    body = records(body)
+                if cacheable:
+                    conditional_get_store.remember(url, response, body)
+                return body
 
         except requests.exceptions.HTTPError as error:
             current_app.logger.error('Encountered non-2xx HTTP code when accessing {}'.format(url))
@@ -43,14 +131,129 @@ class VerificationAPI(object):
             current_app.logger.error('Encountered a timeout while accessing {}'.format(url))
             raise ApplicationError(*errors.get('verification_ui', 'API_TIMEOUT', filler=str(error)))
 
-    def get_worklist(self):
+    def _call(self, breaker, url, headers, timeout, data):
+        """Make the call, telling the circuit breaker whether the API dealt with it"""
+        healthy = None
+        try:
+            if data is None:
+                response = self._get(url, headers, timeout)
+            else:
+                headers['Content-Type'] = 'application/json'
+                response = g.requests.post(url, headers=headers, timeout=timeout, data=data)
+            healthy = response.status_code < 500
+            return response
+        except DeadlineExceeded:
+            # Our own time ran out, which says nothing about the API's health
+            raise
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+            healthy = False
+            raise
+        finally:
+            if healthy is None:
+                breaker.record_inconclusive()
+            elif healthy:
+                breaker.record_success()
+            else:
+                breaker.record_failure()
+
+    def _get(self, url, headers, timeout):
+        """GET url, retrying (GETs are idempotent) on failures that are likely to be temporary
+
+        Retries are limited by the retry budget, and aren't made if the wait before them would take the
+        request past its deadline.
+        """
+        retry_budget.record_request()
+        attempt = 0
+        while True:
+            error = None
+            try:
+                response = g.requests.get(url, headers=headers, timeout=timeout)
+                if response.status_code not in RETRY_STATUSES:
+                    return response
+            except DeadlineExceeded:
+                raise
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                error = e
+
+            attempt += 1
+            delay = backoff(attempt, current_app.config['VERIFICATION_API_RETRY_BACKOFF'], RETRY_BACKOFF_CAP)
+            remaining = g.requests.remaining() if isinstance(g.requests, TracedSession) else None
+            if (attempt > current_app.config['VERIFICATION_API_GET_RETRIES'] or
+                    (remaining is not None and delay >= remaining) or not retry_budget.try_spend()):
+                if error is not None:
+                    raise error
+                return response
+
+            current_app.logger.warning('Retrying {} in {:.2f}s after {}'.format(
+                url, delay, repr(error) if error is not None else response.status_code))
+            time.sleep(delay)
+
+    def fan_out(self, calls, deadline=None, max_workers=None):
+        """Make several independent calls to the API at the same time and wait for them to finish
+
+        calls is a dict of name -> callable taking no arguments (e.g. functools.partial(self.get_item, 1)).
+        Returns a dict of name -> FanOutResult. Calls are isolated from each other, so one failing (or not
+        finishing before the deadline) does not stop the others' results being used.
+        """
+        if not calls:
+            return {}
+
+        if deadline is None:
+            deadline = current_app.config['VERIFICATION_API_FAN_OUT_DEADLINE']
+        if max_workers is None:
+            max_workers = current_app.config['VERIFICATION_API_FAN_OUT_WORKERS']
+
+        # The calls are given a session whose timeouts stop at the deadline (or the request's own, if that's
+        # sooner), so any still running when it passes give up rather than carrying on in the background
+        requests_session = g.requests
+        if isinstance(requests_session, TracedSession):
+            remaining = requests_session.remaining()
+            g.requests = requests_session.with_deadline(deadline if remaining is None else min(deadline, remaining))
+
+        # Under eventlet the threading module is monkey patched, so these workers are green threads
+        executor = ThreadPoolExecutor(max_workers=min(max_workers, len(calls)))
+        futures = {}
+        try:
+            for name, call in calls.items():
+                futures[name] = executor.submit(in_request_context(call))
+            wait(futures.values(), timeout=deadline)
+        finally:
+            g.requests = requests_session
+            # Calls still queued when the deadline passes are never started. Don't hold the page up waiting on
+            # the ones that are running, they stop at the deadline by themselves
+            for future in futures.values():
+                future.cancel()
+            executor.shutdown(wait=False)
+
+        results = {}
+        for name, future in futures.items():
+            if future.cancelled() or not future.done():
+                current_app.logger.error('Call to Verification API for {} did not finish within {}s'
+                                         .format(name, deadline))
+                error = ApplicationError(*errors.get('verification_ui', 'API_TIMEOUT',
+                                                     filler='Deadline of {}s exceeded'.format(deadline)))
+                results[name] = FanOutResult(error=error)
+            elif future.exception() is not None:
+                results[name] = FanOutResult(error=future.exception())
+            else:
+                results[name] = FanOutResult(value=future.result())
+
+        return results
+
+    def get_worklist(self, sort_by=DEFAULT_SORT, cursor=None, limit=None):
+        """Return the Page of the worklist, sorted by sort_by, that cursor points to
+
+        The API has no paging of its own so the whole worklist is still fetched (conditionally, so it's usually
+        a 304), but only the requested page is handed back to be formatted and rendered.
+        """
         current_app.logger.info('Retrieving list of applications pending approval...')
-        return self._request(uri='worklist')
+        worklist = self._request(uri='worklist', cacheable=True, records=to_case_summaries)
+        return paginate(worklist, sort_by, cursor, limit)
 
     def get_item(self, item_id):
         current_app.logger.info('Retrieving details for case...')
         uri = 'case/{}'.format(item_id)
-        return self._request(uri=uri)
+        return self._request(uri=uri, cacheable=True)
 
     def approve_worklist_item(self, item_id, staff_id):
         current_app.logger.info('Approving worklist item...')
@@ -96,14 +299,57 @@ class VerificationAPI(object):
         current_app.logger.info('Unlocking item...')
         return self._request(uri='case/{}/unlock'.format(item_id), data={})
 
+    def bulk_lock(self, item_ids, staff_id):
+        current_app.logger.info('Locking {} items to user {}...'.format(len(item_ids), staff_id))
+        return self._bulk(item_ids, lambda item_id: self.lock(item_id, staff_id))
+
+    def bulk_unlock(self, item_ids):
+        current_app.logger.info('Unlocking {} items...'.format(len(item_ids)))
+        return self._bulk(item_ids, self.unlock)
+
+    def bulk_approve(self, item_ids, staff_id):
+        current_app.logger.info('Approving {} worklist items...'.format(len(item_ids)))
+        return self._bulk(item_ids, lambda item_id: self._approve_unless_locked_to_other(item_id, staff_id))
+
+    def bulk_add_note(self, item_ids, staff_id, note_text):
+        current_app.logger.info('Adding note to {} notepads...'.format(len(item_ids)))
+        return self._bulk(item_ids, lambda item_id: self.add_note(item_id, staff_id, note_text))
+
+    def _bulk(self, item_ids, call):
+        """Make call(item_id) for each item, a few at a time, returning a dict of item_id -> FanOutResult
+
+        The API only takes one case per request, so a bulk action is a batch of requests made with bounded
+        parallelism. Each item succeeds or fails on its own.
+
+        The calls have VERIFICATION_API_BULK_DEADLINE between them in place of the request's own deadline, as the
+        workers they're made in are handed whichever session g.requests is when they're started.
+        """
+        deadline = current_app.config['VERIFICATION_API_BULK_DEADLINE']
+        calls = OrderedDict((item_id, partial(call, item_id)) for item_id in item_ids)
+        requests_session = g.requests
+        if isinstance(requests_session, TracedSession):
+            g.requests = requests_session.with_deadline(deadline)
+        try:
+            return self.fan_out(calls, deadline=deadline,
+                                max_workers=current_app.config['VERIFICATION_API_BULK_WORKERS'])
+        finally:
+            g.requests = requests_session
+
+    def _approve_unless_locked_to_other(self, item_id, staff_id):
+        locked_to = self.get_item(item_id)['staff_id']
+        if locked_to is not None and locked_to != staff_id:
+            raise ApplicationError('Locked to {}'.format(locked_to), http_code=409)
+        return self.approve_worklist_item(item_id, staff_id)
+
     def perform_search(self, search_params):
         current_app.logger.info('Performing search...')
         data = json.dumps(search_params)
-        return self._request(uri='search', data=data)
+        return self._request(uri='search', data=data, records=to_case_summaries)
 
     def get_decline_reasons(self):
         current_app.logger.info('Retrieving common decline reasons...')
-        return self._request(uri='decline-reasons')
+        # These rarely change, so are cached rather than asked for every time a case is opened
+        return reference_data_cache.get_or_load('decline-reasons', lambda: self._request(uri='decline-reasons'))
 
     def update_user_details(self, case_id, params):
         current_app.logger.info('Updating user details')
@@ -112,6 +358,8 @@ class VerificationAPI(object):
 
     def get_dataset_activity(self, case_id):
         current_app.logger.info('Getting download history for case')
+        # Not conditional, unlike the case itself, as an account's whole download history would be held in the
+        # conditional GET store (which is bounded by number of entries, not size) for every account looked at
         return self._request(uri='dataset-activity/{}'.format(case_id))
 
     def get_user_dataset_access(self, case_id):
@@ -120,31 +368,37 @@ class VerificationAPI(object):
 
     def update_dataset_access(self, case_id, staff_id, current_access, updated_access):
         current_app.logger.info('Updating users access to datasets...')
+        data_dict = build_dataset_access_update(staff_id, current_access, updated_access)
 
-        data_dict = {
-            'staff_id': staff_id,
-            'licences': []
-        }
+        # Only call API to update if anything to update
+        if data_dict['licences']:
+            return self._request(uri='case/{}/update_dataset_access'.format(case_id), data=json.dumps(data_dict))
 
-        # Current access has all datasets and whether the user has agreed individual licences
-        # We need the current access as only checkboxes that are 'checked' will be included in the form submit data
-        for dataset in current_access:
-            for licence_name, licence_dict in dataset['licences'].items():
+        return {}
 
-                # updated_access is 'request.form' - get list of form values with all inputs that have dataset name
-                # e.g. ['nps', 'dad']
-                updated_dataset_list = updated_access.getlist(dataset['name'])
 
-                # Is licence (e.g. 'res_cov_exploration') in form data - access to be granted if yes else removed
-                update_value = licence_name in updated_dataset_list
+def build_dataset_access_update(staff_id, current_access, updated_access):
+    """Build the body of an update_dataset_access request, listing only the licences that have changed"""
+    data_dict = {
+        'staff_id': staff_id,
+        'licences': []
+    }
 
-                # Only update if the value to be updated is different from what the user had previously
-                if update_value != licence_dict['agreed']:
-                    licence_dict = dict(licence_id=licence_name, agreed=update_value)
-                    data_dict['licences'].append(licence_dict)
+    # Current access has all datasets and whether the user has agreed individual licences
+    # We need the current access as only checkboxes that are 'checked' will be included in the form submit data
+    for dataset in current_access:
+        for licence_name, licence_dict in dataset['licences'].items():
 
-        # Only call API to update if anything to update
-        if data_dict['licences']:
-            return self._request(uri='case/{}/update_dataset_access'.format(case_id), data=json.dumps(data_dict))
+            # updated_access is 'request.form' - get list of form values with all inputs that have dataset name
+            # e.g. ['nps', 'dad']
+            updated_dataset_list = updated_access.getlist(dataset['name'])
 
-        return {}
+            # Is licence (e.g. 'res_cov_exploration') in form data - access to be granted if yes else removed
+            update_value = licence_name in updated_dataset_list
+
+            # Only update if the value to be updated is different from what the user had previously
+            if update_value != licence_dict['agreed']:
+                licence_dict = dict(licence_id=licence_name, agreed=update_value)
+                data_dict['licences'].append(licence_dict)
+
+    return data_dict
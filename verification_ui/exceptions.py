@@ -36,6 +36,17 @@ class ApplicationError(Exception):
         self.force_logging = force_logging
 
 
+class CircuitOpenError(ApplicationError):
+    """Raised instead of calling an API whose circuit breaker is open, as it has been failing
+
+    Its code (E503, for the 503 it's returned as) is kept apart from the Verification API's own E4xx codes, so
+    alerts can tell a degraded service from a failed call.
+    """
+
+    def __init__(self, message):
+        super(CircuitOpenError, self).__init__(message, 'E503', http_code=503)
+
+
 def unhandled_exception(e):
     """Handler method for exceptions that escape the route code without being caught.
 
@@ -95,6 +106,10 @@ def application_error(e):
         current_app.logger.debug('Application Exception (message: %s, code: %s): %s', e.message, e.code, repr(e),
                                  exc_info=True)
 
+    # Views catch errors from other APIs and raise their own, so look at what they were handling too
+    if isinstance(e, CircuitOpenError) or isinstance(e.__context__, CircuitOpenError):
+        return service_degraded(e if isinstance(e, CircuitOpenError) else e.__context__)
+
     # ApplicationError allows developers to specify an HTTP code.
     # This will be written to the logs correctly, but we don't want to allow
     # this code through to the user as it may expose internal workings of the system
@@ -125,6 +140,22 @@ def application_error(e):
                                    ), http_code
 
 
+def service_degraded(e):
+    """Page shown straight away, rather than after a timeout, when an API the request needs is known to be down"""
+    http_code = 503
+
+    if request_wants_json():
+        return jsonify({
+                       'message': e.message,
+                       'code': e.code
+                       }), http_code
+    else:
+        return render_template('app/errors/degraded.html',
+                               code=e.code,
+                               http_code=http_code
+                               ), http_code
+
+
 def register_exception_handlers(app):
     app.register_error_handler(ApplicationError, application_error)
     app.register_error_handler(Exception, unhandled_exception)
@@ -1,35 +1,57 @@
 from verification_ui import config
 from verification_ui.custom_extensions.cachebust_static_assets.main import CachebustStaticAssets
 from verification_ui.custom_extensions.enhanced_logging.main import EnhancedLogging
+from verification_ui.custom_extensions.http_connection_pool.main import HttpConnectionPool
 from verification_ui.custom_extensions.gzip_static_assets.main import GzipStaticAssets
 from verification_ui.custom_extensions.security_headers.main import SecurityHeaders
 from verification_ui.custom_extensions.jinja_markdown_filter.main import JinjaMarkdownFilter
 from verification_ui.custom_extensions.csrf.main import CSRF
 from verification_ui.custom_extensions.content_security_policy.main import ContentSecurityPolicy
 from verification_ui.custom_extensions.wtforms_helpers.main import WTFormsHelpers
+from verification_ui.custom_extensions.reference_data_cache.main import ReferenceDataCache
+from verification_ui.custom_extensions.adfs_certificates.main import AdfsCertificates
+from verification_ui.custom_extensions.server_side_sessions.main import ServerSideSessions
+from verification_ui.custom_extensions.worklist_events.main import WorklistEvents
+from verification_ui.custom_extensions.response_compression.main import ResponseCompression
+from verification_ui.custom_extensions.template_cache.main import TemplateCache
 from flask_login import LoginManager
 
 
 # Create empty extension objects here
 cachebust_static_assets = CachebustStaticAssets()
 enhanced_logging = EnhancedLogging()
+http_connection_pool = HttpConnectionPool()
 gzip_static_assets = GzipStaticAssets()
 security_headers = SecurityHeaders()
 jinja_markdown_filter = JinjaMarkdownFilter()
 csrf = CSRF()
 content_security_policy = ContentSecurityPolicy()
 wtforms_helpers = WTFormsHelpers()
+reference_data_cache = ReferenceDataCache()
+adfs_certificates = AdfsCertificates()
+server_side_sessions = ServerSideSessions()
+worklist_events = WorklistEvents()
+response_compression = ResponseCompression()
+template_cache = TemplateCache()
 login_manager = LoginManager()
 
 
 def register_extensions(app):
     """Adds any previously created extension objects into the app, and does any further setup they need."""
     enhanced_logging.init_app(app)
+    # Must come after enhanced_logging as it needs the trace id to be set first
+    http_connection_pool.init_app(app)
     security_headers.init_app(app)
     jinja_markdown_filter.init_app(app)
     csrf.init_app(app)
     content_security_policy.init_app(app)
     wtforms_helpers.init_app(app)
+    reference_data_cache.init_app(app)
+    adfs_certificates.init_app(app)
+    server_side_sessions.init_app(app)
+    worklist_events.init_app(app)
+    response_compression.init_app(app)
+    template_cache.init_app(app)
     login_manager.init_app(app)
 
     if config.STATIC_ASSETS_MODE == 'production':
@@ -3,7 +3,7 @@
 from verification_ui.app import app
 from verification_ui.blueprints import register_blueprints
 from verification_ui.exceptions import register_exception_handlers
-from verification_ui.extensions import register_extensions
+from verification_ui.extensions import register_extensions, template_cache
 
 # Now we register any extensions we use into the app
 register_extensions(app)
@@ -11,3 +11,5 @@ register_extensions(app)
 register_exception_handlers(app)
 # Finally we register our blueprints to get our routes up and running.
 register_blueprints(app)
+# Now every template filter and global is known, the templates can be compiled before the first request needs them
+template_cache.warm_up(app)
@@ -0,0 +1,20 @@
+from flask import copy_current_request_context, g
+
+
+def in_request_context(call):
+    """Wrap call so it can be run in another (green) thread as if it were part of the current request
+
+    Each wrapped call gets its own copy of the request context, as one context can't be pushed in two
+    threads at once. The copy comes with a fresh g, so the trace id and requests session that calls to
+    other APIs rely on are carried over to it.
+    """
+    trace_id = g.trace_id
+    requests_session = g.requests
+
+    @copy_current_request_context
+    def run():
+        g.trace_id = trace_id
+        g.requests = requests_session
+        return call()
+
+    return run
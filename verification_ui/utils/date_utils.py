@@ -0,0 +1,39 @@
+from datetime import datetime
+from functools import lru_cache
+
+# Different timestamps formatted the same way that are remembered, e.g. every case's date added on the worklist
+FORMATTED_TIMESTAMPS_CACHE_SIZE = 10000
+
+
+def parse_timestamp(timestamp):
+    """Parse a Verification API timestamp, either YYYY-MM-DDTHH:MM:SS.ffffff or YYYY-MM-DD HH:MM:SS.ffffff
+
+    The fields are always in the same place, so they're read straight out of the string rather than with
+    strptime, which has to interpret the format every time. Anything else is passed on to strptime, so it
+    raises the same ValueError it always has.
+    """
+    try:
+        if timestamp[4] == '-' and timestamp[7] == '-' and timestamp[10] in 'T ' and timestamp[13] == ':' \
+                and timestamp[16] == ':' and timestamp[19] == '.' and 20 < len(timestamp) <= 26:
+            fields = (timestamp[:4], timestamp[5:7], timestamp[8:10], timestamp[11:13], timestamp[14:16],
+                      timestamp[17:19], timestamp[20:].ljust(6, '0'))
+            if ''.join(fields).isdigit():
+                return datetime(*map(int, fields))
+    except (IndexError, TypeError, ValueError):
+        pass
+
+    return datetime.strptime(timestamp, '%Y-%m-%d{}%H:%M:%S.%f'.format(_separator(timestamp)))
+
+
+@lru_cache(maxsize=FORMATTED_TIMESTAMPS_CACHE_SIZE)
+def format_timestamp(timestamp, date_format):
+    """Parse a Verification API timestamp and format it with strftime, remembering the result
+
+    The same timestamps (and formats) come up again and again as pages are rendered, so the most recently used
+    are kept rather than parsed and formatted each time.
+    """
+    return parse_timestamp(timestamp).strftime(date_format)
+
+
+def _separator(timestamp):
+    return ' ' if isinstance(timestamp, str) and timestamp[10:11] == ' ' else 'T'
@@ -0,0 +1,72 @@
+from flask import current_app, make_response, request, session
+from flask_wtf.csrf import generate_csrf
+import hashlib
+import os
+import threading
+
+_template_versions = {}
+_lock = threading.Lock()
+
+
+def page_etag(*parts):
+    """A fingerprint of a page, made from parts (everything it's rendered from) along with the URL, the user, and
+    the version of the app and its templates
+
+    Returns None if any part is None, i.e. it isn't known whether that part has changed. Parts are compared by
+    their repr, so records and lists of them can be given as they are.
+    """
+    if any(part is None for part in parts):
+        return None
+
+    # The page says who it's for (e.g. 'Locked to you') and holds a CSRF token made from their session's, which
+    # is made now if it hasn't been yet so the fingerprint doesn't change once the page has been rendered
+    generate_csrf()
+    user = (session.get('username'), session.get(current_app.config.get('WTF_CSRF_FIELD_NAME', 'csrf_token')))
+    fingerprint = repr((template_version(), request.full_path, user, parts))
+    return hashlib.sha1(fingerprint.encode()).hexdigest()
+
+
+def conditional_page(etag, render):
+    """Respond with a 304 if the browser already has the page etag was made for, otherwise with render()
+
+    Pages are only validated (Cache-Control: no-cache), as they may have changed since, and only kept by the
+    user's own browser (private). A page is always rendered if there's no etag or there are flashed messages to
+    show on it.
+    """
+    if etag is None or session.get('_flashes'):
+        return render()
+
+    if request.if_none_match.contains_weak(etag):
+        response = current_app.response_class(status=304)
+    else:
+        response = make_response(render())
+    # Weak, as the same page can be rendered differently (e.g. a new CSRF token) but mean the same
+    response.set_etag(etag, weak=True)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    response.vary.add('Cookie')
+    return response
+
+
+def template_version():
+    """A digest of the running commit and the app's templates, so pages change when either of them does"""
+    app = current_app._get_current_object()
+    version = _template_versions.get(app)
+    if version is None:
+        with _lock:
+            version = _template_versions.get(app)
+            if version is None:
+                version = _template_versions[app] = _digest_templates(app)
+    return version
+
+
+def _digest_templates(app):
+    digest = hashlib.sha1(str(app.config.get('COMMIT')).encode())
+    templates = os.path.join(app.root_path, app.template_folder)
+    for directory, directories, files in os.walk(templates):
+        directories.sort()
+        for name in sorted(files):
+            path = os.path.join(directory, name)
+            digest.update(os.path.relpath(path, templates).encode())
+            with open(path, 'rb') as template:
+                digest.update(template.read())
+    return digest.hexdigest()
@@ -0,0 +1,21 @@
+import os
+import stat
+
+
+def make_private_directory(path):
+    """Create the directory at path (and any parents), usable only by this process's user, if it isn't there already
+
+    Returns whether the directory is private (see is_private), as one that was already there may not be.
+    """
+    os.makedirs(path, mode=0o700, exist_ok=True)
+    return is_private(path)
+
+
+def is_private(path):
+    """Whether the file or directory at path belongs to this process's user and no one else can write to it
+
+    Anything the app loads from disk and then trusts (compiled templates, signing certificates) should be checked
+    with this first, as whoever can write to it decides what the app runs or trusts.
+    """
+    status = os.stat(path)
+    return status.st_uid == os.getuid() and not status.st_mode & (stat.S_IWGRP | stat.S_IWOTH)
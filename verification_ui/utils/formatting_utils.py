@@ -1,9 +1,10 @@
 from datetime import datetime
-from flask import session, render_template_string
+from flask import escape, session, render_template_string
 from collections import namedtuple
+from verification_ui.utils.date_utils import format_timestamp, parse_timestamp
 
 
-def build_row(item, for_search=False):
+def build_row(item, for_search=False, selectable=False):
     row = [
         {'text': format_date(item['date_added'])},
         {'text': format_name(item)},
@@ -15,6 +16,9 @@ def build_row(item, for_search=False):
     if for_search:
         row.insert(1, {'text': format_account_type(item)})
 
+    if selectable:
+        row.insert(0, {'html': format_select(item)})
+
     return row
 
 
@@ -59,18 +63,15 @@ def build_details_table(item):
 
 
 def format_date(date):
-    datetime_added = datetime.strptime(date[:25], '%Y-%m-%d %H:%M:%S.%f')
-    return datetime_added.strftime('%d/%m/%Y')
+    return format_timestamp(date[:25], '%d/%m/%Y')
 
 
 def format_text_date(date):
-    datetime_added = datetime.strptime(date, '%Y-%m-%dT%H:%M:%S.%f')
-    return datetime_added.strftime('%d %B %Y')
+    return format_timestamp(date, '%d %B %Y')
 
 
 def format_date_and_time(date):
-    datetime_added = datetime.strptime(date, '%Y-%m-%dT%H:%M:%S.%f')
-    return datetime_added.strftime('%d %B %Y %H:%M')
+    return format_timestamp(date, '%d %B %Y %H:%M')
 
 
 def format_file_name(file_name):
@@ -145,8 +146,7 @@ def format_contact_by(item):
 
 
 def format_note_metadata(note_metadata):
-    note_datetime = datetime.strptime(note_metadata['date_added'][:25], '%Y-%m-%d %H:%M:%S.%f')
-    note_formatted_datetime = note_datetime.strftime('%d/%m/%Y %H:%M:%S')
+    note_formatted_datetime = format_timestamp(note_metadata['date_added'][:25], '%d/%m/%Y %H:%M:%S')
     return 'Added by {} on {}'.format(note_metadata['staff_id'], note_formatted_datetime)
 
 
@@ -172,11 +172,22 @@ def format_details(item, for_search=False):
     return html
 
 
-def format_lock(item):
+def format_select(item):
+    return '''<div class="govuk-checkboxes govuk-checkboxes--small">
+        <div class="govuk-checkboxes__item">
+            <input class="govuk-checkboxes__input" id="select-{0}" name="item_ids" type="checkbox" value="{0}">
+            <label class="govuk-label govuk-checkboxes__label" for="select-{0}">
+                <span class="govuk-visually-hidden">Select application {0}</span>
+            </label>
+        </div>
+    </div>'''.format(item['case_id'])
+
+
+def format_lock(item, username=None):
     if item['staff_id'] is None or item['status'] not in ['Pending', 'In Progress']:
         return ''
 
-    if item['staff_id'] == session['username']:
+    if item['staff_id'] == (username or session['username']):
         colour = 'green'
         locked_to = 'Locked to you'
     else:
@@ -193,63 +204,49 @@ def format_lock(item):
     </div>'''.format(colour, locked_to)
 
 
-def build_dataset_activity(dataset_activity):
-    # As sample downloads should be displayed under the full dataset, we need to copy the download history
-    # for the sample dataset into the full download history and then remove the sample dataset from the list
-    download_activity = list(dataset_activity)
-
-    for dataset in download_activity:
-        if dataset['private'] is True:
-            sample_dataset_index = next((index for (index, item) in enumerate(download_activity)
-                                         if item['name'] == '{}_sample'.format(dataset['name'])), None)
-            if sample_dataset_index is not None:
-                dataset['download_history'] += download_activity[sample_dataset_index]['download_history']
-                dataset['sample_licence_agreed'] = download_activity[sample_dataset_index]['licence_agreed']
-                del download_activity[sample_dataset_index]
+def build_dataset_activity(dataset_activity, page_size=None, more_url=None):
+    """Build the dataset activity accordion's contents from the Verification API's dataset activity
 
+    If a page_size is given, only that many of each dataset's downloads are included, followed by a link (to
+    more_url(dataset name, offset)) to the rest. The counts and dates in the summary are still for every download.
+    """
     # Need to construct the html content that will be revealed when the accordion elements are expanded however
     # a restricted datset may not have an agreed licence but still have a history of sample downloads
     activity = dict(download_count=0, datasets=list())
-    oldest_download_date = datetime.now()
+    oldest_download_date = None
 
-    for dataset in download_activity:
-        if dataset['licence_agreed'] or dataset['download_history']:
+    for dataset, sample, download_history in _datasets_with_samples(dataset_activity):
+        if dataset['licence_agreed'] or download_history:
             # When a user has agreed the licence for a free dataset a licence_agreed_date will be present
             # however the licence agreement for restricted datasets is an offline process and so won't have a date
             if dataset['licence_agreed'] and 'licence_agreed_date' in dataset:
                 licence_agreed = 'Licence agreed on {}'.format(format_text_date(dataset['licence_agreed_date']))
             elif dataset['licence_agreed']:
                 licence_agreed = 'Licence has been agreed'
-            elif 'sample_licence_agreed' in dataset and dataset['sample_licence_agreed'] is True:
+            elif sample is not None and sample['licence_agreed'] is True:
                 licence_agreed = 'Sample licence has been agreed'
             else:
                 licence_agreed = 'Licence has not been agreed'
 
-            if dataset['download_history']:
-                content = '<table class="govuk-table govuk-!-margin-top-3 govuk-!-margin-bottom-6">' \
-                          '<thead class="govuk-table__head"><tr class="govuk-table__row">' \
-                          '<th scope="col" class="govuk-table__header">Type of dataset</th>' \
-                          '<th scope="col" class="govuk-table__header">Date/time downloaded</th>' \
-                          '</tr></thead><tbody class="govuk-table__body">'
-
-                for download in dataset['download_history']:
-                    activity['download_count'] += 1
-
-                    # Need to determine when the oldest download happened so that we can provide
-                    # a rough date range for the frontend
-                    curr_download_date = datetime.strptime(download['date'], '%Y-%m-%dT%H:%M:%S.%f')
-                    if curr_download_date < oldest_download_date:
-                        oldest_download_date = curr_download_date
-
-                    download_file = format_file_name(download['file'])
-                    download_date = format_date_and_time(download['date'])
-
-                    content += '<tr class="govuk-table__row">' \
-                               '<td scope="row" class="govuk-table__cell">{}</td>' \
-                               '<td class="govuk-table__cell">{}</td>' \
-                               '</tr>'.format(download_file, download_date)
-
-                content += '</tbody></table>'
+            if download_history:
+                activity['download_count'] += len(download_history)
+                # Need to determine when the oldest download happened so that we can provide a rough date range
+                # for the frontend. The dates all have the same format, so the earliest sorts first
+                oldest = min(download['date'] for download in download_history)
+                if oldest_download_date is None or oldest < oldest_download_date:
+                    oldest_download_date = oldest
+
+                shown = download_history if page_size is None else download_history[:page_size]
+                content = ['<table class="govuk-table govuk-!-margin-top-3 govuk-!-margin-bottom-6">'
+                           '<thead class="govuk-table__head"><tr class="govuk-table__row">'
+                           '<th scope="col" class="govuk-table__header">Type of dataset</th>'
+                           '<th scope="col" class="govuk-table__header">Date/time downloaded</th>'
+                           '</tr></thead><tbody class="govuk-table__body">']
+                content.extend(_download_rows(shown))
+                content.append('</tbody></table>')
+                if len(shown) < len(download_history):
+                    content.append(_more_downloads_link(more_url(dataset['name'], len(shown))))
+                content = ''.join(content)
             else:
                 content = '<p class="govuk-body govuk-!-margin-top-3 govuk-!-margin-bottom-6">This account has ' \
                           'not downloaded any files for this dataset.</p>'
@@ -266,7 +263,65 @@ def build_dataset_activity(dataset_activity):
                 }
             })
 
-        activity['oldest_download_date'] = format_text_date(datetime.strftime(oldest_download_date,
-                                                                              '%Y-%m-%dT%H:%M:%S.%f'))
+    if dataset_activity:
+        oldest_download_date = datetime.now() if oldest_download_date is None else \
+            min(parse_timestamp(oldest_download_date), datetime.now())
+        activity['oldest_download_date'] = oldest_download_date.strftime('%d %B %Y')
 
     return activity
+
+
+def build_more_downloads(dataset_activity, name, offset, page_size, more_url):
+    """The table rows for the next page_size of a dataset's downloads from offset, and a link to the page after it
+
+    Returns None if the account has no such dataset.
+    """
+    for dataset, _, download_history in _datasets_with_samples(dataset_activity):
+        if dataset['name'] == name:
+            shown = download_history[offset:offset + page_size]
+            more = None
+            if offset + len(shown) < len(download_history):
+                more = _more_downloads_link(more_url(name, offset + len(shown)))
+            return {'title': dataset['title'], 'rows': ''.join(_download_rows(shown)), 'more': more}
+    return None
+
+
+def _datasets_with_samples(dataset_activity):
+    """Each dataset to show, along with its sample dataset (if it has one) and their combined download history
+
+    As sample downloads should be displayed under the full dataset, each private dataset's sample is found by name
+    and its download history shown with the full dataset's. The sample isn't shown on its own. Nothing is changed
+    in place, as the activity may be a cached response that is used again.
+    """
+    datasets_by_name = {}
+    for dataset in dataset_activity:
+        datasets_by_name.setdefault(dataset['name'], dataset)
+
+    samples = {}
+    for dataset in dataset_activity:
+        if dataset['private'] is True and '{}_sample'.format(dataset['name']) in datasets_by_name:
+            samples[dataset['name']] = datasets_by_name['{}_sample'.format(dataset['name'])]
+    merged_samples = set(id(sample) for sample in samples.values())
+
+    for dataset in dataset_activity:
+        if id(dataset) in merged_samples:
+            continue
+
+        sample = samples.get(dataset['name']) if dataset['private'] is True else None
+        download_history = dataset['download_history']
+        if sample is not None:
+            download_history = download_history + sample['download_history']
+        yield dataset, sample, download_history
+
+
+def _download_rows(downloads):
+    for download in downloads:
+        yield '<tr class="govuk-table__row">' \
+              '<td scope="row" class="govuk-table__cell">{}</td>' \
+              '<td class="govuk-table__cell">{}</td>' \
+              '</tr>'.format(format_file_name(download['file']), format_date_and_time(download['date']))
+
+
+def _more_downloads_link(url):
+    return '<p class="govuk-body"><a class="govuk-link" href="{}" data-more-downloads>' \
+           'Show more downloads</a></p>'.format(escape(url))
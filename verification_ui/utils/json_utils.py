@@ -0,0 +1,32 @@
+import json
+
+# Use a faster JSON decoder if one is installed. They're optional, so fall back to the standard library.
+try:
+    import orjson
+    fast_loads = orjson.loads
+    DECODER = 'orjson'
+except ImportError:
+    try:
+        import ujson
+        fast_loads = ujson.loads
+        DECODER = 'ujson'
+    except ImportError:
+        fast_loads = None
+        DECODER = 'json'
+
+
+def loads(data):
+    """Decode a JSON document (str or bytes) with the fastest decoder available"""
+    if fast_loads is None:
+        return json.loads(data)
+    return fast_loads(data)
+
+
+def decode_response(response):
+    """Decode the JSON body of a requests response with the fastest decoder available
+
+    Without a fast decoder this is just response.json().
+    """
+    if fast_loads is None:
+        return response.json()
+    return fast_loads(response.content)
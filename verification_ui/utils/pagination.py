@@ -0,0 +1,78 @@
+from bisect import bisect_left, bisect_right
+import base64
+import binascii
+import json
+
+
+# The ways a list of cases can be sorted, and how to get the value to sort each case by
+SORT_KEYS = {
+    'date_added': lambda item: item.get('date_added') or '',
+    'status': lambda item: item.get('status') or '',
+    'lock_owner': lambda item: item.get('staff_id') or ''
+}
+DEFAULT_SORT = 'date_added'
+
+
+class Page(list):
+    """One page of cases, along with what's needed to link to the pages either side of it
+
+    Cursors are opaque strings identifying the case a page should start after (or end before), so paging
+    stays in the right place even if cases are added to or removed from the list in between requests.
+    """
+
+    def __init__(self, items, start, total, sort_by, next_cursor=None, previous_cursor=None):
+        super(Page, self).__init__(items)
+        self.start = start
+        self.total = total
+        self.sort_by = sort_by
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+
+def paginate(items, sort_by=DEFAULT_SORT, cursor=None, limit=None):
+    """Sort items by one of SORT_KEYS and return the Page of up to limit items that cursor points to
+
+    With no cursor (or one that can't be read) the first page is returned, and with one past the end of the list
+    (e.g. because the cases after it have since left the worklist) the last page is. With no limit every item is.
+    """
+    sort_value = SORT_KEYS[sort_by]
+    ordered = sorted(items, key=lambda item: (sort_value(item), item.get('case_id')))
+    keys = [(sort_value(item), item.get('case_id')) for item in ordered]
+    total = len(ordered)
+    if limit is None:
+        limit = total
+
+    start = 0
+    position = _decode_cursor(cursor)
+    if position is not None:
+        direction, key = position
+        if direction == 'after':
+            start = bisect_right(keys, key)
+        else:
+            start = max(bisect_left(keys, key) - limit, 0)
+        if start >= total:
+            start = max(total - limit, 0)
+
+    end = min(start + limit, total)
+    next_cursor = _encode_cursor('after', keys[end - 1]) if end < total else None
+    previous_cursor = _encode_cursor('before', keys[start]) if start > 0 else None
+
+    return Page(ordered[start:end], start, total, sort_by, next_cursor, previous_cursor)
+
+
+def _encode_cursor(direction, key):
+    return base64.urlsafe_b64encode(json.dumps([direction, list(key)]).encode()).decode()
+
+
+def _decode_cursor(cursor):
+    if not cursor:
+        return None
+    try:
+        direction, (sort_value, case_id) = json.loads(base64.urlsafe_b64decode(cursor.encode()).decode())
+    except (ValueError, TypeError, binascii.Error):
+        return None
+    # Anything else can't be compared with the sort keys of the cases
+    if direction not in ('after', 'before') or not isinstance(sort_value, str) \
+            or not isinstance(case_id, int) or isinstance(case_id, bool):
+        return None
+    return direction, (sort_value, case_id)
@@ -0,0 +1,39 @@
+from flask import current_app, get_flashed_messages, stream_with_context
+from flask_wtf.csrf import generate_csrf
+
+# Characters of a streamed page held back before they're sent, so it isn't sent a few bytes at a time. About the
+# size of the page's head and navigation, so those go as soon as they're ready rather than waiting for the rows
+STREAM_BUFFER_SIZE = 8192
+
+
+def stream_template(template_name, **context):
+    """Like render_template, but the page is sent as it's rendered rather than once all of it has been
+
+    Anything given as an iterator (e.g. a generator building table rows) is only worked through as that part of
+    the page is reached, so the start of the page is sent first and the whole page is never held in memory.
+
+    The response (and so the session cookie) is sent before the page is rendered, so everything the page would
+    change in the session (its CSRF token, and taking the flashed messages off it) is done here first.
+    """
+    app = current_app._get_current_object()
+    generate_csrf()
+    get_flashed_messages()
+
+    app.update_template_context(context)
+    template = app.jinja_env.get_or_select_template(template_name)
+    chunks = _buffered(template.generate(context), STREAM_BUFFER_SIZE)
+    return app.response_class(stream_with_context(chunks), mimetype='text/html')
+
+
+def _buffered(pieces, size):
+    buffer = []
+    buffered = 0
+    for piece in pieces:
+        buffer.append(piece)
+        buffered += len(piece)
+        if buffered >= size:
+            yield ''.join(buffer)
+            buffer = []
+            buffered = 0
+    if buffer:
+        yield ''.join(buffer)
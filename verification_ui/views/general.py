@@ -1,5 +1,11 @@
 from flask import request, Blueprint, Response
 from flask import current_app, g
+from verification_ui.dependencies.verification_api import circuit_breakers, conditional_get_store, retry_budget, \
+    single_flight
+from verification_ui.extensions import adfs_certificates, http_connection_pool, reference_data_cache, \
+    response_compression, worklist_events
+from verification_ui.utils.date_utils import format_timestamp
+from verification_ui.views.login import verified_tokens
 import datetime
 import json
 
@@ -13,7 +19,25 @@ def check_status():
         "app": current_app.config["APP_NAME"],
         "status": "OK",
         "headers": request.headers.to_wsgi_list(),
-        "commit": current_app.config["COMMIT"]
+        "commit": current_app.config["COMMIT"],
+        "circuit_breakers": circuit_breakers.status()
+    }), mimetype='application/json', status=200)
+
+
+@general.route("/health/metrics")
+def metrics():
+    return Response(response=json.dumps({
+        "app": current_app.config["APP_NAME"],
+        "http_pool": http_connection_pool.stats(),
+        "reference_data_cache": reference_data_cache.stats(),
+        "conditional_get": conditional_get_store.stats(),
+        "single_flight": single_flight.stats(),
+        "retry_budget": retry_budget.stats(),
+        "verified_tokens": verified_tokens.stats(),
+        "adfs_certificates": adfs_certificates.stats(),
+        "formatted_timestamps": format_timestamp.cache_info()._asdict(),
+        "worklist_events": worklist_events.stats(),
+        "response_compression": response_compression.stats()
     }), mimetype='application/json', status=200)
 
 
@@ -2,15 +2,15 @@ from flask_login import login_user, logout_user, current_user, UserMixin
 from flask import redirect, session, request, current_app, Blueprint, g, url_for
 from functools import wraps
 from jose import jwt, JWTError
-from requests.exceptions import ConnectionError
 # for use when we implement user roles
 # from functools import wraps
-import requests
-import textwrap
-import xmltodict
+import hashlib
+import threading
+import time
 
 from verification_ui.exceptions import ApplicationError
-from verification_ui.extensions import login_manager
+from verification_ui.extensions import adfs_certificates, login_manager
+from verification_ui.utils.cache_utils import LRUCache
 from verification_ui import config
 from common_utilities import errors
 
@@ -21,6 +21,68 @@ login_manager.login_message = 'Please log in to access this page.'
 login_manager.session_protection = "strong"
 
 
+class VerifiedTokenCache(object):
+    """Remembers the claims of access tokens whose signature and claims have already been verified
+
+    Every protected request rebuilds the User from the token in the session, and verifying its RS256 signature
+    each time is a noticeable amount of CPU. Entries are keyed by a hash of the token, so the tokens themselves
+    aren't kept, and expire at the token's exp less JWT_LEEWAY, so an expired token is always verified (and
+    rejected) again. The same claims are handed to every caller, so they must be treated as read only.
+    """
+
+    def __init__(self, max_size):
+        self.entries = LRUCache(max_size)
+        self._lock = threading.Lock()
+        self._stats = dict(hits=0, misses=0, invalidations=0)
+
+    def get(self, access_token):
+        """Return the claims remembered for access_token, or None if it needs to be verified"""
+        key = _token_key(access_token)
+        entry = self.entries.get(key)
+        if entry is not None:
+            claims, expires_at = entry
+            if time.time() < expires_at:
+                self._count('hits')
+                return claims
+            self.entries.delete(key)
+
+        self._count('misses')
+        return None
+
+    def remember(self, access_token, claims, leeway):
+        expires_at = claims.get('exp', 0) - leeway
+        # Tokens without an expiry, or about to expire anyway, aren't worth remembering
+        if expires_at > time.time():
+            self.entries.set(_token_key(access_token), (claims, expires_at))
+
+    def invalidate(self, access_token=None):
+        """Forget access_token, or every token if none is given (e.g. as the signing certificates changed)"""
+        if access_token is None:
+            self.entries.clear()
+        else:
+            self.entries.delete(_token_key(access_token))
+        self._count('invalidations')
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        stats['entries'] = len(self.entries)
+        return stats
+
+    def _count(self, name):
+        with self._lock:
+            self._stats[name] += 1
+
+
+def _token_key(access_token):
+    return hashlib.sha256(access_token.encode()).hexdigest()
+
+
+verified_tokens = VerifiedTokenCache(config.VERIFIED_TOKEN_CACHE_SIZE)
+# Tokens verified with the old certificates have to be verified again with the new ones
+adfs_certificates.on_change(verified_tokens.invalidate)
+
+
 @login_manager.user_loader
 def load_user(user_id):  # pragma: no cover
     """Creates and returns a User object based on a unique id.
@@ -51,19 +113,18 @@ def handle_needs_login():
 
 
 class User(UserMixin):  # pragma: no cover
-    # Static variables for ADFS token signature validation
-    public_key_1 = None
-    public_key_2 = None
-    keys_already_swapped = False
 
     def __init__(self, access_token):
         """Creates a User based on an access token (or as Flask-Login knows it, the userid)
 
         As part of the process it validates the signature of the token along with other JWT claims such as expiry.
         """
-        # Set the token then verify it
+        # Set the token then verify it, unless it has been verified already
         self.access_token = access_token
-        self.token_data = self._verify_token()
+        self.token_data = verified_tokens.get(access_token)
+        if self.token_data is None:
+            self.token_data = self._verify_token()
+            verified_tokens.remember(access_token, self.token_data, int(current_app.config.get('JWT_LEEWAY')))
 
         self.employee_legacy_id = self.token_data["UserName"].upper()
         # Will need to use this later id we introduce role based access
@@ -96,52 +157,22 @@ class User(UserMixin):  # pragma: no cover
         this includes retries and error handling to deal with expired/missing certificates and retrieving the
         latest certificates from adfs metadata
         """
-        # If there are no certificate to use (on app first startup) go and get them
-        if not User.public_key_1:
-            self._get_certs_from_adfs()
         try:
-            # try to decode with primary certificate
-            decoded_token = self._decode_jwt(User.public_key_1)
+            # Only the key of the certificate the token says it was signed with is tried. If there are no
+            # certificates to use (on app first startup) this goes and gets them
+            keys = adfs_certificates.keys_for(jwt.get_unverified_header(self.access_token))
+            decoded_token = self._decode_jwt(keys)
             return decoded_token
         except JWTError as e:
             if str(e) == 'Signature verification failed.':
-                # The certificate might have expired (and been swapped to secondary on ADFS itself),
-                # so if we have a second try to use it
-                if User.public_key_2:
-                    try:
-                        decoded_token = self._decode_jwt(User.public_key_2)
-                        if not User.keys_already_swapped:
-                            current_app.logger.info('Verified jwt with secondary certificate,'
-                                                    'promoting to primary for future use.')
-                            # If the second certificate worked promote it to primary
-                            # Store the old primary as secondary to handle any users with leftover sessions
-                            # We only want to swap them once otherwise we might just continually be switching as old
-                            # and new users use the system
-                            User.public_key_1, User.public_key_2 = User.public_key_2, User.public_key_1
-                            User.keys_already_swapped = True
-                        return decoded_token
-                    except JWTError as e:
-                        # if this errored with Signature verification failed we can retry with new certificates from
-                        # adfs - any other error and we will need to throw an exception
-                        if not str(e) == 'Signature verification failed.':
-                            raise ApplicationError(e, 'E803', http_code=403)
-                    except ApplicationError as e:
-                        # It's possible there was an error getting the certificates from ADFS if so we will want to
-                        # persist it
-                        raise e
-                    except Exception:
-                        # If something went wrong with the second cert that we can't deal with we will want to know
-                        # about it
-                        raise ApplicationError('Unknown error occured while trying to validate login',
-                                               'E803', http_code=500)
-
                 if not is_a_retry:
-                    # If this is the first time we have totally failed to validate the JWT we refresh both
-                    # certificates and try again (Most likely scenario is that a new certificate has been introduced
-                    # then subsequently promoted without us knowing)
+                    # If this is the first time we have failed to validate the JWT we refresh the certificates and
+                    # try again (Most likely scenario is that a new certificate has been introduced without us
+                    # knowing). Any other users in the same position wait for the same refresh rather than starting
+                    # their own
                     # If we have alredy tried again we skip this step to avoid being stuck in a loop and raise an error
                     current_app.logger.error('Unable to validate jwt from ADFS with stored certificates')
-                    self._get_certs_from_adfs()
+                    adfs_certificates.refresh()
                     return self._verify_token(is_a_retry=True)
                 else:
                     # We get to this exception after trying the stored certificates AND new ones from ADFS
@@ -159,57 +190,11 @@ class User(UserMixin):  # pragma: no cover
             current_app.logger.error(e)
             raise ApplicationError('Unknown error occured while trying to validate login', 'E803', http_code=500)
 
-    def _get_certs_from_adfs(self, is_a_retry=False):
-        """Used by verify_token to connect to ADFS metadata and retrieve new certificates"""
-        current_app.logger.info('Refreshing certificates from ADFS')
-
-        # Clear old certs for ease of debugging
-        User.public_key_1 = None
-        User.public_key_2 = None
-        try:
-            res = requests.get('{}/federationMetadata/2007-06/federationmetadata.xml'.format(
-                               current_app.config.get("ADFS_URL")), verify=False)
-        except ConnectionError:
-            if not is_a_retry:
-                current_app.logger.warning('Failed to connect to ADFS, retrying')
-                self._get_certs_from_adfs(is_a_retry=True)
-                return
-            else:
-                raise ApplicationError('Unable to connect to ADFS', 'E802', http_code=500)
-        adfs_meta_dict = xmltodict.parse(res.text)
-        certs = adfs_meta_dict['EntityDescriptor']['RoleDescriptor'][1]['KeyDescriptor']
-        # if there is only one cert then the cert variable will be a dict
-        if isinstance(certs, dict):
-            User.public_key_1 = self._reformat_adfs_cert(certs['KeyInfo']['X509Data']['X509Certificate'])
-        # if there are 2 certs then the cert variable will be a list
-        elif isinstance(certs, list):
-            User.public_key_1 = self._reformat_adfs_cert(certs[0]['KeyInfo']['X509Data']['X509Certificate'])
-            User.public_key_2 = self._reformat_adfs_cert(certs[1]['KeyInfo']['X509Data']['X509Certificate'])
-        User.keys_already_swapped = False
-
-        current_app.logger.info('ADFS primary cert:')
-        if User.public_key_1:
-            current_app.logger.info(User.public_key_1)
-        else:
-            current_app.logger.info('Unable to retrieve cert from ADFS')
-
-        current_app.logger.info('ADFS secondary cert:')
-        if User.public_key_2:
-            current_app.logger.info(User.public_key_2)
-        else:
-            current_app.logger.info('Unable to retrieve cert from ADFS')
-
-    def _reformat_adfs_cert(self, cert_string):
-        """Used by verify_token to convert x509 certificates from adfs metadata into a usable format"""
-        split = textwrap.fill(cert_string, 64)
-        cert = "-----BEGIN CERTIFICATE-----\n{}\n-----END CERTIFICATE-----".format(split)
-        return cert
-
-    def _decode_jwt(self, key):
-        """Used by verify_token to attempt the decode of the jwt with a provided certificate public key"""
+    def _decode_jwt(self, keys):
+        """Used by verify_token to attempt the decode of the jwt with a list of parsed certificate public keys"""
         return jwt.decode(
             self.access_token,
-            key,
+            keys,
             algorithms='RS256',
             audience=current_app.config.get('ROOT_URL') + "/verification/login",
             options={
@@ -267,6 +252,9 @@ def finish_login(access_ticket):  # pragma: no cover
         # object (and validate the access token)
         user = User(access_token=access_token)
         login_user(user)
+        # Anyone who knew the id of the session before they logged in mustn't be able to use it now
+        if hasattr(session, 'regenerate'):
+            session.regenerate()
 
         try:
             if session['requested_page'] is None:
@@ -308,6 +296,8 @@ def get_access_token(access_ticket):  # pragma: no cover
 @authentication.route('/verification/logout')
 def logout():  # pragma: no cover
     """This removes the user id/token from the session"""
+    if current_user.is_authenticated:
+        verified_tokens.invalidate(current_user.get_id())
     logout_user()
     return "You have logged out"
 
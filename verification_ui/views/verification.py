@@ -1,21 +1,40 @@
 import json
+from functools import partial
 from flask import Blueprint
-from flask import render_template, current_app, g, redirect, url_for, request, flash, session
+from flask import render_template, current_app, g, redirect, url_for, request, flash, session, escape, Response
 from flask_login import login_required, current_user
 
 from verification_ui.exceptions import ApplicationError
+from verification_ui.extensions import reference_data_cache, worklist_events
 from verification_ui.dependencies.verification_api import VerificationAPI
 from verification_ui.utils.formatting_utils import build_row, build_details_table, format_note_metadata, \
-    build_dataset_activity
+    build_dataset_activity, build_more_downloads, format_lock, format_status
+from verification_ui.utils.etag_utils import conditional_page, page_etag
+from verification_ui.utils.template_utils import stream_template
 from verification_ui.utils.form_utils import NoteForm, DeclineForm, CloseForm, SearchForm, DataAccessForm, ContactForm
 from verification_ui.views.login import role_required
 from verification_ui import config
 from verification_ui.utils.lock_check import check_correct_lock_user
+from verification_ui.utils.pagination import DEFAULT_SORT, SORT_KEYS
 
 # This is the blueprint object that gets registered into the app in blueprints.py.
 verification = Blueprint('verification', __name__)
 admin_role = config.ADFS_ROLE
 
+# The actions that can be performed on several worklist items at once, and how they're described to the user
+BULK_ACTIONS = {
+    'lock': 'Lock to you',
+    'unlock': 'Unlock',
+    'approve': 'Approve',
+    'note': 'Add note'
+}
+# How each bulk action changes the applications it's done to, for open worklist pages
+BULK_CHANGES = {
+    'lock': lambda staff_id: dict(staff_id=staff_id),
+    'unlock': lambda staff_id: dict(staff_id=None),
+    'approve': lambda staff_id: dict(status='Approved')
+}
+
 
 @verification.route('', methods=['GET'])
 @login_required
@@ -25,16 +44,38 @@ def get_worklist():
 
     try:
         verification_api = VerificationAPI()
-        worklist = verification_api.get_worklist()
+        sort_by = request.args.get('sort', DEFAULT_SORT)
+        if sort_by not in SORT_KEYS:
+            sort_by = DEFAULT_SORT
+        worklist = verification_api.get_worklist(sort_by=sort_by, cursor=request.args.get('cursor'),
+                                                 limit=config.WORKLIST_PAGE_SIZE)
         _get_user_name()
     except ApplicationError:
         raise ApplicationError('Something went wrong when retrieving the worklist. '
                                'Please raise an incident quoting the following id: {}'.format(g.trace_id))
     else:
-        current_app.logger.info('Putting worklist into viewable format...')
-        worklist_items = [build_row(item) for item in worklist]
+        def render():
+            current_app.logger.info('Putting worklist into viewable format...')
+            # Rows are built as the table reaches them, so a streamed page can start before they're all built
+            worklist_items = (build_row(item, selectable=True) for item in worklist)
+
+            return _render_list_page('app/worklist.html', worklist_items=worklist_items, page=worklist,
+                                     sort_by=sort_by)
+
+        # The page only changes if the worklist does (or who's looking at it)
+        etag = page_etag(verification_api.versions.get('worklist'), config.WORKLIST_PAGE_SIZE)
+        return conditional_page(etag, render)
 
-        return render_template('app/worklist.html', worklist_items=worklist_items)
+
+@verification.route('/events', methods=['GET'])
+@login_required
+@role_required(admin_role)
+def get_worklist_events():
+    # Lock pills say 'Locked to you', so each page's events are formatted for its user
+    username = _get_user_name()
+    events = worklist_events.listen(request.headers.get('Last-Event-ID'))
+    return Response(_format_worklist_events(events, username), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
 
 
 @verification.route('/<item_id>', methods=['GET'])
@@ -43,14 +84,31 @@ def get_worklist():
 def get_item(item_id):
     current_app.logger.info('User requested to view item {}...'.format(item_id))
     try:
-        _get_user_name()
+        username = _get_user_name()
         verification_api = VerificationAPI()
         case = verification_api.get_item(item_id)
-        lock = _handle_lock(case, verification_api) if case['status'] in ['Pending', 'In Progress'] else None
 
-        if case['status'] == 'Approved':
-            dataset_activity = verification_api.get_dataset_activity(item_id)
-            dataset_access = verification_api.get_user_dataset_access(item_id)
+        # Everything else the page needs only depends on the case itself, so ask for it all at once
+        calls = {}
+        lock = None
+        if case['status'] in ['Pending', 'In Progress']:
+            lock = _get_lock_owner(case)
+            if case['staff_id'] is None:
+                current_app.logger.info('Locking worklist item {} to user {}...'.format(item_id, username))
+                calls['lock'] = partial(verification_api.lock, item_id, username)
+            if lock is None:
+                calls['decline_reasons'] = verification_api.get_decline_reasons
+        elif case['status'] == 'Approved':
+            calls['dataset_access'] = partial(verification_api.get_user_dataset_access, item_id)
+
+        results = verification_api.fan_out(calls)
+
+        # The page can't be used without the lock, but the rest can be left out if it couldn't be fetched
+        if 'lock' in results:
+            results['lock'].get()
+            worklist_events.publish(item_id, staff_id=username)
+        decline_templates = _get_optional_result(results, 'decline_reasons')
+        dataset_access = _get_optional_result(results, 'dataset_access')
 
         from_search = request.args.get('from', None) == 'search'
         if not from_search:
@@ -63,39 +121,95 @@ def get_item(item_id):
         raise ApplicationError('Something went wrong when requesting the application details. '
                                'Please raise and incident quoting the following id: {}'.format(g.trace_id))
     else:
-        current_app.logger.info('Putting worklist item information into viewable format...')
-
-        case_data_for_template = {
-            'id': item_id,
-            'status': case['status'],
-            'info': build_details_table(case),
-            'notes': [{
-                'text': note['note_text'],
-                'meta_data': format_note_metadata(note)
-            } for note in case['notes']]
-        }
-
-        if case['status'] in ['Pending', 'In Progress', 'Declined']:
-            forms = _build_app_forms(item_id, case['status'], lock is None, verification_api)
-            return render_template('app/application_details.html', case_data=case_data_for_template,
-                                   forms=forms, search=from_search, lock=lock)
-        else:
-            account_name = ' '.join([case['registration_data']['title'], case['registration_data']['first_name'],
-                                     case['registration_data']['last_name']])
-            if case['status'] == 'Approved':
-                forms = _build_acc_forms(item_id, case['status'], dataset_access)
-                activity = build_dataset_activity(dataset_activity)
-                return render_template('app/account_details.html',
-                                       case_data=case_data_for_template,
-                                       forms=forms,
-                                       search=from_search,
-                                       activity=activity,
-                                       account_name=account_name,
-                                       dataset_access=dataset_access)
+        def render():
+            current_app.logger.info('Putting worklist item information into viewable format...')
+
+            case_data_for_template = {
+                'id': item_id,
+                'status': case['status'],
+                'info': build_details_table(case),
+                'notes': [{
+                    'text': note['note_text'],
+                    'meta_data': format_note_metadata(note)
+                } for note in case['notes']]
+            }
+
+            if case['status'] in ['Pending', 'In Progress', 'Declined']:
+                forms = _build_app_forms(item_id, case['status'], lock is None, decline_templates or [])
+                return render_template('app/application_details.html', case_data=case_data_for_template,
+                                       forms=forms, search=from_search, lock=lock)
             else:
-                forms = _build_acc_forms(item_id, case['status'])
-                return render_template('app/account_details.html', case_data=case_data_for_template, forms=forms,
-                                       search=from_search, account_name=account_name)
+                account_name = ' '.join([case['registration_data']['title'], case['registration_data']['first_name'],
+                                         case['registration_data']['last_name']])
+                if case['status'] == 'Approved':
+                    forms = _build_acc_forms(item_id, case['status'], dataset_access or [])
+                    # The download history can be long, so it's loaded separately once the page is showing
+                    activity_url = url_for('verification.get_dataset_activity', item_id=item_id)
+                    return render_template('app/account_details.html',
+                                           case_data=case_data_for_template,
+                                           forms=forms,
+                                           search=from_search,
+                                           activity_url=activity_url,
+                                           account_name=account_name,
+                                           dataset_access=dataset_access or [])
+                else:
+                    forms = _build_acc_forms(item_id, case['status'])
+                    return render_template('app/account_details.html', case_data=case_data_for_template, forms=forms,
+                                           search=from_search, account_name=account_name)
+
+        # A page that has just locked the case is rendered from the case as it was before, so isn't reused
+        etag = None if 'lock' in results else page_etag(verification_api.versions.get('case/{}'.format(item_id)),
+                                                        (decline_templates, dataset_access))
+        return conditional_page(etag, render)
+
+
+@verification.route('/<item_id>/dataset_activity', methods=['GET'])
+@login_required
+@role_required(admin_role)
+def get_dataset_activity(item_id):
+    current_app.logger.info('User requested to view dataset activity for item {}...'.format(item_id))
+    try:
+        dataset_activity = VerificationAPI().get_dataset_activity(item_id)
+    except ApplicationError as error:
+        if error.http_code == 404:
+            return render_template('app/errors/unhandled.html', http_code=404), 404
+
+        raise ApplicationError('Something went wrong when requesting the dataset activity. '
+                               'Please raise an incident quoting the following id: {}'.format(g.trace_id))
+
+    activity = build_dataset_activity(dataset_activity, page_size=config.DATASET_ACTIVITY_PAGE_SIZE,
+                                      more_url=partial(_more_downloads_url, item_id))
+
+    # The account page asks for just the accordion, without JavaScript it's linked to as a page of its own
+    if request.args.get('partial'):
+        return render_template('app/includes/dataset_activity.html', activity=activity)
+    return render_template('app/dataset_activity.html', activity=activity, item_id=item_id)
+
+
+@verification.route('/<item_id>/dataset_activity/<dataset_name>', methods=['GET'])
+@login_required
+@role_required(admin_role)
+def get_more_downloads(item_id, dataset_name):
+    offset = max(request.args.get('offset', 0, type=int), 0)
+    current_app.logger.info('User requested downloads of {} from {} for item {}...'
+                            .format(dataset_name, offset, item_id))
+    try:
+        dataset_activity = VerificationAPI().get_dataset_activity(item_id)
+    except ApplicationError as error:
+        if error.http_code == 404:
+            return render_template('app/errors/unhandled.html', http_code=404), 404
+
+        raise ApplicationError('Something went wrong when requesting the dataset activity. '
+                               'Please raise an incident quoting the following id: {}'.format(g.trace_id))
+
+    downloads = build_more_downloads(dataset_activity, dataset_name, offset, config.DATASET_ACTIVITY_PAGE_SIZE,
+                                     partial(_more_downloads_url, item_id))
+    if downloads is None:
+        return render_template('app/errors/unhandled.html', http_code=404), 404
+
+    if request.args.get('partial'):
+        return render_template('app/includes/more_downloads.html', downloads=downloads)
+    return render_template('app/dataset_downloads.html', downloads=downloads, item_id=item_id)
 
 
 @verification.route('/approve', methods=['POST'])
@@ -117,6 +231,7 @@ def approve_worklist_item():
                                'Please raise an incident quoting the following id: {}'.format(g.trace_id))
     else:
         current_app.logger.info('Worklist item {} was approved'.format(item_id))
+        worklist_events.publish(item_id, status='Approved')
         flash('Application was approved')
         return redirect(url_for('verification.get_worklist'))
 
@@ -142,6 +257,7 @@ def decline_worklist_item():
                                'Please raise an incident quoting the following id: {}'.format(g.trace_id))
     else:
         current_app.logger.info('Worklist item {} was declined'.format(item_id))
+        worklist_events.publish(item_id, status='Declined')
         flash('Application was declined')
         return redirect(url_for('verification.get_worklist'))
 
@@ -209,6 +325,7 @@ def lock_case():
                                'Please raise an incident quoting the following id: {}'.format(g.trace_id))
     else:
         current_app.logger.info('Worklist item lock successfully transferred to user {}'.format(staff_id))
+        worklist_events.publish(item_id, staff_id=staff_id)
         return redirect(url_for('verification.get_item', item_id=item_id))
 
 
@@ -226,15 +343,73 @@ def unlock_case():
                                'Please raise an incident quoting the following id: {}'.format(g.trace_id))
     else:
         current_app.logger.info('Worklist item successfully unlocked')
+        worklist_events.publish(item_id, staff_id=None)
         return redirect(url_for('verification.get_worklist'))
 
 
+@verification.route('/bulk', methods=['POST'])
+@login_required
+@role_required(admin_role)
+def bulk_action():
+    session['search_params'] = None
+    action = request.form.get('action')
+    item_ids = request.form.getlist('item_ids')
+    note_text = request.form.get('note_text', '').strip()
+
+    if action not in BULK_ACTIONS:
+        flash('Choose what to do with the selected applications')
+        return redirect(url_for('verification.get_worklist'))
+    if not item_ids:
+        flash('Select at least one application')
+        return redirect(url_for('verification.get_worklist'))
+    if action == 'note' and not note_text:
+        flash('Enter the text for your note')
+        return redirect(url_for('verification.get_worklist'))
+
+    staff_id = _get_user_name()
+    current_app.logger.info('User {} performing bulk {} of worklist items {}...'.format(staff_id, action, item_ids))
+    verification_api = VerificationAPI()
+    if action == 'lock':
+        results = verification_api.bulk_lock(item_ids, staff_id)
+    elif action == 'unlock':
+        results = verification_api.bulk_unlock(item_ids)
+    elif action == 'approve':
+        results = verification_api.bulk_approve(item_ids, staff_id)
+    else:
+        results = verification_api.bulk_add_note(item_ids, staff_id, note_text)
+
+    result_rows = []
+    succeeded = 0
+    for item_id, result in results.items():
+        if result.error is None:
+            succeeded += 1
+            outcome = 'Done'
+            if action in BULK_CHANGES:
+                worklist_events.publish(item_id, **BULK_CHANGES[action](staff_id))
+        elif isinstance(result.error, ApplicationError) and result.error.http_code == 409:
+            outcome = 'Not done: {}'.format(result.error.message)
+        else:
+            current_app.logger.error('Bulk {} of worklist item {} failed: {}'
+                                     .format(action, item_id, repr(result.error)))
+            outcome = 'Something went wrong. Please raise an incident quoting the following id: {}'.format(
+                g.trace_id)
+        result_rows.append([
+            {'html': '<a class="govuk-link" href="{}">{}</a>'.format(
+                url_for('verification.get_item', item_id=item_id), escape(item_id))},
+            {'text': outcome}
+        ])
+
+    current_app.logger.info('Bulk {} done for {} of {} worklist items'.format(action, succeeded, len(results)))
+    return render_template('app/bulk_results.html', action=BULK_ACTIONS[action], result_rows=result_rows,
+                           succeeded=succeeded, total=len(results))
+
+
 @verification.route('/search', methods=['GET'])
 @login_required
 @role_required(admin_role)
 def get_search():
     search_form = SearchForm()
-    search_items = []
+    results = []
     has_hit_limit = False
     new_search = False
     try:
@@ -256,18 +431,25 @@ def get_search():
             results = VerificationAPI().perform_search(search_params)
             search_limit = current_app.config.get('VERIFICATION_SEARCH_LIMIT')
             has_hit_limit = len(results) > search_limit
-            search_items = [build_row(item, for_search=True) for item in results[:search_limit]]
+            results = results[:search_limit]
             session['search_params'] = search_params
 
     except ApplicationError:
         raise ApplicationError('Something went wrong when performing last search. '
                                'Please raise an incident quoting the following id: {}'.format(g.trace_id))
     else:
-        return render_template('app/search.html',
-                               search_form=search_form,
-                               search_items=search_items,
-                               has_hit_limit=has_hit_limit,
-                               new_search=new_search)
+        def render():
+            search_items = (build_row(item, for_search=True) for item in results)
+            return _render_list_page('app/search.html',
+                                     search_form=search_form,
+                                     search_items=search_items,
+                                     result_count=len(results),
+                                     has_hit_limit=has_hit_limit,
+                                     new_search=new_search)
+
+        # Searches aren't versioned by the API, so the page is fingerprinted from the results themselves
+        etag = page_etag(sorted((search_params or {}).items()), results, has_hit_limit)
+        return conditional_page(etag, render)
 
 
 @verification.route('/<item_id>/contact_preferences', methods=['GET', 'POST'])
@@ -330,6 +512,18 @@ def update_dataset_access():
                                'Please raise an incident quoting the following id: {}'.format(g.trace_id))
 
 
+@verification.route('/reference-data/purge', methods=['POST'])
+@login_required
+@role_required(admin_role)
+def purge_reference_data():
+    key = request.form.get('key') or None
+    current_app.logger.info('User {} purging reference data cache (key: {})'.format(_get_user_name(), key))
+    reference_data_cache.purge(key)
+
+    flash('Reference data will be reloaded from the Verification API')
+    return redirect(url_for('verification.get_worklist'))
+
+
 def _get_user_name():
     if 'username' not in session:
         if current_app.config.get("LOGIN_DISABLED") == 'True':
@@ -339,31 +533,69 @@ def _get_user_name():
     return session['username']
 
 
-# Returns None if either locking is not applicable (due to case's status) or the case
-# is locked to the current user. Otherwise, returns the staff_id of the user the case
-# is locked to.
-def _handle_lock(case, verification_api):
+# Returns None if the case is not locked or is locked to the current user. Otherwise, returns the
+# staff_id of the user the case is locked to. An unlocked case will be locked to the current user by get_item.
+def _get_lock_owner(case):
     lock = case['staff_id']
-    current_uid = session['username']
-    case_id = case['case_id']
-    if lock is None:
-        current_app.logger.info('Locking worklist item {} to user {}...'.format(case_id, current_uid))
-        verification_api.lock(case_id, current_uid)
-        return None
-    elif lock == session['username']:
+    if lock is None or lock == session['username']:
         return None
     else:
         return lock
 
 
-def _build_app_forms(item_id, case_status, editable, verification_api):
+def _get_optional_result(results, name):
+    """Returns the result of a fan out call, or None if the page can be shown without it and it failed"""
+    if name not in results:
+        return None
+    try:
+        return results[name].get()
+    except ApplicationError as error:
+        current_app.logger.warning('Showing page without {} as it could not be retrieved: {}'
+                                   .format(name, error.message))
+        return None
+
+
+def _format_worklist_events(events, username):
+    """Turn worklist events into a text/event-stream, with the new HTML for the rows they change"""
+    # How long (in milliseconds) the browser should wait before reconnecting
+    yield 'retry: 5000\n\n'
+    for event in events:
+        if event is None:
+            # A comment, to stop the connection being closed for being idle
+            yield ': keepalive\n\n'
+            continue
+
+        data = {'case_id': event.get('case_id')}
+        if 'status' in event:
+            data['status_html'] = format_status(event['status'])
+        if 'staff_id' in event:
+            data['lock_html'] = format_lock({'staff_id': event['staff_id'],
+                                             'status': event.get('status', 'In Progress')}, username)
+        yield 'id: {}\nevent: {}\ndata: {}\n\n'.format(event['id'], event['type'], json.dumps(data))
+
+
+def _render_list_page(template_name, **context):
+    """Stream the page if STREAM_LIST_PAGES is on, otherwise render all of it first
+
+    A streamed page starts being sent sooner, but an error part way through it can only cut it short, rather than
+    being shown on an error page.
+    """
+    if config.STREAM_LIST_PAGES:
+        return stream_template(template_name, **context)
+    return render_template(template_name, **context)
+
+
+def _more_downloads_url(item_id, dataset_name, offset):
+    return url_for('verification.get_more_downloads', item_id=item_id, dataset_name=dataset_name, offset=offset)
+
+
+def _build_app_forms(item_id, case_status, editable, decline_templates):
     forms = {}
 
     if editable:
         forms['note'] = NoteForm()
 
         if case_status in ['Pending', 'In Progress']:
-            decline_templates = verification_api.get_decline_reasons()
             decline_form = DeclineForm()
             decline_form.decline_template.choices = [('template_{}'.format(index), template['decline_reason'])
                                                      for index, template in enumerate(decline_templates)]